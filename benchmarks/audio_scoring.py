@@ -0,0 +1,64 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+"""
+Compares scoring audio chunk by chunk with the batch (NumPy) scoring path
+that the NoiseFloorTracker uses.
+
+Run it from Jasper's main folder on the target device:
+
+    python2 -m benchmarks.audio_scoring --seconds 60
+
+All timings are reported relative to the duration of the scored audio, i.e.
+as the share of one CPU core that scoring a live input stream would take.
+"""
+import random
+import struct
+import timeit
+import audioop
+import argparse
+
+from client import mic
+
+
+def per_chunk_loop(chunks):
+    return [audioop.rms(data, 2) / 3 for data in chunks]
+
+
+def batch(data, chunk):
+    return mic.get_scores(data, chunk)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Audio scoring benchmark')
+    parser.add_argument('--seconds', type=int, default=30,
+                        help='seconds of audio to score (Default: 30)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of repetitions (Default: 5)')
+    parser.add_argument('--budget', type=float, default=5.0,
+                        help='CPU budget for scoring in percent of one ' +
+                             'core (Default: 5)')
+    args = parser.parse_args()
+
+    rate, chunk = mic.Mic.RATE, mic.Mic.CHUNK
+    num_chunks = args.seconds * rate / chunk
+    chunks = [struct.pack('<%dh' % chunk,
+                          *[random.randint(-3000, 3000)
+                            for i in range(chunk)])
+              for j in range(num_chunks)]
+    data = ''.join(chunks)
+    duration = float(num_chunks * chunk) / rate
+
+    candidates = [('per-chunk loop',
+                   lambda: per_chunk_loop(chunks)),
+                  ('batch get_scores (%s)' % ('numpy' if mic.get_numpy()
+                                              else 'audioop fallback'),
+                   lambda: batch(data, chunk))]
+
+    print("Scoring %.1f s of audio (%d chunks of %d samples)"
+          % (duration, num_chunks, chunk))
+    for name, func in candidates:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        usage = 100.0 * best / duration
+        print("%-40s %8.2f ms  %6.3f%% of real time  %s"
+              % (name, best * 1000, usage,
+                 'OK' if usage <= args.budget else 'OVER BUDGET'))
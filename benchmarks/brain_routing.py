@@ -0,0 +1,141 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+"""
+Measures how long the Brain takes to route a query to a module, with a few
+hundred synthetic plugins:
+
+    python2 -m benchmarks.brain_routing --modules 300 --hypotheses 5
+
+The 'legacy' router asks every module about every hypothesis, like the Brain
+used to do. The 'indexed' router only asks the modules that the keyword
+index returns as candidates. In the 'patterns' scenario, the modules declare
+PATTERNS, which the Brain searches instead of asking the modules (only for
+the modules whose literals occur in the query).
+"""
+import re
+import sys
+import random
+import timeit
+import argparse
+from client import brain
+
+
+class SyntheticModule(object):
+
+    def __init__(self, number, words_per_module, patterns=False):
+        self.__name__ = 'Synthetic%d' % number
+        self.WORDS = ['WORD%dX%d' % (number, i)
+                      for i in range(words_per_module)]
+        self.PRIORITY = number % 10
+        self._pattern = r'\b(%s)\b' % '|'.join(self.WORDS)
+        if patterns:
+            self.PATTERNS = [self._pattern]
+        self.handled = 0
+
+    def isValid(self, text):
+        # like the built-in modules
+        return bool(re.search(self._pattern, text, re.IGNORECASE))
+
+    def handle(self, text, mic, profile):
+        self.handled += 1
+
+
+class FallbackModule(SyntheticModule):
+
+    def __init__(self):
+        self.__name__ = 'Fallback'
+        self.WORDS = []
+        self.PRIORITY = -(sys.maxint + 1)
+        self.handled = 0
+
+    def isValid(self, text):
+        return True
+
+
+class DummyMic(object):
+
+    def say(self, phrase):
+        pass
+
+
+class SyntheticBrain(brain.Brain):
+
+    modules_to_load = []
+
+    @classmethod
+    def get_modules(cls):
+        return sorted(cls.modules_to_load, key=lambda m: m.PRIORITY,
+                      reverse=True)
+
+
+class LegacyBrain(SyntheticBrain):
+
+    def query(self, texts):
+        for module in self.modules:
+            for text in texts:
+                if module.isValid(text):
+                    module.handle(text, self.mic, self.profile)
+                    return
+
+
+def get_queries(modules, count, hypotheses, hit_rate=0.5):
+    """
+    Returns:
+        A list of lists of hypotheses. Each query contains a keyword of a
+        random module with a probability of hit_rate, the others can only be
+        handled by the fallback module.
+    """
+    filler = ['PLEASE', 'WHAT', 'IS', 'THE', 'TELL', 'ME', 'ABOUT', 'NOW']
+    queries = []
+    for i in range(count):
+        keyword = None
+        if random.random() < hit_rate:
+            keyword = random.choice(random.choice(modules).WORDS)
+        texts = []
+        for j in range(hypotheses):
+            words = random.sample(filler, 4)
+            if keyword is not None and j == hypotheses - 1:
+                words.append(keyword)
+            texts.append(' '.join(words))
+        queries.append(texts)
+    return queries
+
+
+def run(brain_class, queries, repeat):
+    b = brain_class(DummyMic(), {})
+
+    def route():
+        for texts in queries:
+            b.query(texts)
+    return min(timeit.repeat(route, number=1, repeat=repeat))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Brain routing benchmark')
+    parser.add_argument('--modules', type=int, default=300,
+                        help='number of synthetic modules (Default: 300)')
+    parser.add_argument('--words', type=int, default=5,
+                        help='WORDS per module (Default: 5)')
+    parser.add_argument('--hypotheses', type=int, default=5,
+                        help='hypotheses per query (Default: 5)')
+    parser.add_argument('--queries', type=int, default=200,
+                        help='number of queries (Default: 200)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of repetitions (Default: 5)')
+    args = parser.parse_args()
+
+    random.seed(0)
+    modules = [SyntheticModule(i, args.words) for i in range(args.modules)]
+    queries = get_queries(modules, args.queries, args.hypotheses)
+    pattern_modules = [SyntheticModule(i, args.words, patterns=True)
+                       for i in range(args.modules)]
+
+    print("%-8s %12s %12s" % ('', 'total', 'per query'))
+    for name, brain_class, scenario_modules in (
+            ('legacy', LegacyBrain, modules),
+            ('indexed', SyntheticBrain, modules),
+            ('patterns', SyntheticBrain, pattern_modules)):
+        SyntheticBrain.modules_to_load = scenario_modules + [FallbackModule()]
+        duration = run(brain_class, queries, args.repeat)
+        print("%-8s %9.1f ms %9.3f ms"
+              % (name, duration * 1000, duration * 1000 / len(queries)))
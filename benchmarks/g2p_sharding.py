@@ -0,0 +1,80 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+"""
+Measures how long Phonetisaurus takes to convert a large vocabulary (like
+the words of a big MPD library) with one process and with a process per CPU:
+
+    python2 -m benchmarks.g2p_sharding --words 10000
+
+The pronunciation cache is bypassed, so that every run converts all words.
+Needs phonetisaurus-g2p and the FST model from the profile.
+"""
+import os
+import shutil
+import random
+import string
+import timeit
+import argparse
+import tempfile
+import multiprocessing
+from client import g2p
+
+
+def get_words(count):
+    """
+    Returns:
+        A list of count distinct pronounceable words
+    """
+    onsets = ['B', 'CH', 'D', 'F', 'G', 'K', 'L', 'M', 'N', 'P', 'R', 'S',
+              'SH', 'T', 'TR', 'ST', 'BL', 'V', 'W', 'Z']
+    vowels = ['A', 'E', 'I', 'O', 'U', 'EE', 'OO', 'AI', 'OU']
+    words = set()
+    while len(words) < count:
+        syllables = random.randint(1, 4)
+        word = ''.join(random.choice(onsets) + random.choice(vowels)
+                       for i in range(syllables))
+        if random.random() < 0.5:
+            word += random.choice(string.ascii_uppercase)
+        words.add(word)
+    return sorted(words)
+
+
+def run(words, workers, repeat):
+    tempdir = tempfile.mkdtemp()
+    try:
+        cache_file = os.path.join(tempdir, 'g2p-cache.json')
+        conf = g2p.PhonetisaurusG2P.get_config()
+        conf['workers'] = workers
+
+        def translate():
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            g2pconv = g2p.PhonetisaurusG2P(cache_file=cache_file, **conf)
+            g2pconv.translate(words)
+        return min(timeit.repeat(translate, number=1, repeat=repeat))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='G2P sharding benchmark')
+    parser.add_argument('--words', type=int, default=10000,
+                        help='number of words (Default: 10000)')
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of parallel processes (Default: ' +
+                             'number of CPUs)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of repetitions (Default: 3)')
+    args = parser.parse_args()
+
+    random.seed(0)
+    words = get_words(args.words)
+
+    print("%-10s %12s %12s" % ('', 'total', 'per word'))
+    for name, workers in (('single', 1),
+                          ('sharded', args.workers)):
+        duration = run(words, workers, args.repeat)
+        print("%-10s %10.2f s %9.3f ms"
+              % ('%s (%d)' % (name, workers), duration,
+                 duration * 1000 / len(words)))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+"""
+Measures how long it takes to import the STT and TTS engine modules and to
+resolve an engine slug to its class, each in a fresh interpreter.
+
+Run it from Jasper's main folder on the target device:
+
+    python2 -m benchmarks.startup_imports --stt-engine sphinx
+
+The engine modules only import the dependencies of the engine that is
+actually used. For comparison, the 'eager' scenario additionally imports all
+backend dependencies up front, like the engine modules used to do.
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+EAGER_IMPORTS = ['pip.req', 'requests', 'client.vocabcompiler', 'mad', 'gtts',
+                 'pyvona']
+
+SCRIPT = """
+import time
+import json
+start = time.time()
+for name in %(eager)r:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+from client import stt, tts
+imported = time.time()
+stt_engine = stt.get_engine_by_slug(%(stt_engine)r)
+tts_engine = tts.get_engine_by_slug(%(tts_engine)r)
+resolved = time.time()
+print(json.dumps([imported - start, resolved - imported]))
+"""
+
+
+def run(eager, stt_engine, tts_engine):
+    script = SCRIPT % {'eager': EAGER_IMPORTS if eager else [],
+                       'stt_engine': stt_engine,
+                       'tts_engine': tts_engine}
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Startup import benchmark')
+    parser.add_argument('--stt-engine', default='sphinx',
+                        help='slug of the STT engine (Default: sphinx)')
+    parser.add_argument('--tts-engine', default='espeak-tts',
+                        help='slug of the TTS engine (Default: espeak-tts)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of repetitions (Default: 5)')
+    args = parser.parse_args()
+
+    print("%-8s %12s %12s" % ('', 'import', 'resolve'))
+    for name, eager in (('eager', True), ('lazy', False)):
+        results = [run(eager, args.stt_engine, args.tts_engine)
+                   for i in range(args.repeat)]
+        print("%-8s %9.1f ms %9.1f ms"
+              % (name, min(r[0] for r in results) * 1000,
+                 min(r[1] for r in results) * 1000))
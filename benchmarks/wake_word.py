@@ -0,0 +1,103 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+"""
+Measures how quickly the passive STT engine recognizes the wake word when
+partial hypotheses are checked after every chunk (as Mic.passiveListen does),
+compared to waiting for the full decode of the recording.
+
+Run it from Jasper's main folder on the target device:
+
+    python2 -m benchmarks.wake_word --positive static/audio/jasper.wav \\
+        --negative static/audio/time.wav
+
+The audio is fed to the engine as if it was recorded in real time. Latencies
+are reported relative to the end of each clip, so negative values mean that
+the wake word was detected before the clip ended. Every negative clip that
+triggers a detection counts as a false accept.
+"""
+import timeit
+import argparse
+
+from client import stt, jasperpath
+from client.audiosegment import AudioSegment
+
+
+def run(engine, audio, persona, chunk):
+    """
+    Feeds audio to engine chunk by chunk.
+
+    Returns:
+        A tuple (partial_latency, full_latency), each of which is None if the
+        persona wasn't recognized
+    """
+    step = chunk * audio.width * audio.channels
+    chunk_time = float(chunk) / audio.rate
+    lag = 0.0
+    partial_latency = None
+
+    engine.start_utterance(rate=audio.rate, width=audio.width,
+                           channels=audio.channels)
+    for offset in range(0, len(audio.data), step):
+        start = timeit.default_timer()
+        engine.feed(audio.data[offset:offset + step])
+        detected = any(persona in phrase for phrase in engine.partial())
+        # processing time that exceeds the duration of a chunk delays all
+        # following chunks
+        lag = max(0.0, lag + timeit.default_timer() - start - chunk_time)
+        if detected and partial_latency is None:
+            end = float(offset + step) / len(audio.data) * audio.duration
+            partial_latency = end + lag - audio.duration
+
+    start = timeit.default_timer()
+    transcribed = engine.finish()
+    full_latency = lag + timeit.default_timer() - start
+    if not any(persona in phrase for phrase in transcribed):
+        full_latency = None
+
+    return (partial_latency, full_latency)
+
+
+def fmt(latency):
+    return '%+8.3f s' % latency if latency is not None else '       -  '
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Wake word benchmark')
+    parser.add_argument('--positive', nargs='*',
+                        default=[jasperpath.data('audio', 'jasper.wav')],
+                        help='clips that contain the wake word')
+    parser.add_argument('--negative', nargs='*',
+                        default=[jasperpath.data('audio', 'time.wav')],
+                        help='clips that don\'t contain the wake word')
+    parser.add_argument('--persona', default='JASPER',
+                        help='the wake word (Default: JASPER)')
+    parser.add_argument('--engine', default='sphinx',
+                        help='slug of the passive STT engine ' +
+                             '(Default: sphinx)')
+    parser.add_argument('--chunk', type=int, default=1024,
+                        help='samples per chunk, as in Mic (Default: 1024)')
+    args = parser.parse_args()
+
+    engine = stt.get_engine_by_slug(args.engine).get_passive_instance()
+
+    results = {}
+    print("%-40s %10s %10s" % ('clip', 'partial', 'full'))
+    for kind, clips in (('positive', args.positive),
+                        ('negative', args.negative)):
+        results[kind] = []
+        for clip in clips:
+            with open(clip, 'rb') as f:
+                audio = AudioSegment.from_wav(f)
+            latencies = run(engine, audio, args.persona, args.chunk)
+            results[kind].append(latencies)
+            print("%-40s %s %s" % (clip[-40:], fmt(latencies[0]),
+                                   fmt(latencies[1])))
+
+    for i, name in enumerate(('partial', 'full')):
+        detected = [r[i] for r in results['positive'] if r[i] is not None]
+        false_accepts = [r[i] for r in results['negative']
+                         if r[i] is not None]
+        print("%-8s detected %d/%d, mean latency %s, false accepts %d/%d"
+              % (name, len(detected), len(results['positive']),
+                 fmt(sum(detected) / len(detected) if detected else None),
+                 len(false_accepts), len(results['negative'])))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8-*-
+"""
+In-memory audio that the Mic hands over to the STT engines, so that recorded
+utterances don't need to be written to (and parsed from) WAV files.
+"""
+import wave
+import cStringIO
+
+
+class AudioSegment(object):
+    """
+    Raw PCM audio data together with its format. Engines that need a WAV file
+    can get one with to_wav(), all others can use the raw data directly.
+    """
+
+    def __init__(self, data, rate=16000, width=2, channels=1):
+        """
+        Arguments:
+            data -- raw PCM audio data
+            rate -- (optional) the sample rate in Hz (Default: 16000)
+            width -- (optional) the sample width in bytes (Default: 2)
+            channels -- (optional) the number of channels (Default: 1)
+        """
+        self.data = data
+        self.rate = rate
+        self.width = width
+        self.channels = channels
+        self._wav = None
+
+    @classmethod
+    def from_chunks(cls, chunks, **kwargs):
+        """
+        Creates an AudioSegment from a list of chunks of raw audio data.
+        """
+        return cls(''.join(chunks), **kwargs)
+
+    @classmethod
+    def from_wav(cls, fp):
+        """
+        Creates an AudioSegment from a WAV file object.
+        """
+        wav = wave.open(fp, 'rb')
+        try:
+            return cls(wav.readframes(wav.getnframes()),
+                       rate=wav.getframerate(),
+                       width=wav.getsampwidth(),
+                       channels=wav.getnchannels())
+        finally:
+            wav.close()
+
+    @property
+    def view(self):
+        """
+        Returns:
+            A memoryview of the raw audio data, for slicing without copies
+        """
+        return memoryview(self.data)
+
+    @property
+    def duration(self):
+        """
+        Returns:
+            The duration in seconds
+        """
+        frame_size = self.width * self.channels
+        return float(len(self.data)) / (self.rate * frame_size)
+
+    def to_wav(self):
+        """
+        Returns:
+            The audio data as WAV file contents (created on first use)
+        """
+        if self._wav is None:
+            f = cStringIO.StringIO()
+            wav = wave.open(f, 'wb')
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(self.width)
+            wav.setframerate(self.rate)
+            wav.writeframes(self.data)
+            wav.close()
+            self._wav = f.getvalue()
+        return self._wav
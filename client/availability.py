@@ -0,0 +1,160 @@
+# -*- coding: utf-8-*-
+"""
+Caches the results of the engines' is_available() checks on disk, so that
+Jasper doesn't need to spawn processes or connect to servers to probe the
+same engines on every start.
+
+While an engine is probed, the checks from the diagnose module it runs are
+recorded. A cached result stays valid as long as these checks would still
+give the same answer:
+    - executables: same path and modification time
+    - python imports: same module file and modification time (which changes
+      whenever the package is upgraded)
+    - network connections: the result is younger than the network TTL
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import pkgutil
+import jasperpath
+import diagnose
+import config as jasperconfig
+
+
+class AvailabilityCache(object):
+
+    NETWORK_TTL = 600
+
+    def __init__(self, fname=None, network_ttl=None):
+        """
+        Arguments:
+            fname -- (optional) the path of the cache file (Default:
+                     availability.json in the config dir)
+            network_ttl -- (optional) seconds until results that depend on
+                           a network connection are probed again
+        """
+        self._logger = logging.getLogger(__name__)
+        self._fname = (fname if fname is not None
+                       else jasperpath.config('availability.json'))
+        self._network_ttl = (network_ttl if network_ttl is not None
+                             else self.NETWORK_TTL)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def get_key(engine):
+        return '%s.%s' % (engine.__module__, engine.__name__)
+
+    @staticmethod
+    def get_fingerprint(kind, name):
+        """
+        Returns:
+            A JSON-serializable value that changes if the result of the check
+            could change
+        """
+        if kind == 'executable':
+            path = diagnose.find_executable(name)
+        elif kind == 'python_import':
+            try:
+                loader = pkgutil.get_loader(name)
+            except ImportError:
+                loader = None
+            path = loader.get_filename() if loader is not None else None
+        else:
+            return None
+        if path is None:
+            return None
+        try:
+            return [path, os.stat(path).st_mtime]
+        except OSError:
+            return [path, None]
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self._fname, 'r') as f:
+                    self._entries = json.load(f)
+            except (IOError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        dirname = os.path.dirname(self._fname)
+        try:
+            with tempfile.NamedTemporaryFile(dir=dirname, suffix='.tmp',
+                                             delete=False) as f:
+                json.dump(self._entries, f)
+            os.rename(f.name, self._fname)
+        except (IOError, OSError):
+            self._logger.debug("Unable to write availability cache '%s'",
+                               self._fname, exc_info=True)
+
+    def _is_valid(self, entry):
+        age = time.time() - entry['checked']
+        for kind, name, fingerprint in entry['checks']:
+            if kind == 'network':
+                if not 0 <= age < self._network_ttl:
+                    return False
+            elif self.get_fingerprint(kind, name) != fingerprint:
+                return False
+        return True
+
+    def is_available(self, engine):
+        """
+        Returns the cached result of engine.is_available() if it's still
+        valid, otherwise probes the engine and caches the result.
+
+        Arguments:
+            engine -- an engine class
+
+        Returns:
+            True or False
+        """
+        key = self.get_key(engine)
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is not None and self._is_valid(entry):
+                self._logger.debug("Using cached availability of '%s': %r",
+                                   key, entry['available'])
+                return entry['available']
+
+            with diagnose.record_checks() as checks:
+                available = bool(engine.is_available())
+
+            self._entries[key] = {
+                'available': available,
+                'checked': time.time(),
+                'checks': sorted([kind, name, self.get_fingerprint(kind, name)]
+                                 for kind, name in checks)}
+            self._save()
+            return available
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._save()
+
+
+_cache = None
+
+
+def is_available(engine):
+    """
+    Checks if an engine is available, using the shared availability cache.
+
+    Arguments:
+        engine -- an engine class
+
+    Returns:
+        True or False
+    """
+    global _cache
+    if _cache is None:
+        profile = jasperconfig.get_profile()
+        _cache = AvailabilityCache(
+            network_ttl=(profile.get('availability') or {}).get(
+                'network_ttl'))
+    return _cache.is_available(engine)
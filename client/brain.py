@@ -1,11 +1,223 @@
 # -*- coding: utf-8-*-
+import re
+import time
+import sre_parse
+import sre_constants
 import logging
-import pkgutil
-import jasperpath
+import plugins
+import transcription
+import handlers
+
+
+_LEFT_BOUNDARIES = (sre_constants.AT_BOUNDARY, sre_constants.AT_BEGINNING,
+                    sre_constants.AT_BEGINNING_STRING)
+_RIGHT_BOUNDARIES = (sre_constants.AT_BOUNDARY, sre_constants.AT_END,
+                     sre_constants.AT_END_STRING)
+
+
+# Word boundaries in PATTERNS only know ASCII word characters
+_LITERAL_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def _is_right_boundary(item):
+    return item[0] == sre_constants.AT and item[1] in _RIGHT_BOUNDARIES
+
+
+def get_required_literals(items, left=False, right=False):
+    """
+    Finds literal strings that every match of a parsed regex contains.
+
+    Arguments:
+        items -- the regex, parsed with sre_parse
+        left -- (optional) True if the regex is preceded by a word boundary
+        right -- (optional) True if the regex is followed by a word boundary
+
+    Returns:
+        A list of (literal, left, right) tuples, at least one of which occurs
+        in every match, or None if there are no such literals. The literals
+        are lower case, left and right are True if they are delimited by
+        word boundaries.
+    """
+    items = list(items)
+    candidates = []
+    run = []
+    run_left = False
+    after_boundary = left
+    for i, (op, av) in enumerate(items):
+        if op == sre_constants.LITERAL and av < 128:
+            if not run:
+                run_left = after_boundary
+            run.append(chr(av).lower())
+            after_boundary = False
+            continue
+        if run:
+            candidates.append([(''.join(run), run_left,
+                                _is_right_boundary((op, av)))])
+            run = []
+        if op == sre_constants.AT:
+            after_boundary = av in _LEFT_BOUNDARIES
+            continue
+
+        before_boundary = (_is_right_boundary(items[i + 1])
+                           if i + 1 < len(items) else right)
+        if op == sre_constants.SUBPATTERN:
+            literals = get_required_literals(av[1], after_boundary,
+                                             before_boundary)
+        elif op == sre_constants.BRANCH:
+            literals = []
+            for branch in av[1]:
+                branch_literals = get_required_literals(
+                    branch, after_boundary, before_boundary)
+                if branch_literals is None:
+                    literals = None
+                    break
+                literals.extend(branch_literals)
+        elif (op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and
+                av[0] > 0):
+            literals = get_required_literals(av[2])
+        else:
+            literals = None
+        if literals:
+            candidates.append(literals)
+        after_boundary = False
+    if run:
+        candidates.append([(''.join(run), run_left, right)])
+    if not candidates:
+        return None
+    # prefer literals that can be looked up in the token index
+    return min(candidates, key=lambda literals: (
+        sum(1 for literal in literals if not get_literal_key(*literal)[0]),
+        -min(len(literal[0]) for literal in literals)))
+
+
+def get_literal_key(literal, left, right):
+    """
+    Returns:
+        A tuple (True, token) if the literal contains a token that is
+        delimited by word boundaries, otherwise (False, literal)
+    """
+    tokens = [match.group() for match
+              in _LITERAL_TOKEN_PATTERN.finditer(literal)
+              if (match.start() > 0 or left) and
+              (match.end() < len(literal) or right)]
+    if tokens:
+        return True, max(tokens, key=len)
+    return False, literal
+
+
+class ModuleIndex(object):
+    """
+    Finds the modules that can handle a text without asking every module.
+
+    Modules can declare a PATTERNS list of regular expressions (matched
+    case-insensitively). For these modules, PATTERNS replace isValid(). Only
+    the PATTERNS of modules that might match are searched: the literals that
+    every match of a module's PATTERNS contains are indexed, by token if
+    they are delimited by word boundaries (e.g. r'\btime\b'), otherwise as
+    substrings.
+
+    Modules without PATTERNS are indexed by the tokens of their WORDS and
+    only asked with isValid() if one of these tokens occurs in the text.
+    Modules without WORDS (like Unclear) are fallbacks and are asked about
+    every text.
+    """
+
+    TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, modules):
+        """
+        Arguments:
+        modules -- the modules to index, sorted by priority
+        """
+        self._logger = logging.getLogger(__name__)
+        self.modules = list(modules)
+        self._tokens = {}
+        self._fallbacks = set()
+        self._regexes = {}
+        self._literal_tokens = {}
+        self._literals = {}
+        self._unindexed = set()
+
+        for module in modules:
+            pattern = self._get_pattern(module)
+            if pattern is not None:
+                self._add_pattern(module, pattern)
+                continue
+            words = getattr(module, 'WORDS', [])
+            if not words:
+                self._fallbacks.add(module)
+            for word in words:
+                for token in self.tokenize(word):
+                    self._tokens.setdefault(token, set()).add(module)
+
+    def _get_pattern(self, module):
+        patterns = getattr(module, 'PATTERNS', None)
+        if not patterns:
+            return None
+        pattern = '|'.join('(?:%s)' % p for p in patterns)
+        try:
+            self._regexes[module] = re.compile(pattern, re.IGNORECASE)
+        except (re.error, AssertionError):
+            # Python raises an AssertionError if there are too many groups
+            self._logger.warning("Ignoring invalid PATTERNS of module '%s'",
+                                 module.__name__, exc_info=True)
+            return None
+        return pattern
+
+    def _add_pattern(self, module, pattern):
+        literals = get_required_literals(sre_parse.parse(pattern))
+        if literals is None:
+            # the PATTERNS need to be searched in every text
+            self._unindexed.add(module)
+            return
+        for literal in literals:
+            is_token, key = get_literal_key(*literal)
+            index = self._literal_tokens if is_token else self._literals
+            index.setdefault(key, set()).add(module)
+
+    def is_fallback(self, module):
+        return module in self._fallbacks
+
+    @classmethod
+    def tokenize(cls, text):
+        return cls.TOKEN_PATTERN.findall(text.upper())
+
+    def match(self, text):
+        """
+        Arguments:
+        text -- user input
+
+        Returns:
+        A tuple (matches, candidates) of the set of modules whose PATTERNS
+        match the text and the set of modules without PATTERNS that might be
+        able to handle it (and need to be asked with isValid())
+        """
+        pattern_candidates = set(self._unindexed)
+        for token in _LITERAL_TOKEN_PATTERN.findall(text):
+            pattern_candidates.update(
+                self._literal_tokens.get(token.lower(), ()))
+        if self._literals:
+            lowered = text.lower()
+            for literal, modules in self._literals.items():
+                if literal in lowered:
+                    pattern_candidates.update(modules)
+        matches = set(module for module in pattern_candidates
+                      if self._regexes[module].search(text))
+
+        candidates = set(self._fallbacks)
+        for token in self.tokenize(text):
+            candidates.update(self._tokens.get(token, ()))
+        return matches, candidates
 
 
 class Brain(object):
 
+    # Default number of seconds a handler may run without using the mic
+    HANDLER_TIMEOUT = 30
+    HANDLER_WORKERS = 2
+    # Default number of seconds between two handler metrics reports
+    METRICS_INTERVAL = 3600
+
     def __init__(self, mic, profile):
         """
         Instantiates a new Brain object, which cross-references user
@@ -13,6 +225,16 @@ class Brain(object):
         matters, as the Brain will cease execution on the first module
         that accepts a given input.
 
+        The modules' handle functions run on a pool of worker threads. A
+        handler that doesn't use the mic for longer than its timeout is
+        cancelled. The timeouts can be set in the profile:
+            handlers:
+              workers: 2
+              timeout: 30    # default for all modules
+              timeouts:
+                Gmail: 60    # overrides the module's TIMEOUT constant
+              metrics_interval: 3600    # seconds between metrics reports
+
         Arguments:
         mic -- used to interact with the user (for both input and output)
         profile -- contains information related to the user (e.g., phone
@@ -21,66 +243,179 @@ class Brain(object):
 
         self.mic = mic
         self.profile = profile
-        self.modules = self.get_modules()
+        self.index = ModuleIndex(self.get_modules())
         self._logger = logging.getLogger(__name__)
 
+        config = profile.get('handlers') or {}
+        self._default_timeout = config.get('timeout', self.HANDLER_TIMEOUT)
+        self._timeouts = config.get('timeouts') or {}
+        self.pool = handlers.WorkerPool(config.get('workers',
+                                                   self.HANDLER_WORKERS))
+        self.metrics = handlers.HandlerMetrics()
+        self._metrics_interval = config.get('metrics_interval',
+                                            self.METRICS_INTERVAL)
+        self._metrics_logged = time.time()
+
+    @property
+    def modules(self):
+        return self.index.modules
+
+    def reload_modules(self):
+        """
+        Replaces the modules with the current modules of the plugin registry
+        (e.g. after it has been reloaded). Queries that are already running
+        keep using the old modules.
+        """
+        self.index = ModuleIndex(self.get_modules())
+
     @classmethod
     def get_modules(cls):
         """
-        Dynamically loads all the modules in the modules folder and sorts
-        them by the PRIORITY key. If no PRIORITY is defined for a given
-        module, a priority of 0 is assumed.
-        """
-
-        logger = logging.getLogger(__name__)
-        locations = [jasperpath.PLUGIN_PATH]
-        logger.debug("Looking for modules in: %s",
-                     ', '.join(["'%s'" % location for location in locations]))
-        modules = []
-        for finder, name, ispkg in pkgutil.walk_packages(locations):
-            try:
-                loader = finder.find_module(name)
-                mod = loader.load_module(name)
-            except:
-                logger.warning("Skipped module '%s' due to an error.", name,
-                               exc_info=True)
-            else:
-                if hasattr(mod, 'WORDS'):
-                    logger.debug("Found module '%s' with words: %r", name,
-                                 mod.WORDS)
-                    modules.append(mod)
-                else:
-                    logger.warning("Skipped module '%s' because it misses " +
-                                   "the WORDS constant.", name)
-        modules.sort(key=lambda mod: mod.PRIORITY if hasattr(mod, 'PRIORITY')
-                     else 0, reverse=True)
-        return modules
+        Returns all the modules in the modules folder, sorted by the PRIORITY
+        key. If no PRIORITY is defined for a given module, a priority of 0 is
+        assumed. The modules are only loaded once and then shared by all
+        callers (see plugins.PluginRegistry).
+        """
+        return plugins.get_registry().modules
+
+    @staticmethod
+    def is_failed(module):
+        """
+        Returns:
+        True if the module is a plugin that couldn't be imported
+        """
+        return isinstance(module, plugins.PluginProxy) and module.failed
+
+    @staticmethod
+    def load(module):
+        """
+        Imports the module if it's a plugin that hasn't been imported yet.
+
+        Returns:
+        True if the module can be used
+        """
+        return (not isinstance(module, plugins.PluginProxy) or
+                module.load() is not None)
+
+    def rank(self, texts):
+        """
+        Ranks the pairs of modules and hypotheses that might be valid. Pairs
+        with a higher score of the hypothesis come first, pairs with the same
+        score are sorted by the priority of the module and the position of
+        the hypothesis. Fallback modules (without WORDS and PATTERNS) are
+        ranked after all other modules. Plugins that couldn't be imported are
+        left out.
+
+        Arguments:
+        texts -- user input, typically a Transcription of speech
+
+        Returns:
+        A list of (module, text, matched) tuples, best first. If matched is
+        True, the module's PATTERNS match the text, otherwise the module's
+        isValid function still has to be asked.
+        """
+        index = self.index
+        scores = transcription.get_scores(texts)
+        priorities = dict((module, i)
+                          for i, module in enumerate(index.modules))
+        pairs = []
+        for i, text in enumerate(texts):
+            score = scores[i] if scores is not None else 0
+            matches, candidates = index.match(text)
+            for module, matched in ([(m, True) for m in matches] +
+                                    [(m, False) for m in candidates]):
+                if self.is_failed(module):
+                    continue
+                key = (index.is_fallback(module), -score,
+                       priorities[module], i)
+                pairs.append((key, module, text, matched))
+        pairs.sort(key=lambda pair: pair[0])
+        return [pair[1:] for pair in pairs]
+
+    def log_metrics(self):
+        """
+        Logs how long the handlers of each module took and how they ended.
+        """
+        self._metrics_logged = time.time()
+        self._logger.info("Handler metrics:\n%s", self.metrics.report())
+
+    def get_timeout(self, module):
+        """
+        Returns:
+        The number of seconds the module's handler may run without using
+        the mic, or None if it may run forever
+        """
+        if module.__name__ in self._timeouts:
+            return self._timeouts[module.__name__]
+        return getattr(module, 'TIMEOUT', self._default_timeout)
 
     def query(self, texts):
         """
         Passes user input to the appropriate module, testing it against
-        each candidate module's isValid function.
+        each candidate module's PATTERNS or isValid function. The pairs of
+        modules and hypotheses are tested in the order of their rank, so the
+        best scored hypothesis that a module accepts is handled.
 
         Arguments:
-        text -- user input, typically speech, to be parsed by a module
-        """
-        for module in self.modules:
-            for text in texts:
-                if module.isValid(text):
-                    self._logger.debug("'%s' is a valid phrase for module " +
-                                       "'%s'", text, module.__name__)
-                    try:
-                        module.handle(text, self.mic, self.profile)
-                    except Exception:
-                        self._logger.error('Failed to execute module',
-                                           exc_info=True)
-                        self.mic.say("I'm sorry. I had some trouble with " +
-                                     "that operation. Please try again later.")
-                    else:
-                        self._logger.debug("Handling of phrase '%s' by " +
-                                           "module '%s' completed", text,
-                                           module.__name__)
-                    finally:
-                        return
+        texts -- user input, typically speech, to be parsed by a module
+        """
+        for module, text, matched in self.rank(texts):
+            if matched:
+                # the PATTERNS have been matched without importing the module
+                valid = self.load(module)
+            else:
+                valid = module.isValid(text)
+            if valid:
+                self._logger.debug("'%s' is a valid phrase for module " +
+                                   "'%s'", text, module.__name__)
+                self.handle(module, text)
+                return
         self._logger.debug("No module was able to handle any of these " +
                            "phrases: %r", texts)
+
+    def handle(self, module, text):
+        """
+        Runs the module's handle function on a worker thread and waits until
+        it's done or has timed out.
+
+        Arguments:
+        module -- the module that accepted the text
+        text -- the text to handle
+        """
+        mic = handlers.HandlerMic(self.mic)
+        start = time.time()
+        job = self.pool.submit(module.handle, text, mic, self.profile)
+        timeout = self.get_timeout(module)
+        while not job.done:
+            if timeout is None:
+                job.wait()
+                break
+            remaining = timeout - mic.idle_time
+            if remaining <= 0:
+                break
+            job.wait(remaining)
+        duration = time.time() - start
+
+        if not job.done:
+            mic.cancel()
+            job.cancelled = True
+            self.metrics.record(module.__name__, duration, 'timeout')
+            self._logger.error("Module '%s' didn't respond for %s seconds " +
+                               "while handling phrase '%s', cancelled it",
+                               module.__name__, timeout, text)
+            self.mic.say("I'm sorry. That took too long, so I stopped it. " +
+                         "Please try again later.")
+        elif job.exc_info is not None:
+            self.metrics.record(module.__name__, duration, 'failed')
+            self._logger.error('Failed to execute module',
+                               exc_info=job.exc_info)
+            self.mic.say("I'm sorry. I had some trouble with " +
+                         "that operation. Please try again later.")
+        else:
+            self.metrics.record(module.__name__, duration, 'completed')
+            self._logger.debug("Handling of phrase '%s' by module '%s' " +
+                               "completed in %.1f ms", text, module.__name__,
+                               duration * 1000)
+
+        if time.time() - self._metrics_logged >= self._metrics_interval:
+            self.log_metrics()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8-*-
+"""
+Loads the user's profile (profile.yml). The profile is only parsed once and
+then cached until the file is modified, so all engines and modules can read
+their settings from it without touching the disk again.
+"""
+import os
+import logging
+import threading
+import yaml
+import jasperpath
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def get_profile_path():
+    """
+    Returns:
+        The path of the profile in the config dir
+    """
+    return jasperpath.config('profile.yml')
+
+
+def load_profile(path=None):
+    """
+    Loads the profile, using the cached version if the file hasn't been
+    modified since it was last parsed. The returned dict is shared between
+    all callers and must not be modified.
+
+    Arguments:
+        path -- (optional) the path of the profile (Default: profile.yml in
+                the config dir)
+
+    Returns:
+        The profile as dict
+
+    Raises:
+        IOError if the profile can't be read
+        yaml.YAMLError if the profile is invalid
+    """
+    if path is None:
+        path = get_profile_path()
+    path = os.path.abspath(path)
+
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise IOError(e.errno, e.strerror, path)
+    key = (stat.st_mtime, stat.st_size)
+
+    with _lock:
+        if path in _cache and _cache[path][0] == key:
+            return _cache[path][1]
+
+        logging.getLogger(__name__).debug("Parsing profile '%s'", path)
+        with open(path, 'r') as f:
+            profile = yaml.safe_load(f)
+        if profile is None:
+            profile = {}
+        _cache[path] = (key, profile)
+        return profile
+
+
+def get_profile(path=None):
+    """
+    Like load_profile(), but returns an empty dict if the profile doesn't
+    exist.
+
+    Arguments:
+        path -- (optional) the path of the profile (Default: profile.yml in
+                the config dir)
+
+    Returns:
+        The profile as dict
+    """
+    try:
+        return load_profile(path)
+    except IOError:
+        return {}
+
+
+def clear_cache():
+    """
+    Makes the next call to load_profile() parse the profile again.
+    """
+    with _lock:
+        _cache.clear()
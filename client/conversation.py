@@ -1,5 +1,6 @@
 # -*- coding: utf-8-*-
 import logging
+import plugins
 from notifier import Notifier
 from brain import Brain
 
@@ -14,12 +15,56 @@ class Conversation(object):
         self.brain = Brain(mic, profile)
         self.notifier = Notifier(profile)
 
+        # Reload the modules when their files change (plugins: reload: false
+        # in the profile disables this)
+        config = profile.get('plugins') or {}
+        self._registry = plugins.get_registry()
+        self._phrases = self._registry.phrases
+        self._watcher = None
+        if config.get('reload', True):
+            self._watcher = plugins.PluginWatcher(
+                self._registry, self._reloadModules,
+                interval=config.get('reload_interval'))
+
+    def _reloadModules(self):
+        """
+        Called by the plugin watcher after the modules have been reloaded.
+        Compiles the vocabulary for the new phrases in the background. The
+        active STT engine switches to it when it's ready.
+        """
+        self.brain.reload_modules()
+        phrases = self._registry.phrases
+        if phrases == self._phrases:
+            self._logger.info("Reloaded modules, phrases are unchanged.")
+            return
+        self._phrases = phrases
+
+        # the local mic doesn't have an STT engine
+        stt_engine = getattr(self.mic, 'active_stt_engine', None)
+        vocabulary = (stt_engine.get_vocabulary('default')
+                      if stt_engine is not None else None)
+        if vocabulary is None:
+            self._logger.info("Reloaded modules, no vocabulary to compile.")
+            return
+        self._logger.info("Reloaded modules, compiling vocabulary...")
+        import vocabcompiler
+        vocabulary.compile_in_background(vocabcompiler.get_all_phrases(),
+                                         callback=stt_engine.load_vocabulary)
+
     def handleForever(self):
         """
         Delegates user input to the handling function when activated.
         """
         self._logger.info("Starting to handle conversation with keyword '%s'.",
                           self.persona)
+        if self._watcher is not None:
+            self._watcher.start()
+        try:
+            self._listen()
+        finally:
+            self.brain.log_metrics()
+
+    def _listen(self):
         while True:
             # Print notifications until empty
             notifications = self.notifier.getAllNotifications()
@@ -6,7 +6,7 @@ import socket
 import subprocess
 import pkgutil
 import logging
-import pip.req
+import contextlib
 import jasperpath
 if sys.version_info < (3, 3):
     from distutils.spawn import find_executable
@@ -15,6 +15,37 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# Callables that get notified about every check, see record_checks()
+_check_listeners = []
+
+
+def _notify_check(kind, name):
+    for listener in _check_listeners:
+        listener(kind, name)
+
+
+@contextlib.contextmanager
+def record_checks():
+    """
+    Records which checks are run inside the with block, e.g. to find out
+    what the result of an is_available() method depends on.
+
+    Example:
+        with record_checks() as checks:
+            engine.is_available()
+        # checks is now a set like {('executable', 'espeak')}
+    """
+    checks = set()
+
+    def listener(kind, name):
+        checks.add((kind, name))
+
+    _check_listeners.append(listener)
+    try:
+        yield checks
+    finally:
+        _check_listeners.remove(listener)
+
 
 def check_network_connection(server="www.google.com"):
     """
@@ -29,6 +60,7 @@ def check_network_connection(server="www.google.com"):
     """
     logger = logging.getLogger(__name__)
     logger.debug("Checking network connection to server '%s'...", server)
+    _notify_check('network', server)
     try:
         # see if we can resolve the host name -- tells us if there is
         # a DNS listening
@@ -56,6 +88,7 @@ def check_executable(executable):
     """
     logger = logging.getLogger(__name__)
     logger.debug("Checking executable '%s'...", executable)
+    _notify_check('executable', executable)
     executable_path = find_executable(executable)
     found = executable_path is not None
     if found:
@@ -78,6 +111,7 @@ def check_python_import(package_or_module):
     """
     logger = logging.getLogger(__name__)
     logger.debug("Checking python import '%s'...", package_or_module)
+    _notify_check('python_import', package_or_module)
     loader = pkgutil.get_loader(package_or_module)
     found = loader is not None
     if found:
@@ -104,6 +138,8 @@ def get_pip_requirements(fname=os.path.join(jasperpath.LIB_PATH,
     """
     logger = logging.getLogger(__name__)
     if os.access(fname, os.R_OK):
+        # pip takes a while to import, so only do it when it's needed
+        import pip.req
         reqs = list(pip.req.parse_requirements(fname))
         logger.debug("Found %d PIP requirements in file '%s'", len(reqs),
                      fname)
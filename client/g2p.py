@@ -1,17 +1,153 @@
 # -*- coding: utf-8-*-
 import os
 import re
+import json
 import subprocess
 import tempfile
 import logging
-
-import yaml
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 import diagnose
 import jasperpath
+import config as jasperconfig
+
+
+def _to_unicode(word):
+    return word.decode('utf-8') if isinstance(word, str) else word
+
+
+class _CacheFile(object):
+    """
+    The contents of a pronunciation cache file, which are shared by all
+    PronunciationCache instances that use the file.
+    """
+
+    def __init__(self, fname):
+        self._logger = logging.getLogger(__name__)
+        self.fname = fname
+        self.lock = threading.Lock()
+        self.changed = False
+        self._models = None
+
+    def get_entries(self, key):
+        """
+        Returns:
+            The dict with the pronunciations of the model identified by
+            key (the lock has to be held while it is used)
+        """
+        if self._models is None:
+            try:
+                with open(self.fname, 'r') as f:
+                    data = json.load(f)
+                if data['version'] != PronunciationCache.VERSION:
+                    raise ValueError('Outdated cache version')
+                self._models = data['models']
+            except (IOError, ValueError, KeyError, TypeError):
+                self._models = {}
+        return self._models.setdefault(key, {})
+
+    def save(self):
+        """
+        Writes the cache file, if it has been changed (the lock has to be
+        held).
+        """
+        if not self.changed:
+            return
+        dirname = os.path.dirname(self.fname)
+        try:
+            with tempfile.NamedTemporaryFile(dir=dirname, suffix='.tmp',
+                                             delete=False) as f:
+                json.dump({'version': PronunciationCache.VERSION,
+                           'models': self._models}, f)
+            os.rename(f.name, self.fname)
+        except (IOError, OSError):
+            self._logger.debug("Unable to write pronunciation cache '%s'",
+                               self.fname, exc_info=True)
+        else:
+            self.changed = False
+
+
+_cache_files = {}
+_cache_files_lock = threading.Lock()
+
+
+class PronunciationCache(object):
+    """
+    Keeps the pronunciations that Phonetisaurus returned for each word on
+    disk, so that only new words need to be converted when a vocabulary is
+    compiled again. The pronunciations are stored per model, which is
+    identified by the path, modification time and size of the FST model and
+    the number of results (nbest).
+
+    All instances that use the same file share its contents, so that
+    vocabularies compiled in parallel don't overwrite each other's
+    pronunciations.
+    """
+
+    VERSION = 1
+
+    def __init__(self, fname, fst_model, nbest=None):
+        """
+        Arguments:
+            fname -- the path of the cache file
+            fst_model -- the path of the FST model
+            nbest -- (optional) the number of results per word
+        """
+        fname = os.path.abspath(fname)
+        with _cache_files_lock:
+            if fname not in _cache_files:
+                _cache_files[fname] = _CacheFile(fname)
+            self._file = _cache_files[fname]
+        stat = os.stat(fst_model)
+        self._key = '%s:%r:%d:%s' % (fst_model, stat.st_mtime, stat.st_size,
+                                     nbest)
+
+    def get(self, words):
+        """
+        Arguments:
+            words -- a list of words
+
+        Returns:
+            A tuple of a dict with the cached pronunciations of the words
+            and a list of the words that aren't cached
+        """
+        found = {}
+        missing = []
+        with self._file.lock:
+            entries = self._file.get_entries(self._key)
+            for word in words:
+                key = _to_unicode(word)
+                if key in entries:
+                    found[word] = [pronounciation.encode('utf-8')
+                                   for pronounciation in entries[key]]
+                else:
+                    missing.append(word)
+        return found, missing
+
+    def update(self, words, results):
+        """
+        Arguments:
+            words -- the list of words that have been converted
+            results -- a dict with the pronunciations of the words (words
+                       without pronunciations are cached, too)
+        """
+        with self._file.lock:
+            entries = self._file.get_entries(self._key)
+            for word in words:
+                entries[_to_unicode(word)] = results.get(word, [])
+            self._file.changed = True
+
+    def save(self):
+        with self._file.lock:
+            self._file.save()
 
 
 class PhonetisaurusG2P(object):
+    # Lists of words are split into shards of at least this many words, which
+    # are converted by parallel Phonetisaurus processes
+    MIN_SHARD_SIZE = 500
     PATTERN = re.compile(r'^(?P<word>.+)\t(?P<precision>\d+\.\d+)\t<s> ' +
                          r'(?P<pronounciation>.*) </s>', re.MULTILINE)
 
@@ -65,22 +201,18 @@ class PhonetisaurusG2P(object):
 
     @classmethod
     def get_config(cls):
-        # FIXME: Replace this as soon as pull request
-        # jasperproject/jasper-client#128 has been merged
-
         conf = {'fst_model': os.path.join(jasperpath.APP_PATH, os.pardir,
                                           'phonetisaurus', 'g014b2b.fst')}
         # Try to get fst_model from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'pocketsphinx' in profile:
-                    if 'fst_model' in profile['pocketsphinx']:
-                        conf['fst_model'] = \
-                            profile['pocketsphinx']['fst_model']
-                    if 'nbest' in profile['pocketsphinx']:
-                        conf['nbest'] = int(profile['pocketsphinx']['nbest'])
+        profile = jasperconfig.get_profile()
+        if 'pocketsphinx' in profile:
+            if 'fst_model' in profile['pocketsphinx']:
+                conf['fst_model'] = \
+                    profile['pocketsphinx']['fst_model']
+            if 'nbest' in profile['pocketsphinx']:
+                conf['nbest'] = int(profile['pocketsphinx']['nbest'])
+            if 'g2p_workers' in profile['pocketsphinx']:
+                conf['workers'] = int(profile['pocketsphinx']['g2p_workers'])
         return conf
 
     def __new__(cls, fst_model=None, *args, **kwargs):
@@ -94,7 +226,18 @@ class PhonetisaurusG2P(object):
         inst = object.__new__(cls, fst_model, *args, **kwargs)
         return inst
 
-    def __init__(self, fst_model=None, nbest=None):
+    def __init__(self, fst_model=None, nbest=None, cache_file=None,
+                 workers=None):
+        """
+        Arguments:
+            fst_model -- the path of the FST model
+            nbest -- (optional) the number of pronunciations per word
+            cache_file -- (optional) the path of the pronunciation cache
+                          (Default: g2p-cache.json in the config dir)
+            workers -- (optional) the maximum number of Phonetisaurus
+                       processes that run in parallel (Default: the number
+                       of CPUs)
+        """
         self._logger = logging.getLogger(__name__)
 
         self.fst_model = os.path.abspath(fst_model)
@@ -104,10 +247,46 @@ class PhonetisaurusG2P(object):
         if self.nbest is not None:
             self._logger.debug("Will use the %d best results.", self.nbest)
 
+        if workers is None:
+            try:
+                workers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                workers = 1
+        self.workers = max(1, workers)
+
+        if cache_file is None:
+            cache_file = jasperpath.config('g2p-cache.json')
+        self._cache = PronunciationCache(cache_file, self.fst_model,
+                                         nbest=self.nbest)
+
     def _translate_word(self, word):
         return self.execute(self.fst_model, word, nbest=self.nbest)
 
+    def _get_shards(self, words):
+        count = min(self.workers,
+                    max(1, len(words) // self.MIN_SHARD_SIZE))
+        return [words[i::count] for i in range(count)]
+
     def _translate_words(self, words):
+        shards = self._get_shards(words)
+        if len(shards) == 1:
+            return self._translate_shard(words)
+
+        # The work is done by the Phonetisaurus processes, so threads are
+        # sufficient to run them in parallel
+        self._logger.debug('Converting %d words in %d shards', len(words),
+                           len(shards))
+        pool = ThreadPool(len(shards))
+        try:
+            results = pool.map(self._translate_shard, shards)
+        finally:
+            pool.close()
+        output = {}
+        for result in results:
+            output.update(result)
+        return output
+
+    def _translate_shard(self, words):
         with tempfile.NamedTemporaryFile(suffix='.g2p', delete=False) as f:
             # The 'delete=False' kwarg is kind of a hack, but Phonetisaurus
             # won't work if we remove it, because it seems that I can't open
@@ -121,13 +300,37 @@ class PhonetisaurusG2P(object):
         return output
 
     def translate(self, words):
-        if type(words) is str or len(words) == 1:
+        """
+        Converts words to phonemes. Only words that aren't in the
+        pronunciation cache yet are passed to Phonetisaurus.
+
+        Arguments:
+            words -- a word or a list of words
+
+        Returns:
+            A dict with a list of pronunciations for each word that could be
+            converted
+        """
+        if isinstance(words, basestring):
+            words = [words]
+        output, missing = self._cache.get(words)
+        self._logger.debug('Found phonemes for %d words in cache',
+                           len(output))
+        if len(missing) == 1:
             self._logger.debug('Converting single word to phonemes')
-            output = self._translate_word(words if type(words) is str
-                                          else words[0])
-        else:
-            self._logger.debug('Converting %d words to phonemes', len(words))
-            output = self._translate_words(words)
+            results = self._translate_word(missing[0])
+        elif missing:
+            self._logger.debug('Converting %d words to phonemes',
+                               len(missing))
+            results = self._translate_words(missing)
+        if missing:
+            self._cache.update(missing, results)
+            self._cache.save()
+            output.update((word, results[word]) for word in missing
+                          if word in results)
+        output = dict((word, pronounciations)
+                      for word, pronounciations in output.items()
+                      if pronounciations)
         self._logger.debug('G2P conversion returned phonemes for %d words',
                            len(output))
         return output
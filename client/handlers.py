@@ -0,0 +1,235 @@
+# -*- coding: utf-8-*-
+"""
+Runs the modules' handle() functions on a bounded pool of worker threads, so
+that a hung handler (e.g. a network request that never returns) can't freeze
+the whole conversation.
+
+Python threads can't be killed, so handlers are cancelled cooperatively:
+each handler gets a HandlerMic, which raises HandlerCancelled as soon as the
+handler tries to use the mic after it has been cancelled. A handler's timeout
+only counts the time it spends without using the mic, so interactive modules
+can wait for the user as long as they like.
+"""
+import sys
+import time
+import Queue
+import logging
+import threading
+
+
+class HandlerCancelled(Exception):
+    pass
+
+
+class HandlerMic(object):
+    """
+    Wraps the Mic that is passed to a handler. Keeps track of when the
+    handler last used it and stops the handler once it has been cancelled.
+    """
+
+    def __init__(self, mic):
+        """
+        Arguments:
+            mic -- the Mic to wrap
+        """
+        self._mic = mic
+        self._lock = threading.Lock()
+        self._active_calls = 0
+        self._last_activity = time.time()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def idle_time(self):
+        """
+        Returns:
+            The number of seconds since the handler last used the mic, or 0
+            if it's using it right now
+        """
+        with self._lock:
+            if self._active_calls:
+                return 0
+            return time.time() - self._last_activity
+
+    def _call(self, func, *args, **kwargs):
+        if self._cancelled:
+            raise HandlerCancelled()
+        with self._lock:
+            self._active_calls += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active_calls -= 1
+                self._last_activity = time.time()
+
+    def __getattr__(self, name):
+        attr = getattr(self._mic, name)
+        if not callable(attr):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            return self._call(attr, *args, **kwargs)
+        return wrapper
+
+
+class Job(object):
+
+    def __init__(self, func, args, kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._done = threading.Event()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.exc_info = None
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            self._done.set()
+            return
+        self.started = time.time()
+        try:
+            self.result = self._func(*self._args, **self._kwargs)
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.finished = time.time()
+            self._done.set()
+
+    def wait(self, timeout=None):
+        """
+        Returns:
+            True if the job is done, False if the timeout expired
+        """
+        self._done.wait(timeout)
+        return self._done.is_set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def duration(self):
+        """
+        Returns:
+            The number of seconds the job has been running, or None if it
+            hasn't been started yet
+        """
+        if self.started is None:
+            return None
+        return (self.finished if self.finished is not None
+                else time.time()) - self.started
+
+
+class WorkerPool(object):
+    """
+    A fixed number of daemon threads that run jobs from a queue. The threads
+    are only started when they are needed.
+    """
+
+    def __init__(self, size=2):
+        """
+        Arguments:
+            size -- (optional) the maximum number of worker threads
+        """
+        self.size = size
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._idle = 0
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.run()
+            finally:
+                with self._lock:
+                    self._idle += 1
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) on a worker thread.
+
+        Returns:
+            A Job
+        """
+        job = Job(func, args, kwargs)
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+            elif len(self._threads) < self.size:
+                thread = threading.Thread(target=self._work,
+                                          name='handler-%d' %
+                                          len(self._threads))
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+            else:
+                logging.getLogger(__name__).warning(
+                    "All %d handler workers are busy", self.size)
+        self._queue.put(job)
+        return job
+
+
+class HandlerMetrics(object):
+    """
+    Collects how long the handlers of each module take and how they end.
+    """
+
+    OUTCOMES = ('completed', 'failed', 'timeout')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, duration, outcome):
+        """
+        Arguments:
+            name -- the name of the module
+            duration -- the duration of the handler in seconds
+            outcome -- one of OUTCOMES
+        """
+        with self._lock:
+            stats = self._stats.setdefault(
+                name, dict([('count', 0), ('total', 0.0), ('max', 0.0)] +
+                           [(key, 0) for key in self.OUTCOMES]))
+            stats['count'] += 1
+            stats[outcome] += 1
+            stats['total'] += duration
+            stats['max'] = max(stats['max'], duration)
+
+    def get(self, name):
+        """
+        Returns:
+            A dict with the number of calls, their total and maximum duration
+            and the number of calls per outcome, or None if the module's
+            handler hasn't been called yet
+        """
+        with self._lock:
+            stats = self._stats.get(name)
+            return dict(stats) if stats is not None else None
+
+    def report(self):
+        """
+        Returns:
+            A table of the statistics of all modules as string
+        """
+        lines = ["%-16s %6s %10s %10s %6s %7s" % ('module', 'calls', 'mean',
+                                                  'max', 'failed', 'timeout')]
+        with self._lock:
+            for name, stats in sorted(self._stats.items()):
+                lines.append("%-16s %6d %7.1f ms %7.1f ms %6d %7d" % (
+                    name, stats['count'],
+                    stats['total'] * 1000 / stats['count'],
+                    stats['max'] * 1000, stats['failed'], stats['timeout']))
+        return '\n'.join(lines)
@@ -3,12 +3,470 @@
     The Mic class handles all interactions with the microphone and speaker.
 """
 import logging
-import tempfile
-import wave
+import threading
+import collections
 import audioop
-import pyaudio
+from abc import ABCMeta, abstractmethod
 import alteration
 import jasperpath
+import diagnose
+import config as jasperconfig
+
+# NumPy is an optional dependency, it's only imported when it's needed
+_numpy = False
+
+
+def get_numpy():
+    """
+    Returns:
+        The numpy module, or None if NumPy isn't installed
+    """
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def get_scores(data, chunk):
+    """
+    Scores a whole buffer of audio data in one call. The score of each chunk
+    is its RMS divided by 3, like the scores the VADs compare against the
+    threshold.
+
+    Arguments:
+        data -- raw audio data (16 bit signed little-endian samples)
+        chunk -- the number of samples per chunk
+
+    Returns:
+        A list of scores, one for each complete chunk in data
+    """
+    numpy = get_numpy()
+    if numpy is not None:
+        samples = numpy.frombuffer(data, dtype='<i2')
+        num_chunks = len(samples) // chunk
+        frames = samples[:num_chunks * chunk].reshape(num_chunks, chunk)
+        frames = frames.astype(numpy.int64)
+        sum_squares = numpy.einsum('ij,ij->i', frames, frames)
+        rms = numpy.sqrt(sum_squares / float(chunk))
+        return (rms.astype(numpy.int64) // 3).tolist()
+    size = 2 * chunk
+    return [audioop.rms(data[i:i + size], 2) / 3
+            for i in range(0, len(data) - size + 1, size)]
+
+
+class RingBuffer(object):
+    """
+    A fixed-size, thread-safe buffer that holds the most recently captured
+    audio chunks.
+
+    Chunks are addressed by their absolute position (i.e. the number of chunks
+    that have been appended before them), so that several readers can consume
+    the same buffer independently of each other.
+    """
+
+    def __init__(self, size):
+        """
+        Arguments:
+            size -- the maximum number of chunks this buffer can hold
+        """
+        self.size = size
+        self._chunks = [None] * size
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def position(self):
+        """
+        Returns:
+            The position of the next chunk that will be appended
+        """
+        return self._count
+
+    @property
+    def oldest(self):
+        """
+        Returns:
+            The position of the oldest chunk that is still in the buffer
+        """
+        return max(0, self._count - self.size)
+
+    def append(self, chunk):
+        with self._cond:
+            self._chunks[self._count % self.size] = chunk
+            self._count += 1
+            self._cond.notify_all()
+
+    def close(self):
+        """
+        Wakes up all waiting readers. Subsequent reads of chunks that have
+        not been captured yet will fail.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, position):
+        """
+        Returns the chunk at the given position. Blocks until the chunk has
+        been captured if necessary.
+
+        Arguments:
+            position -- the absolute position of the chunk
+
+        Raises:
+            IndexError if the chunk has already been overwritten
+            IOError if the buffer has been closed
+        """
+        with self._cond:
+            while position >= self._count:
+                if self._closed:
+                    raise IOError("Audio capture has been closed")
+                self._cond.wait()
+            if position < self._count - self.size:
+                raise IndexError("Audio chunk %d has already been overwritten"
+                                 % position)
+            return self._chunks[position % self.size]
+
+
+class AudioCapture(object):
+    """
+    Keeps a single PyAudio input stream open (in callback mode) and stores
+    everything it records in a RingBuffer. All listen methods of the Mic class
+    read from this buffer, so that the input stream doesn't need to be
+    reopened for every listening cycle and no audio is lost in between. The
+    ambient noise level of the input is tracked in the background.
+    """
+
+    def __init__(self, audio, rate, chunk, buffer_time=10):
+        """
+        Arguments:
+            audio -- a pyaudio.PyAudio instance
+            rate -- the sample rate in Hz
+            chunk -- the number of frames per chunk
+            buffer_time -- (optional) the number of seconds of audio that
+                           will be kept in the ring buffer (Default: 10)
+        """
+        import pyaudio
+        self._logger = logging.getLogger(__name__)
+        self._continue = pyaudio.paContinue
+        self.rate = rate
+        self.chunk = chunk
+        self.buffer = RingBuffer(int(buffer_time * rate / chunk) + 1)
+        self.noise_floor = NoiseFloorTracker(self.buffer, chunk, rate)
+        self._stream = audio.open(format=pyaudio.paInt16,
+                                  channels=1,
+                                  rate=rate,
+                                  input=True,
+                                  frames_per_buffer=chunk,
+                                  stream_callback=self._callback)
+        self._logger.debug("Audio capture started (%d Hz, %d frames per " +
+                           "chunk, %d chunks buffered)", rate, chunk,
+                           self.buffer.size)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        self.buffer.append(in_data)
+        return (None, self._continue)
+
+    def open(self):
+        """
+        Returns:
+            A CaptureReader that starts reading at the current position
+        """
+        return CaptureReader(self.buffer)
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self.buffer.close()
+        self._logger.debug("Audio capture stopped")
+
+
+class CaptureReader(object):
+    """
+    Reads chunks from a RingBuffer sequentially, just like a blocking PyAudio
+    input stream would.
+    """
+
+    def __init__(self, buffer, position=None):
+        self._logger = logging.getLogger(__name__)
+        self.buffer = buffer
+        self.position = buffer.position if position is None else position
+
+    def read(self):
+        """
+        Returns the next chunk, blocking until it has been captured. If the
+        reader fell so far behind that chunks have been overwritten, it skips
+        forward to the oldest chunk still available.
+        """
+        try:
+            data = self.buffer.get(self.position)
+        except IndexError:
+            oldest = self.buffer.oldest
+            self._logger.warning("Audio reader fell behind, skipped %d " +
+                                 "chunks", oldest - self.position)
+            self.position = oldest
+            data = self.buffer.get(self.position)
+        self.position += 1
+        return data
+
+    def read_available(self):
+        """
+        Returns all chunks that have been captured but not read yet, blocking
+        until there is at least one.
+        """
+        chunks = [self.read()]
+        while self.position < self.buffer.position:
+            chunks.append(self.read())
+        return chunks
+
+
+class NoiseFloorTracker(object):
+    """
+    Continuously estimates the ambient noise level of the live input in a
+    background thread, so that the Mic can look it up instantly instead of
+    measuring it before each listening cycle.
+
+    The noise floor is a low percentile of the scores of the last few seconds.
+    Unlike an average, it is barely affected by speech or other short
+    disturbances, but still follows lasting changes of the environment. It
+    is recomputed by the background thread whenever new audio arrives, so
+    looking it up once per chunk is cheap.
+    """
+
+    def __init__(self, buffer, chunk, rate, window_time=5, percentile=25,
+                 warmup_time=1):
+        """
+        Arguments:
+            buffer -- the RingBuffer the input is captured into
+            chunk -- the number of samples per chunk
+            rate -- the sample rate in Hz
+            window_time -- (optional) the number of seconds the estimate is
+                           based on (Default: 5)
+            percentile -- (optional) the percentile of the scores within the
+                          window that is used as noise floor (Default: 25)
+            warmup_time -- (optional) the number of seconds to capture before
+                           the first estimate is available (Default: 1)
+        """
+        self.chunk = chunk
+        self.percentile = percentile
+        self._scores = collections.deque(
+            maxlen=max(1, int(window_time * rate / chunk)))
+        self._warmup_chunks = max(1, int(warmup_time * rate / chunk))
+        self._level = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._reader = CaptureReader(buffer)
+        thread = threading.Thread(target=self._run,
+                                  name='NoiseFloorTracker')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                chunks = self._reader.read_available()
+                self._scores.extend(get_scores(''.join(chunks), self.chunk))
+                scores = sorted(self._scores)
+                with self._lock:
+                    self._level = scores[min(len(scores) - 1,
+                                             len(scores) * self.percentile /
+                                             100)]
+                if len(scores) >= self._warmup_chunks:
+                    self._ready.set()
+        except IOError:
+            # Audio capture has been closed
+            pass
+        finally:
+            self._ready.set()
+
+    @property
+    def level(self):
+        """
+        Returns:
+            The current noise floor as score. Blocks until enough audio has
+            been captured after startup.
+        """
+        self._ready.wait()
+        with self._lock:
+            return self._level
+
+
+class AbstractVAD(object):
+    """
+    Generic parent class for voice activity detectors (VADs). A VAD decides
+    for each chunk of audio whether it contains speech, which the Mic uses to
+    detect disturbances and to find the end of an utterance.
+    """
+    __metaclass__ = ABCMeta
+
+    @classmethod
+    def get_config(cls):
+        config = {}
+        profile = jasperconfig.get_profile()
+        if cls.SLUG in profile:
+            config.update(profile[cls.SLUG])
+        return config
+
+    @classmethod
+    def get_instance(cls):
+        config = cls.get_config()
+        instance = cls(**config)
+        return instance
+
+    @classmethod
+    @abstractmethod
+    def is_available(cls):
+        return True
+
+    @abstractmethod
+    def is_speech(self, data, threshold):
+        """
+        Checks if a chunk of audio contains speech.
+
+        Arguments:
+            data -- a chunk of raw audio data (16 bit signed samples)
+            threshold -- the score that ambient noise usually stays below
+
+        Returns:
+            True or False
+        """
+        pass
+
+
+class EnergyVAD(AbstractVAD):
+    """
+    Classic energy and zero-crossing rate based VAD. A chunk is considered to
+    contain speech if its score exceeds the threshold, or if it exceeds a
+    lower threshold and crosses zero as often as unvoiced sounds (e.g.
+    fricatives like "s" or "f") do.
+    """
+
+    SLUG = 'energy-vad'
+
+    def __init__(self, lower_ratio=0.75, zcr_threshold=0.3):
+        """
+        Arguments:
+            lower_ratio -- the lower threshold relative to the threshold
+            zcr_threshold -- the minimal number of zero crossings per sample
+                             to accept a chunk above the lower threshold
+        """
+        self.lower_ratio = lower_ratio
+        self.zcr_threshold = zcr_threshold
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def is_speech(self, data, threshold):
+        score = audioop.rms(data, 2) / 3
+        if score > threshold:
+            return True
+        if score > threshold * self.lower_ratio:
+            zcr = audioop.cross(data, 2) / (len(data) / 2.0)
+            return zcr >= self.zcr_threshold
+        return False
+
+
+class SpectralVAD(AbstractVAD):
+    """
+    Frame-level spectral VAD, similar to the one used in WebRTC. Each chunk is
+    split into short frames. A frame contains speech if it is loud enough,
+    most of its energy lies in the speech band and its spectrum is peaky
+    rather than flat (like noise). Requires NumPy, which is not installed
+    with Jasper's core dependencies.
+    """
+
+    SLUG = 'spectral-vad'
+
+    def __init__(self, rate=16000, frame_size=256, band=(300, 3400),
+                 min_band_ratio=0.5, max_flatness=0.3, min_speech_frames=2):
+        """
+        Arguments:
+            rate -- the sample rate in Hz
+            frame_size -- the number of samples per frame
+            band -- the speech band (lower and upper frequency in Hz)
+            min_band_ratio -- the minimal share of a frame's energy within the
+                              speech band
+            max_flatness -- the maximal spectral flatness (between 0 for a
+                            pure tone and 1 for white noise) of a frame
+            min_speech_frames -- the minimal number of speech frames for a
+                                 chunk to contain speech
+        """
+        self.frame_size = frame_size
+        self.min_band_ratio = min_band_ratio
+        self.max_flatness = max_flatness
+        self.min_speech_frames = min_speech_frames
+        import numpy
+        self._window = numpy.hanning(frame_size)
+        freqs = numpy.fft.rfftfreq(frame_size, 1.0 / rate)
+        self._band = (freqs >= band[0]) & (freqs <= band[1])
+
+    @classmethod
+    def is_available(cls):
+        return diagnose.check_python_import('numpy')
+
+    def is_speech(self, data, threshold):
+        import numpy
+        samples = numpy.frombuffer(data, dtype='<i2').astype(numpy.float64)
+        num_frames = len(samples) // self.frame_size
+        frames = samples[:num_frames * self.frame_size].reshape(
+            num_frames, self.frame_size)
+        scores = numpy.sqrt(numpy.mean(frames * frames, axis=1)) / 3
+        power = numpy.abs(numpy.fft.rfft(frames * self._window)) ** 2 + 1e-10
+        band_ratio = power[:, self._band].sum(axis=1) / power.sum(axis=1)
+        flatness = (numpy.exp(numpy.mean(numpy.log(power), axis=1)) /
+                    numpy.mean(power, axis=1))
+        speech = ((scores > threshold) &
+                  (band_ratio >= self.min_band_ratio) &
+                  (flatness <= self.max_flatness))
+        return int(numpy.sum(speech)) >= self.min_speech_frames
+
+
+def get_default_vad_slug():
+    return 'energy-vad'
+
+
+def get_vad_by_slug(slug=None):
+    """
+    Returns:
+        A VAD implementation available on the current platform
+
+    Raises:
+        ValueError if no VAD implementation is supported on this platform
+    """
+
+    if not slug or type(slug) is not str:
+        raise TypeError("Invalid slug '%s'", slug)
+
+    selected_vads = filter(lambda vad: hasattr(vad, "SLUG") and
+                           vad.SLUG == slug, get_vads())
+    if len(selected_vads) == 0:
+        raise ValueError("No VAD found for slug '%s'" % slug)
+    else:
+        if len(selected_vads) > 1:
+            print(("WARNING: Multiple VADs found for slug '%s'. " +
+                   "This is most certainly a bug.") % slug)
+        vad = selected_vads[0]
+        if not vad.is_available():
+            raise ValueError(("VAD '%s' is not available (due to " +
+                              "missing dependencies, etc.)") % slug)
+        return vad
+
+
+def get_vads():
+    def get_subclasses(cls):
+        subclasses = set()
+        for subclass in cls.__subclasses__():
+            subclasses.add(subclass)
+            subclasses.update(get_subclasses(subclass))
+        return subclasses
+    return [vad for vad in list(get_subclasses(AbstractVAD))
+            if hasattr(vad, 'SLUG') and vad.SLUG]
 
 
 class Mic:
@@ -16,7 +474,27 @@ class Mic:
     speechRec = None
     speechRec_persona = None
 
-    def __init__(self, speaker, passive_stt_engine, active_stt_engine):
+    RATE = 16000
+    CHUNK = 1024
+    # bytes per sample (16 bit signed, pyaudio.paInt16)
+    WIDTH = 2
+
+    # number of seconds of silence that end an utterance
+    SILENCE_TIME = 0.8
+    # number of seconds to wait for the user to start speaking
+    START_TIMEOUT = 3
+    # number of seconds of audio kept before and after detected speech
+    PADDING_TIME = 0.2
+    # number of seconds of audio kept before a disturbance was detected, so
+    # that the (quieter) onset of the keyword isn't clipped
+    PREROLL_TIME = 0.5
+    # maximal number of seconds to record after a disturbance was detected
+    POSTROLL_TIME = 2
+    # number of seconds of silence that end the keyword
+    POSTROLL_SILENCE_TIME = 0.25
+
+    def __init__(self, speaker, passive_stt_engine, active_stt_engine,
+                 capture=None, vad=None):
         """
         Initiates the pocketsphinx instance.
 
@@ -25,61 +503,76 @@ class Mic:
         passive_stt_engine -- performs STT while Jasper is in passive listen
                               mode
         acive_stt_engine -- performs STT while Jasper is in active listen mode
+        capture -- (optional) an already running AudioCapture instance to
+                   share with another Mic instance. If omitted, a new input
+                   stream is opened.
+        vad -- (optional) the voice activity detector to use. If omitted,
+               the one set as 'vad_engine' in the profile is used.
         """
         self._logger = logging.getLogger(__name__)
+        self._audio = None
+        self._owns_capture = False
+        self.capture = None
+        self._passive_stream = None
         self.speaker = speaker
         self.passive_stt_engine = passive_stt_engine
         self.active_stt_engine = active_stt_engine
-        self._logger.info("Initializing PyAudio. ALSA/Jack error messages " +
-                          "that pop up during this process are normal and " +
-                          "can usually be safely ignored.")
-        self._audio = pyaudio.PyAudio()
-        self._logger.info("Initialization of PyAudio completed.")
+        if capture is None:
+            import pyaudio
+            self._logger.info("Initializing PyAudio. ALSA/Jack error " +
+                              "messages that pop up during this process " +
+                              "are normal and can usually be safely " +
+                              "ignored.")
+            self._audio = pyaudio.PyAudio()
+            self._logger.info("Initialization of PyAudio completed.")
+            capture = AudioCapture(self._audio, self.RATE, self.CHUNK)
+            self._owns_capture = True
+        self.capture = capture
+
+        config = self.get_config()
+        if vad is None:
+            vad_slug = config.pop('vad_engine', get_default_vad_slug())
+            vad = get_vad_by_slug(vad_slug).get_instance()
+        self.vad = vad
+        self.silence_time = config.get('silence_time', self.SILENCE_TIME)
+        self.start_timeout = config.get('start_timeout', self.START_TIMEOUT)
+        self.padding_time = config.get('padding_time', self.PADDING_TIME)
+        self.preroll_time = config.get('preroll_time', self.PREROLL_TIME)
+        self.postroll_time = config.get('postroll_time', self.POSTROLL_TIME)
+        self.postroll_silence_time = config.get('postroll_silence_time',
+                                                self.POSTROLL_SILENCE_TIME)
 
     def __del__(self):
-        self._audio.terminate()
-
-    def getScore(self, data):
-        rms = audioop.rms(data, 2)
-        score = rms / 3
-        return score
+        if self._owns_capture and self.capture is not None:
+            self.capture.close()
+        if self._audio is not None:
+            self._audio.terminate()
+
+    @classmethod
+    def get_config(cls):
+        config = {}
+        profile = jasperconfig.get_profile()
+        if 'vad_engine' in profile:
+            config['vad_engine'] = profile['vad_engine']
+        if 'mic' in profile:
+            for key in ('silence_time', 'start_timeout',
+                        'padding_time', 'preroll_time',
+                        'postroll_time', 'postroll_silence_time'):
+                if key in profile['mic']:
+                    config[key] = float(profile['mic'][key])
+        return config
+
+    def _start_utterance(self, stt_engine):
+        stt_engine.start_utterance(
+            rate=self.RATE, channels=1, width=self.WIDTH)
 
     def fetchThreshold(self):
 
-        # TODO: Consolidate variables from the next three functions
         THRESHOLD_MULTIPLIER = 1.8
-        RATE = 16000
-        CHUNK = 1024
 
-        # number of seconds to allow to establish threshold
-        THRESHOLD_TIME = 1
-
-        # prepare recording stream
-        stream = self._audio.open(format=pyaudio.paInt16,
-                                  channels=1,
-                                  rate=RATE,
-                                  input=True,
-                                  frames_per_buffer=CHUNK)
-
-        # stores the audio data
-        frames = []
-
-        # stores the lastN score values
-        lastN = [i for i in range(20)]
-
-        # calculate the long run average, and thereby the proper threshold
-        for i in range(0, RATE / CHUNK * THRESHOLD_TIME):
-
-            data = stream.read(CHUNK)
-            frames.append(data)
-
-            # save this data point as a score
-            lastN.pop(0)
-            lastN.append(self.getScore(data))
-            average = sum(lastN) / len(lastN)
-
-        stream.stop_stream()
-        stream.close()
+        # the noise floor is tracked continuously in the background, so
+        # there's no need to spend time measuring it here
+        average = self.capture.noise_floor.level
 
         # this will be the benchmark to cause a disturbance over!
         THRESHOLD = average * THRESHOLD_MULTIPLIER
@@ -92,45 +585,21 @@ class Mic:
         needs to be restarted.
         """
 
-        THRESHOLD_MULTIPLIER = 1.8
-        RATE = 16000
-        CHUNK = 1024
-
-        # number of seconds to allow to establish threshold
-        THRESHOLD_TIME = 1
+        RATE = self.RATE
+        CHUNK = self.CHUNK
 
         # number of seconds to listen before forcing restart
         LISTEN_TIME = 10
 
-        # prepare recording stream
-        stream = self._audio.open(format=pyaudio.paInt16,
-                                  channels=1,
-                                  rate=RATE,
-                                  input=True,
-                                  frames_per_buffer=CHUNK)
-
-        # stores the audio data
-        frames = []
-
-        # stores the lastN score values
-        lastN = [i for i in range(30)]
-
-        # calculate the long run average, and thereby the proper threshold
-        for i in range(0, RATE / CHUNK * THRESHOLD_TIME):
-
-            data = stream.read(CHUNK)
-            frames.append(data)
+        preroll_chunks = int(self.preroll_time * RATE / CHUNK)
+        postroll_chunks = int(self.postroll_time * RATE / CHUNK)
+        silence_chunks = max(1, int(self.postroll_silence_time * RATE / CHUNK))
 
-            # save this data point as a score
-            lastN.pop(0)
-            lastN.append(self.getScore(data))
-            average = sum(lastN) / len(lastN)
-
-        # this will be the benchmark to cause a disturbance over!
-        THRESHOLD = average * THRESHOLD_MULTIPLIER
-
-        # save some memory for sound data
-        frames = []
+        # read from the always-open recording stream, where the previous
+        # cycle stopped, so that nothing said while it was decoding is lost
+        if self._passive_stream is None:
+            self._passive_stream = self.capture.open()
+        stream = self._passive_stream
 
         # flag raised when sound disturbance detected
         didDetect = False
@@ -138,54 +607,69 @@ class Mic:
         # start passively listening for disturbance above threshold
         for i in range(0, RATE / CHUNK * LISTEN_TIME):
 
-            data = stream.read(CHUNK)
-            frames.append(data)
-            score = self.getScore(data)
+            data = stream.read()
+
+            # the threshold follows the noise floor as it changes
+            THRESHOLD = self.fetchThreshold()
 
-            if score > THRESHOLD:
+            if self.vad.is_speech(data, THRESHOLD):
                 didDetect = True
                 break
 
         # no use continuing if no flag raised
         if not didDetect:
             print "No disturbance detected"
-            stream.stop_stream()
-            stream.close()
             return (None, None)
 
-        # cutoff any recording before this disturbance was detected
-        frames = frames[-20:]
-
-        # otherwise, let's keep recording for few seconds and save the file
-        DELAY_MULTIPLIER = 1
-        for i in range(0, RATE / CHUNK * DELAY_MULTIPLIER):
-
-            data = stream.read(CHUNK)
-            frames.append(data)
-
-        # save the audio data
-        stream.stop_stream()
-        stream.close()
-
-        with tempfile.NamedTemporaryFile(mode='w+b') as f:
-            wav_fp = wave.open(f, 'wb')
-            wav_fp.setnchannels(1)
-            wav_fp.setsampwidth(pyaudio.get_sample_size(pyaudio.paInt16))
-            wav_fp.setframerate(RATE)
-            wav_fp.writeframes(''.join(frames))
-            wav_fp.close()
-            f.seek(0)
-            # check if PERSONA was said
-            transcribed = self.passive_stt_engine.transcribe(f)
+        # the keyword is decoded while it is being recorded
+        stt_engine = self.passive_stt_engine
+        self._start_utterance(stt_engine)
+
+        # fetch the audio right before the disturbance from the ring buffer
+        detected = stream.position - 1
+        buffer = self.capture.buffer
+        preroll = CaptureReader(buffer, max(buffer.oldest,
+                                            detected - preroll_chunks))
+        for i in range(detected - preroll.position):
+            stt_engine.feed(preroll.read())
+        stt_engine.feed(data)
+
+        # otherwise, let's keep recording until the keyword is over
+        silent_chunks = 0
+        for i in range(0, postroll_chunks):
+
+            data = stream.read()
+            stt_engine.feed(data)
+
+            # no need to wait for the end of the keyword if PERSONA has
+            # already been recognized
+            if any(PERSONA in phrase for phrase in stt_engine.partial()):
+                stt_engine.finish()
+                self._passive_stream = None
+                return (THRESHOLD, PERSONA)
+
+            if self.vad.is_speech(data, THRESHOLD):
+                silent_chunks = 0
+            else:
+                silent_chunks += 1
+                if silent_chunks >= silence_chunks:
+                    break
+
+        # check if PERSONA was said
+        transcribed = stt_engine.finish()
 
         if any(PERSONA in phrase for phrase in transcribed):
+            # the audio after the keyword belongs to the conversation, the
+            # next cycle starts listening when it's over
+            self._passive_stream = None
             return (THRESHOLD, PERSONA)
 
         return (False, transcribed)
 
     def activeListen(self, THRESHOLD=None, LISTEN=True, MUSIC=False):
         """
-            Records until a second of silence or times out after 12 seconds
+            Records until the user stops speaking or times out after 12
+            seconds
 
             Returns the first matching string or None
         """
@@ -197,63 +681,74 @@ class Mic:
     def activeListenToAllOptions(self, THRESHOLD=None, LISTEN=True,
                                  MUSIC=False):
         """
-            Records until a second of silence or times out after 12 seconds
+            Records until the user stops speaking (as detected by the VAD) or
+            times out after 12 seconds. Only the part of the recording that
+            contains speech is transcribed.
 
             Returns a list of the matching options or None
         """
 
-        RATE = 16000
-        CHUNK = 1024
+        RATE = self.RATE
+        CHUNK = self.CHUNK
         LISTEN_TIME = 12
 
+        silence_chunks = int(self.silence_time * RATE / CHUNK)
+        start_chunks = int(self.start_timeout * RATE / CHUNK)
+        padding_chunks = int(self.padding_time * RATE / CHUNK)
+
         # check if no threshold provided
         if THRESHOLD is None:
             THRESHOLD = self.fetchThreshold()
 
         self.speaker.play(jasperpath.data('audio', 'beep_hi.wav'))
 
-        # prepare recording stream
-        stream = self._audio.open(format=pyaudio.paInt16,
-                                  channels=1,
-                                  rate=RATE,
-                                  input=True,
-                                  frames_per_buffer=CHUNK)
+        # start reading from the always-open recording stream right after
+        # the beep, so that it won't be part of the recording
+        stream = self.capture.open()
 
-        frames = []
-        # increasing the range # results in longer pause after command
-        # generation
-        lastN = [THRESHOLD * 1.2 for i in range(30)]
+        # Speech is fed to the STT engine as soon as it is recorded, so that
+        # most of the decoding is done by the time the user stops speaking.
+        # Only the part of the recording that contains speech (plus some
+        # padding) is fed, chunks after the last speech are held back until
+        # it's clear whether the utterance continues.
+        stt_engine = self.active_stt_engine
+        pending = collections.deque(maxlen=padding_chunks)
+        first_speech = None
+        last_speech = None
 
         for i in range(0, RATE / CHUNK * LISTEN_TIME):
 
-            data = stream.read(CHUNK)
-            frames.append(data)
-            score = self.getScore(data)
+            data = stream.read()
+
+            if self.vad.is_speech(data, THRESHOLD):
+                if first_speech is None:
+                    first_speech = i
+                    self._start_utterance(stt_engine)
+                last_speech = i
+                for frame in pending:
+                    stt_engine.feed(frame)
+                pending = []
+                stt_engine.feed(data)
+            elif first_speech is None:
+                pending.append(data)
+                if i >= start_chunks:
+                    break
+            else:
+                pending.append(data)
+                if i - last_speech >= silence_chunks:
+                    break
 
-            lastN.pop(0)
-            lastN.append(score)
+        self.speaker.play(jasperpath.data('audio', 'beep_lo.wav'))
 
-            average = sum(lastN) / float(len(lastN))
+        if first_speech is None:
+            self._logger.debug("No speech detected")
+            return []
 
-            # TODO: 0.8 should not be a MAGIC NUMBER!
-            if average < THRESHOLD * 0.8:
-                break
-
-        self.speaker.play(jasperpath.data('audio', 'beep_lo.wav'))
+        # cut off the silence after the utterance
+        for frame in pending[:padding_chunks]:
+            stt_engine.feed(frame)
 
-        # save the audio data
-        stream.stop_stream()
-        stream.close()
-
-        with tempfile.SpooledTemporaryFile(mode='w+b') as f:
-            wav_fp = wave.open(f, 'wb')
-            wav_fp.setnchannels(1)
-            wav_fp.setsampwidth(pyaudio.get_sample_size(pyaudio.paInt16))
-            wav_fp.setframerate(RATE)
-            wav_fp.writeframes(''.join(frames))
-            wav_fp.close()
-            f.seek(0)
-            return self.active_stt_engine.transcribe(f)
+        return stt_engine.finish()
 
     def say(self, phrase,
             OPTIONS=" -vdefault+m3 -p 40 -s 160 --stdout > say.wav"):
@@ -6,6 +6,8 @@ from client.app_utils import getTimezone
 
 WORDS = ["BIRTHDAY"]
 
+PATTERNS = [r'birthday']
+
 
 def handle(text, mic, profile):
     """
@@ -64,4 +66,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'birthday', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
@@ -6,6 +6,8 @@ from dateutil import parser
 
 WORDS = ["EMAIL", "INBOX"]
 
+PATTERNS = [r'\bemail\b']
+
 
 def getSender(email):
     """
@@ -135,4 +137,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\bemail\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
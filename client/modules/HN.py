@@ -8,6 +8,8 @@ from semantic.numbers import NumberService
 
 WORDS = ["HACKER", "NEWS", "YES", "NO", "FIRST", "SECOND", "THIRD"]
 
+PATTERNS = [r'\b(hack(er)?|HN)\b']
+
 PRIORITY = 4
 
 URL = 'http://news.ycombinator.com'
@@ -136,4 +138,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\b(hack(er)?|HN)\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
@@ -5,6 +5,8 @@ from client import jasperpath
 
 WORDS = ["JOKE", "KNOCK KNOCK"]
 
+PATTERNS = [r'\bjoke\b']
+
 
 def getRandomJoke(filename=jasperpath.data('text', 'JOKES.txt')):
     jokeFile = open(filename, "r")
@@ -63,4 +65,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\bjoke\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
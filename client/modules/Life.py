@@ -4,6 +4,8 @@ import re
 
 WORDS = ["MEANING", "OF", "LIFE"]
 
+PATTERNS = [r'\bmeaning of life\b']
+
 
 def handle(text, mic, profile):
     """
@@ -31,4 +33,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\bmeaning of life\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
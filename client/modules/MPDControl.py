@@ -8,6 +8,11 @@ from client.mic import Mic
 # Standard module stuff
 WORDS = ["MUSIC", "SPOTIFY"]
 
+PATTERNS = [r'MUSIC|SPOTIFY']
+
+# Music mode listens with its own Mic until the user closes it
+TIMEOUT = None
+
 
 def handle(text, mic, profile):
     """
@@ -57,7 +62,8 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return any(word in text.upper() for word in WORDS)
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
 
 
 # The interesting part
@@ -79,7 +85,8 @@ class MusicMode(object):
 
         self.mic = Mic(mic.speaker,
                        mic.passive_stt_engine,
-                       music_stt_engine)
+                       music_stt_engine,
+                       capture=mic.capture)
 
     def delegateInput(self, input):
 
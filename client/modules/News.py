@@ -6,6 +6,8 @@ from semantic.numbers import NumberService
 
 WORDS = ["NEWS", "YES", "NO", "FIRST", "SECOND", "THIRD"]
 
+PATTERNS = [r'\b(news|headline)\b']
+
 PRIORITY = 3
 
 URL = 'http://news.ycombinator.com'
@@ -128,4 +130,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\b(news|headline)\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
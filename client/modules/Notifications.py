@@ -5,6 +5,8 @@ import facebook
 
 WORDS = ["FACEBOOK", "NOTIFICATION"]
 
+PATTERNS = [r'\bnotification|Facebook\b']
+
 
 def handle(text, mic, profile):
     """
@@ -55,4 +57,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\bnotification|Facebook\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
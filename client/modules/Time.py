@@ -6,6 +6,8 @@ from semantic.dates import DateService
 
 WORDS = ["TIME"]
 
+PATTERNS = [r'\btime\b']
+
 
 def handle(text, mic, profile):
     """
@@ -32,4 +34,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\btime\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
@@ -11,6 +11,9 @@ from semantic.dates import DateService
 
 WORDS = ["WEATHER", "TODAY", "TOMORROW"]
 
+PATTERNS = [
+    r'\b(weathers?|temperature|forecast|outside|hot|cold|jacket|coat|rain)\b']
+
 
 def replaceAcronyms(text):
     """
@@ -168,5 +171,5 @@ def isValid(text):
         Arguments:
         text -- user-input, typically transcribed speech
     """
-    return bool(re.search(r'\b(weathers?|temperature|forecast|outside|hot|' +
-                          r'cold|jacket|coat|rain)\b', text, re.IGNORECASE))
+    return any(re.search(pattern, text, re.IGNORECASE)
+               for pattern in PATTERNS)
@@ -0,0 +1,495 @@
+# -*- coding: utf-8-*-
+"""
+Discovers and loads the plugin modules. Every module is only loaded once per
+process, no matter how often the Brain or the vocabulary compiler ask for the
+modules.
+
+The WORDS, PRIORITY and PATTERNS constants of the plugins are read from their
+source code (with the ast module) and kept in a manifest on disk, so finding
+the modules and their phrases doesn't need to import any of them. Each plugin
+is represented by a PluginProxy that only imports the real module when it is
+first used.
+
+A PluginWatcher can poll the plugin files and reload the registry when they
+change, so that plugins can be added or edited without restarting Jasper.
+"""
+import os
+import ast
+import json
+import hashlib
+import logging
+import pkgutil
+import tempfile
+import threading
+import jasperpath
+import timing
+
+MANIFEST_CONSTANTS = ('WORDS', 'PRIORITY', 'PATTERNS')
+# Needs to be increased whenever MANIFEST_CONSTANTS changes
+MANIFEST_VERSION = 2
+
+
+def get_module_constants(fname):
+    """
+    Extracts the manifest constants (WORDS, PRIORITY, PATTERNS) from the
+    source code of a module without importing it.
+
+    Arguments:
+        fname -- the path of the module's source file
+
+    Returns:
+        A dict with the values of the constants that the module defines
+
+    Raises:
+        ValueError if a constant can't be determined statically (e.g. because
+        it is computed or assigned more than once)
+        SyntaxError if the module can't be parsed
+    """
+    with open(fname, 'r') as f:
+        tree = ast.parse(f.read(), fname)
+
+    assignments = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if (isinstance(target, ast.Name) and
+                        target.id in MANIFEST_CONSTANTS):
+                    assignments.setdefault(target.id, []).append(node.value)
+
+    # every assignment to a constant has to be a top-level assignment
+    stores = [node.id for node in ast.walk(tree)
+              if isinstance(node, ast.Name) and
+              isinstance(node.ctx, ast.Store) and
+              node.id in MANIFEST_CONSTANTS]
+
+    constants = {}
+    for name, values in assignments.items():
+        if len(values) != 1 or stores.count(name) != 1:
+            raise ValueError("'%s' is assigned more than once" % name)
+        constants[name] = ast.literal_eval(values[0])
+    for name in stores:
+        if name not in constants:
+            raise ValueError("'%s' is not a top-level assignment" % name)
+    return constants
+
+
+def _encode_strings(value):
+    # json returns unicode strings, but plugins define byte strings
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    elif isinstance(value, list):
+        return [_encode_strings(item) for item in value]
+    elif isinstance(value, dict):
+        return dict((_encode_strings(key), _encode_strings(item))
+                    for key, item in value.items())
+    return value
+
+
+class PluginManifest(object):
+    """
+    Caches the manifest constants of the plugin files on disk. Entries are
+    keyed by the file's modification time and size, and by its SHA1 hash if
+    these have changed.
+    """
+
+    def __init__(self, fname=None):
+        """
+        Arguments:
+            fname -- (optional) the path of the manifest file (Default:
+                     plugins.json in the config dir)
+        """
+        self._logger = logging.getLogger(__name__)
+        self._fname = (fname if fname is not None
+                       else jasperpath.config('plugins.json'))
+        self._entries = None
+        self._changed = False
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self._fname, 'r') as f:
+                    manifest = _encode_strings(json.load(f))
+                if manifest['version'] != MANIFEST_VERSION:
+                    raise ValueError('Outdated manifest version')
+                self._entries = manifest['plugins']
+            except (IOError, ValueError, KeyError, TypeError):
+                self._entries = {}
+        return self._entries
+
+    @staticmethod
+    def _get_hash(fname):
+        with open(fname, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def get(self, fname):
+        """
+        Arguments:
+            fname -- the path of a plugin's source file
+
+        Returns:
+            A dict with the manifest constants of the plugin, or None if they
+            can't be determined without importing it
+        """
+        entries = self._load()
+        stat = os.stat(fname)
+        entry = entries.get(fname)
+        if entry is not None:
+            if (entry['mtime'], entry['size']) == (stat.st_mtime,
+                                                   stat.st_size):
+                return entry['constants']
+            sha1 = self._get_hash(fname)
+            if entry['sha1'] == sha1:
+                entry['mtime'] = stat.st_mtime
+                self._changed = True
+                return entry['constants']
+        else:
+            sha1 = self._get_hash(fname)
+
+        try:
+            constants = get_module_constants(fname)
+        except (ValueError, SyntaxError) as e:
+            self._logger.debug("Can't read constants of '%s' statically: %s",
+                               fname, e)
+            return None
+        self.set(fname, constants, sha1=sha1)
+        return constants
+
+    def set(self, fname, constants, sha1=None):
+        """
+        Stores the manifest constants of a plugin.
+
+        Arguments:
+            fname -- the path of the plugin's source file
+            constants -- a dict with the values of the manifest constants
+            sha1 -- (optional) the SHA1 hash of the file
+        """
+        stat = os.stat(fname)
+        self._load()[fname] = {'mtime': stat.st_mtime,
+                               'size': stat.st_size,
+                               'sha1': (sha1 if sha1 is not None
+                                        else self._get_hash(fname)),
+                               'constants': constants}
+        self._changed = True
+
+    def save(self):
+        if not self._changed:
+            return
+        dirname = os.path.dirname(self._fname)
+        try:
+            with tempfile.NamedTemporaryFile(dir=dirname, suffix='.tmp',
+                                             delete=False) as f:
+                json.dump({'version': MANIFEST_VERSION,
+                           'plugins': self._entries}, f)
+            os.rename(f.name, self._fname)
+        except (IOError, OSError):
+            self._logger.debug("Unable to write plugin manifest '%s'",
+                               self._fname, exc_info=True)
+        else:
+            self._changed = False
+
+
+class PluginProxy(object):
+    """
+    Stands in for a plugin module. The manifest constants are available right
+    away, the module itself is imported when anything else is needed (e.g.
+    when the Brain asks it whether it's valid for some input).
+    """
+
+    def __init__(self, name, loader, constants, module=None):
+        """
+        Arguments:
+            name -- the name of the module
+            loader -- the PEP 302 loader of the module
+            constants -- a dict with the manifest constants of the module
+            module -- (optional) the module, if it has been imported already
+        """
+        self.__name__ = name
+        for key, value in constants.items():
+            setattr(self, key, value)
+        self._loader = loader
+        self._module = module
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<plugin %r>' % self.__name__
+
+    @property
+    def is_loaded(self):
+        return self._module is not None
+
+    @property
+    def failed(self):
+        """
+        Returns:
+            True if the module has been imported unsuccessfully
+        """
+        return self._failed
+
+    def load(self):
+        """
+        Returns:
+            The plugin module, or None if it couldn't be imported
+        """
+        with self._lock:
+            if self._module is None and not self._failed:
+                logger = logging.getLogger(__name__)
+                try:
+                    with timing.phase("module '%s'" % self.__name__):
+                        self._module = self._loader.load_module(self.__name__)
+                except Exception:
+                    logger.warning("Skipped module '%s' due to an error.",
+                                   self.__name__, exc_info=True)
+                    self._failed = True
+            return self._module
+
+    def isValid(self, text):
+        module = self.load()
+        return module is not None and module.isValid(text)
+
+    def handle(self, text, mic, profile):
+        module = self.load()
+        if module is None:
+            raise ImportError("Module '%s' couldn't be imported" %
+                              self.__name__)
+        return module.handle(text, mic, profile)
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't manifest constants
+        if name.startswith('_') or name in MANIFEST_CONSTANTS:
+            raise AttributeError(name)
+        module = self.load()
+        if module is None:
+            raise AttributeError(name)
+        return getattr(module, name)
+
+
+class PluginRegistry(object):
+
+    def __init__(self, locations=None, manifest=None):
+        """
+        Arguments:
+            locations -- (optional) a list of directories to look for modules
+                         in (Default: [jasperpath.PLUGIN_PATH])
+            manifest -- (optional) the PluginManifest to use
+        """
+        self._logger = logging.getLogger(__name__)
+        self._locations = (locations if locations is not None
+                           else [jasperpath.PLUGIN_PATH])
+        self._manifest = manifest if manifest is not None \
+            else PluginManifest()
+        self._lock = threading.Lock()
+        self._modules = None
+        self._phrases = None
+        # the proxies of the last load, so that unchanged plugins don't need
+        # to be imported again after a reload
+        self._proxies = {}
+        self._file_stats = None
+
+    def get_file_stats(self):
+        """
+        Returns:
+            A dict with the modification time and size of every Python file
+            in the plugin locations
+        """
+        stats = {}
+        for location in self._locations:
+            for dirpath, dirnames, filenames in os.walk(location):
+                for filename in filenames:
+                    if filename.endswith('.py'):
+                        fname = os.path.join(dirpath, filename)
+                        try:
+                            stat = os.stat(fname)
+                        except OSError:
+                            continue
+                        stats[fname] = (stat.st_mtime, stat.st_size)
+        return stats
+
+    def has_changed(self):
+        """
+        Returns:
+            True if plugin files have been added, removed or modified since
+            the modules were loaded
+        """
+        with self._lock:
+            file_stats = self._file_stats
+        return file_stats is not None and self.get_file_stats() != file_stats
+
+    def _get_plugin(self, finder, name):
+        loader = finder.find_module(name)
+        fname = loader.get_filename()
+        stat = os.stat(fname)
+        file_key = (stat.st_mtime, stat.st_size)
+        if fname in self._proxies and self._proxies[fname][0] == file_key:
+            return self._proxies[fname][1]
+
+        constants = self._manifest.get(fname)
+        if constants is not None:
+            proxy = PluginProxy(name, loader, constants)
+            self._proxies[fname] = (file_key, proxy)
+            return proxy
+
+        # The constants can only be determined by importing the module
+        with timing.phase("module '%s'" % name):
+            mod = loader.load_module(name)
+        constants = dict((key, getattr(mod, key))
+                         for key in MANIFEST_CONSTANTS if hasattr(mod, key))
+        for key in ('WORDS', 'PATTERNS'):
+            if key in constants:
+                constants[key] = list(constants[key])
+        self._manifest.set(fname, constants)
+        proxy = PluginProxy(name, loader, constants, module=mod)
+        self._proxies[fname] = (file_key, proxy)
+        return proxy
+
+    def _load_modules(self):
+        self._logger.debug("Looking for modules in: %s",
+                           ', '.join(["'%s'" % location
+                                      for location in self._locations]))
+        self._file_stats = self.get_file_stats()
+        modules = []
+        for finder, name, ispkg in pkgutil.walk_packages(self._locations):
+            try:
+                mod = self._get_plugin(finder, name)
+            except Exception:
+                self._logger.warning("Skipped module '%s' due to an error.",
+                                     name, exc_info=True)
+            else:
+                if hasattr(mod, 'WORDS'):
+                    self._logger.debug("Found module '%s' with words: %r",
+                                       name, mod.WORDS)
+                    modules.append(mod)
+                else:
+                    self._logger.warning("Skipped module '%s' because it " +
+                                         "misses the WORDS constant.", name)
+        self._manifest.save()
+        for fname in set(self._proxies) - set(self._file_stats):
+            del self._proxies[fname]
+        modules.sort(key=lambda mod: mod.PRIORITY if hasattr(mod, 'PRIORITY')
+                     else 0, reverse=True)
+        return modules
+
+    @property
+    def modules(self):
+        """
+        Returns:
+            A list of all plugins (as PluginProxy objects), sorted by their
+            PRIORITY (highest first). Modules without PRIORITY have a
+            priority of 0.
+        """
+        with self._lock:
+            if self._modules is None:
+                self._modules = self._load_modules()
+            return list(self._modules)
+
+    @property
+    def phrases(self):
+        """
+        Returns:
+            A sorted list of the unique phrases in the WORDS of all modules,
+            except for modules that failed to import
+        """
+        modules = [module for module in self.modules if not module.failed]
+        with self._lock:
+            if self._phrases is None or self._phrases[0] != modules:
+                phrases = set()
+                for module in modules:
+                    phrases.update(module.WORDS)
+                self._phrases = (modules, sorted(phrases))
+            return list(self._phrases[1])
+
+    def reset(self):
+        """
+        Makes the registry discover and load the modules again on next use.
+        """
+        with self._lock:
+            self._modules = None
+            self._phrases = None
+            self._proxies = {}
+            self._file_stats = None
+
+    def reload(self):
+        """
+        Discovers the modules again. Only plugins whose files have been
+        added or modified since the last load are imported again.
+
+        Returns:
+            The new list of modules
+        """
+        with self._lock:
+            self._logger.info("Reloading modules")
+            self._modules = self._load_modules()
+            self._phrases = None
+            return list(self._modules)
+
+
+class PluginWatcher(object):
+    """
+    Polls the modification times of the plugin files in a background thread
+    and reloads the registry when they change.
+    """
+
+    INTERVAL = 2
+
+    def __init__(self, registry, callback=None, interval=None):
+        """
+        Arguments:
+            registry -- the PluginRegistry to watch
+            callback -- (optional) called without arguments (in the watcher
+                        thread) after the registry has been reloaded
+            interval -- (optional) seconds between two checks (Default: 2)
+        """
+        self._logger = logging.getLogger(__name__)
+        self._registry = registry
+        self._callback = callback
+        self._interval = interval if interval is not None else self.INTERVAL
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """
+        Reloads the registry if the plugin files have changed.
+
+        Returns:
+            True if the registry has been reloaded
+        """
+        if not self._registry.has_changed():
+            return False
+        self._registry.reload()
+        if self._callback is not None:
+            try:
+                self._callback()
+            except Exception:
+                self._logger.error("Failed to apply reloaded modules",
+                                   exc_info=True)
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.check()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='plugin-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns:
+        The PluginRegistry shared by the whole process
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PluginRegistry()
+        return _registry
@@ -1,20 +1,28 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8-*-
 import os
-import wave
 import json
 import tempfile
 import logging
 import urllib
 import urlparse
 import re
+import time
+import socket
+import struct
 import subprocess
+import threading
 from abc import ABCMeta, abstractmethod
-import requests
-import yaml
 import jasperpath
+import config as jasperconfig
 import diagnose
-import vocabcompiler
+import availability
+import timing
+from audiosegment import AudioSegment
+from transcription import Transcription
+
+# Guards the handover of engines prepared by load_vocabulary()
+_vocabulary_lock = threading.Lock()
 
 
 class AbstractSTTEngine(object):
@@ -26,41 +34,214 @@ class AbstractSTTEngine(object):
     VOCABULARY_TYPE = None
 
     @classmethod
-    def get_config(cls):
+    def get_config(cls, profile=None):
+        """
+        Arguments:
+            profile -- (optional) the profile to read the settings from
+                       (Default: the cached profile.yml)
+
+        Returns:
+            A dict with the keyword arguments for the engine's constructor
+        """
         return {}
 
     @classmethod
-    def get_instance(cls, vocabulary_name, phrases):
-        config = cls.get_config()
-        if cls.VOCABULARY_TYPE:
-            vocabulary = cls.VOCABULARY_TYPE(vocabulary_name,
-                                             path=jasperpath.config(
-                                                 'vocabularies'))
-            if not vocabulary.matches_phrases(phrases):
-                vocabulary.compile(phrases)
+    def get_vocabulary_type(cls):
+        """
+        Returns:
+            The vocabulary class from the vocabcompiler module that is named
+            by VOCABULARY_TYPE, or None if this engine has no vocabulary
+        """
+        if not cls.VOCABULARY_TYPE:
+            return None
+        # vocabcompiler (and its dependencies) are only imported for
+        # engines that need them
+        import vocabcompiler
+        return getattr(vocabcompiler, cls.VOCABULARY_TYPE)
+
+    @classmethod
+    def get_vocabulary(cls, vocabulary_name):
+        """
+        Arguments:
+            vocabulary_name -- the name of the vocabulary
+
+        Returns:
+            The engine's vocabulary with that name (which might not have been
+            compiled yet), or None if this engine has no vocabulary
+        """
+        vocabulary_type = cls.get_vocabulary_type()
+        if not vocabulary_type:
+            return None
+        return vocabulary_type(vocabulary_name,
+                               path=jasperpath.config('vocabularies'))
+
+    @classmethod
+    def get_instance(cls, vocabulary_name, phrases, profile=None):
+        """
+        Creates an instance of this engine with a vocabulary that contains
+        the phrases. If the vocabulary needs to be compiled and an older
+        revision of it exists, the instance uses the older revision while
+        the vocabulary is compiled in the background and switches to the new
+        one when it's ready (unless vocabulary: compile_in_background is
+        false in the profile).
+
+        Arguments:
+            vocabulary_name -- the name of the vocabulary
+            phrases -- a list of phrases the engine should recognize
+            profile -- (optional) the profile to read the settings from
+                       (Default: the cached profile.yml)
+        """
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        config = cls.get_config(profile)
+        vocabulary = cls.get_vocabulary(vocabulary_name)
+        compile_in_background = False
+        if vocabulary is not None:
+            with timing.phase("vocabulary '%s'" % vocabulary_name):
+                if not vocabulary.matches_phrases(phrases):
+                    if (vocabulary.is_compiled and
+                            (profile.get('vocabulary') or {}).get(
+                                'compile_in_background', True)):
+                        compile_in_background = True
+                    else:
+                        with timing.phase('compile'):
+                            vocabulary.compile(phrases)
             config['vocabulary'] = vocabulary
-        instance = cls(**config)
+        with timing.phase("%s init" % cls.__name__):
+            instance = cls(**config)
+        if compile_in_background:
+            vocabulary.compile_in_background(phrases,
+                                             callback=instance.load_vocabulary)
         return instance
 
+    def load_vocabulary(self, vocabulary):
+        """
+        Prepares switching to a newly compiled vocabulary, by creating a new
+        engine for it. This can take a while, so it should be called from a
+        background thread. The engine switches to the new vocabulary when the
+        next utterance starts.
+
+        Arguments:
+            vocabulary -- the new vocabulary
+        """
+        config = self.get_config()
+        config['vocabulary'] = vocabulary
+        engine = type(self)(**config)
+        with _vocabulary_lock:
+            self._pending_engine = engine
+        self._logger.info("Vocabulary '%s' is ready and will be used from " +
+                          "the next utterance on", vocabulary.name)
+
+    def _switch_vocabulary(self):
+        """
+        Takes over the state of the engine prepared by load_vocabulary(), if
+        there is one. The old state ends up in the prepared engine and is
+        cleaned up with it.
+
+        The lock keeps load_vocabulary() from storing a pending engine in
+        the state that is just being swapped out, where it would get lost.
+        """
+        with _vocabulary_lock:
+            engine = self.__dict__.pop('_pending_engine', None)
+            if engine is not None:
+                self.__dict__, engine.__dict__ = (engine.__dict__,
+                                                  self.__dict__)
+
     @classmethod
-    def get_passive_instance(cls):
-        phrases = vocabcompiler.get_keyword_phrases()
-        return cls.get_instance('keyword', phrases)
+    def get_passive_instance(cls, profile=None):
+        phrases = []
+        if cls.VOCABULARY_TYPE:
+            import vocabcompiler
+            with timing.phase('keyword phrases'):
+                phrases = vocabcompiler.get_keyword_phrases()
+        return cls.get_instance('keyword', phrases, profile=profile)
 
     @classmethod
-    def get_active_instance(cls):
-        phrases = vocabcompiler.get_all_phrases()
-        return cls.get_instance('default', phrases)
+    def get_active_instance(cls, profile=None):
+        phrases = []
+        if cls.VOCABULARY_TYPE:
+            import vocabcompiler
+            with timing.phase('module phrases'):
+                phrases = vocabcompiler.get_all_phrases()
+        return cls.get_instance('default', phrases, profile=profile)
 
     @classmethod
     @abstractmethod
     def is_available(cls):
         return True
 
+    @staticmethod
+    def get_audio_segment(fp):
+        """
+        Arguments:
+            fp -- an AudioSegment or a WAV file object
+
+        Returns:
+            An AudioSegment containing the audio data of fp
+        """
+        if isinstance(fp, AudioSegment):
+            return fp
+        return AudioSegment.from_wav(fp)
+
     @abstractmethod
     def transcribe(self, fp):
+        """
+        Performs STT, transcribing audio and returning the results.
+
+        Arguments:
+            fp -- an AudioSegment or a WAV file object
+
+        Returns:
+            A Transcription, best match first
+        """
         pass
 
+    def start_utterance(self, rate=16000, width=2, channels=1):
+        """
+        Starts a new utterance, whose audio data will be passed to feed()
+        chunk by chunk while it is being recorded.
+
+        By default, the chunks are just collected and transcribed as a whole
+        by finish(). Engines that can decode incrementally should override
+        start_utterance(), feed() and finish().
+
+        Arguments:
+            rate -- (optional) the sample rate in Hz (Default: 16000)
+            width -- (optional) the sample width in bytes (Default: 2)
+            channels -- (optional) the number of channels (Default: 1)
+        """
+        self._switch_vocabulary()
+        self._utterance_format = {'rate': rate, 'width': width,
+                                  'channels': channels}
+        self._utterance_chunks = []
+
+    def feed(self, chunk):
+        """
+        Arguments:
+            chunk -- the next chunk of raw audio data of the utterance
+        """
+        self._utterance_chunks.append(chunk)
+
+    def partial(self):
+        """
+        Returns:
+            A list of transcriptions of the audio data fed so far, or an
+            empty list if the engine can't decode incrementally
+        """
+        return []
+
+    def finish(self):
+        """
+        Ends the current utterance.
+
+        Returns:
+            A Transcription, best match first
+        """
+        audio = AudioSegment.from_chunks(self._utterance_chunks,
+                                         **self._utterance_format)
+        self._utterance_chunks = []
+        return self.transcribe(audio)
+
 
 class PocketSphinxSTT(AbstractSTTEngine):
     """
@@ -68,7 +249,7 @@ class PocketSphinxSTT(AbstractSTTEngine):
     """
 
     SLUG = 'sphinx'
-    VOCABULARY_TYPE = vocabcompiler.PocketsphinxVocabulary
+    VOCABULARY_TYPE = 'PocketsphinxVocabulary'
 
     def __init__(self, vocabulary, hmm_dir="/usr/local/share/" +
                  "pocketsphinx/model/hmm/en_US/hub4wsj_sc_8k"):
@@ -123,45 +304,68 @@ class PocketSphinxSTT(AbstractSTTEngine):
                                  hmm_dir, ', '.join(missing_hmm_files))
 
         self._decoder = ps.Decoder(hmm=hmm_dir, logfn=self._logfile,
-                                   **vocabulary.decoder_kwargs)
+                                   **self._get_decoder_kwargs(vocabulary))
+        self._in_utterance = False
+
+    def _get_decoder_kwargs(self, vocabulary):
+        return vocabulary.decoder_kwargs
 
     def __del__(self):
         os.remove(self._logfile)
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                try:
-                    config['hmm_dir'] = profile['pocketsphinx']['hmm_dir']
-                except KeyError:
-                    pass
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        try:
+            config['hmm_dir'] = profile['pocketsphinx']['hmm_dir']
+        except KeyError:
+            pass
 
         return config
 
     def transcribe(self, fp):
         """
-        Performs STT, transcribing an audio file and returning the result.
+        Performs STT, transcribing audio and returning the result.
 
         Arguments:
-            fp -- a file object containing audio data
+            fp -- an AudioSegment or a WAV file object
         """
 
-        fp.seek(44)
+        audio = self.get_audio_segment(fp)
 
-        # FIXME: Can't use the Decoder.decode_raw() here, because
-        # pocketsphinx segfaults with tempfile.SpooledTemporaryFile()
-        data = fp.read()
+        self.start_utterance(audio.rate, audio.width, audio.channels)
+        self._decoder.process_raw(audio.data, False, True)
+        return self.finish()
+
+    def start_utterance(self, rate=16000, width=2, channels=1):
+        """
+        Starts decoding a new utterance. The decoder processes the audio
+        data as it is fed, so that finish() only needs to wrap up.
+        """
+        if self._in_utterance:
+            # the previous utterance was never finished
+            self._decoder.end_utt()
+            self._in_utterance = False
+        self._switch_vocabulary()
         self._decoder.start_utt()
-        self._decoder.process_raw(data, False, True)
+        self._in_utterance = True
+
+    def feed(self, chunk):
+        self._decoder.process_raw(chunk, False, False)
+
+    def partial(self):
+        result = self._decoder.get_hyp()
+        if result is None or not result[0]:
+            return []
+        return [result[0]]
+
+    def finish(self):
         self._decoder.end_utt()
+        self._in_utterance = False
 
         result = self._decoder.get_hyp()
         with open(self._logfile, 'r+') as f:
@@ -169,7 +373,8 @@ class PocketSphinxSTT(AbstractSTTEngine):
                 self._logger.debug(line.strip())
             f.truncate()
 
-        transcribed = [result[0]]
+        transcribed = Transcription([result[0]] if result is not None
+                                    else [])
         self._logger.info('Transcribed: %r', transcribed)
         return transcribed
 
@@ -178,13 +383,105 @@ class PocketSphinxSTT(AbstractSTTEngine):
         return diagnose.check_python_import('pocketsphinx')
 
 
+class PocketSphinxKWSSTT(PocketSphinxSTT):
+    """
+    PocketSphinx in keyword spotting mode. Instead of decoding everything
+    with a language model, it only looks for a few keyphrases, which takes a
+    fraction of the CPU time. This makes it a good passive engine for small
+    boards.
+
+    To use it, add this to your profile.yml:
+        stt_passive_engine: sphinx-kws
+        pocketsphinx:
+          keyphrases:
+            JASPER: 1.0e-20
+
+    Each keyphrase has a detection threshold. Lower thresholds mean fewer
+    missed detections, but more false alarms.
+    """
+
+    SLUG = 'sphinx-kws'
+    DEFAULT_KEYPHRASES = {'JASPER': 1e-20}
+
+    def __init__(self, vocabulary, keyphrases=None, **kwargs):
+        """
+        Arguments:
+            vocabulary -- a PocketsphinxVocabulary instance, which needs to
+                          contain all words of the keyphrases
+            keyphrases -- (optional) a dict mapping each keyphrase to its
+                          detection threshold
+            hmm_dir -- (optional) the path of the Hidden Markov Model (HMM)
+        """
+        if keyphrases is None:
+            keyphrases = self.DEFAULT_KEYPHRASES
+        self._keyphrases = keyphrases
+
+        with tempfile.NamedTemporaryFile(prefix='pskws_', suffix='.txt',
+                                         delete=False) as f:
+            for keyphrase, threshold in keyphrases.items():
+                f.write("%s /%e/\n" % (keyphrase.upper(), threshold))
+            self._kws_file = f.name
+
+        super(PocketSphinxKWSSTT, self).__init__(vocabulary, **kwargs)
+
+    def __del__(self):
+        os.remove(self._kws_file)
+        super(PocketSphinxKWSSTT, self).__del__()
+
+    def _get_decoder_kwargs(self, vocabulary):
+        return {'dict': vocabulary.dictionary_file, 'kws': self._kws_file}
+
+    @classmethod
+    def get_config(cls, profile=None):
+        config = super(PocketSphinxKWSSTT, cls).get_config(profile)
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        try:
+            keyphrases = profile['pocketsphinx']['keyphrases']
+        except KeyError:
+            pass
+        else:
+            config['keyphrases'] = dict(
+                (keyphrase, float(threshold))
+                for keyphrase, threshold in keyphrases.items())
+
+        return config
+
+    @classmethod
+    def get_passive_instance(cls, profile=None):
+        import vocabcompiler
+        # The dictionary has to contain the words of the keyphrases
+        phrases = vocabcompiler.get_keyword_phrases()
+        keyphrases = cls.get_config(profile).get('keyphrases',
+                                                 cls.DEFAULT_KEYPHRASES)
+        for keyphrase in keyphrases:
+            for word in keyphrase.upper().split():
+                if word not in phrases:
+                    phrases.append(word)
+        return cls.get_instance('keyword', phrases, profile=profile)
+
+
 class JuliusSTT(AbstractSTTEngine):
     """
     A very basic Speech-to-Text engine using Julius.
+
+    Julius is started once in module mode with network audio input (adinnet)
+    and keeps running, so that the models don't have to be loaded again for
+    every utterance. The audio data is streamed to Julius while it's being
+    recorded and the results are read from the module socket. If Julius
+    doesn't respond in time, it's restarted for the next utterance.
     """
 
     SLUG = 'julius'
-    VOCABULARY_TYPE = vocabcompiler.JuliusVocabulary
+    VOCABULARY_TYPE = 'JuliusVocabulary'
+    CONNECT_TIMEOUT = 30
+    # number of seconds to wait for Julius to accept audio data or to send
+    # the next message
+    RESPONSE_TIMEOUT = 15
+    _HYPO_PATTERN = re.compile(r'<SHYPO RANK="(\d+)"[^>]*>(.*?)</SHYPO>',
+                               re.DOTALL)
+    _WORD_PATTERN = re.compile(r'<WHYPO ((?:[^>"]|"[^"]*")*)/>')
+    _ATTR_PATTERN = re.compile(r'(\w+)="([^"]*)"')
 
     def __init__(self, vocabulary=None, hmmdefs="/usr/share/voxforge/julius/" +
                  "acoustic_model_files/hmmdefs", tiedlist="/usr/share/" +
@@ -193,11 +490,46 @@ class JuliusSTT(AbstractSTTEngine):
         self._vocabulary = vocabulary
         self._hmmdefs = hmmdefs
         self._tiedlist = tiedlist
-        self._pattern = re.compile(r'sentence(\d+): <s> (.+) </s>')
 
-        # Inital test run: we run this command once to log errors/warnings
+        self._process = None
+        self._module = self._module_file = self._adin = None
+        self._start_server()
+
+    def __del__(self):
+        self._stop_server()
+
+    @staticmethod
+    def _get_free_port():
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.bind(('127.0.0.1', 0))
+            return s.getsockname()[1]
+        finally:
+            s.close()
+
+    def _connect(self, port):
+        deadline = time.time() + self.CONNECT_TIMEOUT
+        while True:
+            try:
+                return socket.create_connection(('127.0.0.1', port),
+                                                self.RESPONSE_TIMEOUT)
+            except socket.error:
+                if self._process.poll() is not None:
+                    raise RuntimeError("Julius exited with return code %d" %
+                                       self._process.returncode)
+                if time.time() > deadline:
+                    raise RuntimeError("Can't connect to Julius on port %d" %
+                                       port)
+                time.sleep(0.1)
+
+    def _start_server(self):
+        module_port = self._get_free_port()
+        adin_port = self._get_free_port()
         cmd = ['julius',
-               '-input', 'stdin',
+               '-module', module_port,
+               '-input', 'adinnet',
+               '-adport', adin_port,
+               '-nocutsilence',
                '-dfa', self._vocabulary.dfa_file,
                '-v', self._vocabulary.dict_file,
                '-h', self._hmmdefs,
@@ -205,65 +537,176 @@ class JuliusSTT(AbstractSTTEngine):
                '-forcedict']
         cmd = [str(x) for x in cmd]
         self._logger.debug('Executing: %r', cmd)
-        with tempfile.SpooledTemporaryFile() as out_f:
-            with tempfile.SpooledTemporaryFile() as f:
-                with tempfile.SpooledTemporaryFile() as err_f:
-                    subprocess.call(cmd, stdin=f, stdout=out_f, stderr=err_f)
-            out_f.seek(0)
-            for line in out_f.read().splitlines():
-                line = line.strip()
-                if len(line) > 7 and line[:7].upper() == 'ERROR: ':
-                    if not line[7:].startswith('adin_'):
-                        self._logger.error(line[7:])
-                elif len(line) > 9 and line[:9].upper() == 'WARNING: ':
-                    self._logger.warning(line[9:])
-                elif len(line) > 6 and line[:6].upper() == 'STAT: ':
-                    self._logger.debug(line[6:])
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT)
+        # The output is forwarded to the logger until Julius exits. The
+        # thread doesn't reference the engine, so it can still be cleaned up.
+        thread = threading.Thread(target=self._log_output,
+                                  args=(self._process.stdout, self._logger),
+                                  name='julius-log')
+        thread.daemon = True
+        thread.start()
+        # Julius waits for the module client before it opens the audio input
+        self._module = self._connect(module_port)
+        self._module_file = self._module.makefile('r')
+        self._adin = self._connect(adin_port)
+
+    def _stop_server(self):
+        if self._process is None:
+            return
+        try:
+            self._module.sendall('DIE\n')
+        except (socket.error, AttributeError):
+            pass
+        for s in (self._adin, self._module_file, self._module):
+            if s is not None:
+                s.close()
+        self._module = self._module_file = self._adin = None
+        if self._process.poll() is None:
+            self._process.terminate()
+        self._process.wait()
+        self._process = None
+
+    @staticmethod
+    def _log_output(output, logger):
+        """
+        Forwards the errors, warnings and statistics Julius prints to the
+        logger, until the output is closed.
+
+        Arguments:
+            output -- a file object with the output of Julius
+            logger -- the logger to forward the messages to
+        """
+        for line in iter(output.readline, ''):
+            line = line.strip()
+            if len(line) > 7 and line[:7].upper() == 'ERROR: ':
+                if not line[7:].startswith('adin_'):
+                    logger.error(line[7:])
+            elif len(line) > 9 and line[:9].upper() == 'WARNING: ':
+                logger.warning(line[9:])
+            elif len(line) > 6 and line[:6].upper() == 'STAT: ':
+                logger.debug(line[6:])
+        output.close()
+
+    def _read_message(self):
+        """
+        Returns:
+            The next message from the module socket (messages are terminated
+            by a line containing a single period)
+        """
+        lines = []
+        while True:
+            line = self._module_file.readline()
+            if not line:
+                raise RuntimeError("Julius closed the module connection")
+            if line.rstrip('\r\n') == '.':
+                return '\n'.join(lines)
+            lines.append(line.rstrip('\r\n'))
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def _parse_result(cls, message):
+        """
+        Arguments:
+            message -- a RECOGOUT message
+
+        Returns:
+            A list of (rank, text, confidence) tuples, where confidence is the
+            mean word confidence measure (or None if it wasn't output)
+        """
+        results = []
+        for rank, hypo in cls._HYPO_PATTERN.findall(message):
+            words = []
+            cms = []
+            for attrs in cls._WORD_PATTERN.findall(hypo):
+                attrs = dict(cls._ATTR_PATTERN.findall(attrs))
+                if attrs.get('WORD') in ('<s>', '</s>'):
+                    continue
+                words.append(attrs.get('WORD', ''))
+                if 'CM' in attrs:
+                    cms.append(float(attrs['CM']))
+            confidence = sum(cms) / len(cms) if cms else None
+            results.append((int(rank), ' '.join(words), confidence))
+        return sorted(results, key=lambda x: x[0])
+
+    @classmethod
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'julius' in profile:
-                    if 'hmmdefs' in profile['julius']:
-                        config['hmmdefs'] = profile['julius']['hmmdefs']
-                    if 'tiedlist' in profile['julius']:
-                        config['tiedlist'] = profile['julius']['tiedlist']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'julius' in profile:
+            if 'hmmdefs' in profile['julius']:
+                config['hmmdefs'] = profile['julius']['hmmdefs']
+            if 'tiedlist' in profile['julius']:
+                config['tiedlist'] = profile['julius']['tiedlist']
         return config
 
-    def transcribe(self, fp, mode=None):
-        cmd = ['julius',
-               '-quiet',
-               '-nolog',
-               '-input', 'stdin',
-               '-dfa', self._vocabulary.dfa_file,
-               '-v', self._vocabulary.dict_file,
-               '-h', self._hmmdefs,
-               '-hlist', self._tiedlist,
-               '-forcedict']
-        cmd = [str(x) for x in cmd]
-        self._logger.debug('Executing: %r', cmd)
-        with tempfile.SpooledTemporaryFile() as out_f:
-            with tempfile.SpooledTemporaryFile() as err_f:
-                subprocess.call(cmd, stdin=fp, stdout=out_f, stderr=err_f)
-            out_f.seek(0)
-            results = [(int(i), text) for i, text in
-                       self._pattern.findall(out_f.read())]
-        transcribed = [text for i, text in
-                       sorted(results, key=lambda x: x[0])
-                       if text]
+    def start_utterance(self, rate=16000, width=2, channels=1):
+        self._switch_vocabulary()
+        if self._process is None or self._process.poll() is not None:
+            self._logger.warning('Julius is not running, restarting it...')
+            self._stop_server()
+            self._start_server()
+
+    def feed(self, chunk):
+        if self._adin is None:
+            # Julius has failed during this utterance
+            return
+        try:
+            # adinnet packets: the data length as 32-bit int, then the
+            # samples
+            self._adin.sendall(struct.pack('<i', len(chunk)) + chunk)
+        except socket.error:
+            self._logger.error("Can't send audio data to Julius, it will " +
+                               "be restarted for the next utterance",
+                               exc_info=True)
+            self._stop_server()
+
+    def _recognize(self):
+        """
+        Ends the utterance and waits for the recognition result.
+
+        Returns:
+            A list of (rank, text, confidence) tuples
+        """
+        # an empty packet marks the end of the segment
+        self._adin.sendall(struct.pack('<i', 0))
+        while True:
+            message = self._read_message()
+            if '<RECOGOUT>' in message:
+                return self._parse_result(message)
+            elif '<RECOGFAIL' in message or '<REJECTED' in message:
+                self._logger.debug('Julius: %s', message.strip())
+                return []
+
+    def finish(self):
+        results = []
+        if self._adin is not None:
+            try:
+                results = self._recognize()
+            except (socket.error, RuntimeError):
+                # a stalled Julius would block the conversation forever
+                self._logger.error("Julius didn't return a result, it " +
+                                   "will be restarted for the next " +
+                                   "utterance", exc_info=True)
+                self._stop_server()
+
+        transcribed = Transcription([text for rank, text, confidence
+                                     in results if text],
+                                    [confidence for rank, text, confidence
+                                     in results if text])
         if not transcribed:
-            transcribed.append('')
+            transcribed = Transcription([''])
         self._logger.info('Transcribed: %r', transcribed)
         return transcribed
 
+    def transcribe(self, fp, mode=None):
+        audio = self.get_audio_segment(fp)
+        self.start_utterance(audio.rate, audio.width, audio.channels)
+        self.feed(audio.data)
+        return self.finish()
+
     @classmethod
     def is_available(cls):
         return diagnose.check_executable('julius')
@@ -307,6 +750,7 @@ class GoogleSTT(AbstractSTTEngine):
         Arguments:
         api_key - the public api key which allows access to Google APIs
         """
+        import requests
         self._logger = logging.getLogger(__name__)
         self._request_url = None
         self._language = None
@@ -352,17 +796,14 @@ class GoogleSTT(AbstractSTTEngine):
             self._request_url = None
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'keys' in profile and 'GOOGLE_SPEECH' in profile['keys']:
-                    config['api_key'] = profile['keys']['GOOGLE_SPEECH']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'keys' in profile and 'GOOGLE_SPEECH' in profile['keys']:
+            config['api_key'] = profile['keys']['GOOGLE_SPEECH']
         return config
 
     def transcribe(self, fp):
@@ -371,8 +812,9 @@ class GoogleSTT(AbstractSTTEngine):
         returning an English string.
 
         Arguments:
-        audio_file_path -- the path to the .wav file to be transcribed
+        fp -- an AudioSegment or a WAV file object
         """
+        import requests
 
         if not self.api_key:
             self._logger.critical('API key missing, transcription request ' +
@@ -383,13 +825,11 @@ class GoogleSTT(AbstractSTTEngine):
                                   'request aborted.')
             return []
 
-        wav = wave.open(fp, 'rb')
-        frame_rate = wav.getframerate()
-        wav.close()
-        data = fp.read()
+        audio = self.get_audio_segment(fp)
 
-        headers = {'content-type': 'audio/l16; rate=%s' % frame_rate}
-        r = self._http.post(self.request_url, data=data, headers=headers)
+        headers = {'content-type': 'audio/l16; rate=%s' % audio.rate}
+        r = self._http.post(self.request_url, data=audio.data,
+                            headers=headers)
         try:
             r.raise_for_status()
         except requests.exceptions.HTTPError:
@@ -408,17 +848,19 @@ class GoogleSTT(AbstractSTTEngine):
             if len(response['result']) == 0:
                 # Response result is empty
                 raise ValueError('Nothing has been transcribed.')
-            results = [alt['transcript'] for alt
+            # Usually, only the first alternative has a confidence
+            results = [(alt['transcript'], alt.get('confidence')) for alt
                        in response['result'][0]['alternative']]
         except ValueError as e:
             self._logger.warning('Empty response: %s', e.args[0])
-            results = []
+            results = Transcription()
         except (KeyError, IndexError):
             self._logger.warning('Cannot parse response.', exc_info=True)
-            results = []
+            results = Transcription()
         else:
             # Convert all results to uppercase
-            results = tuple(result.upper() for result in results)
+            results = Transcription.from_pairs((text.upper(), confidence)
+                                               for text, confidence in results)
             self._logger.info('Transcribed: %r', results)
         return results
 
@@ -451,23 +893,21 @@ class AttSTT(AbstractSTTEngine):
         self.app_secret = app_secret
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # Try to get AT&T app_key/app_secret from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'att-stt' in profile:
-                    if 'app_key' in profile['att-stt']:
-                        config['app_key'] = profile['att-stt']['app_key']
-                    if 'app_secret' in profile['att-stt']:
-                        config['app_secret'] = profile['att-stt']['app_secret']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'att-stt' in profile:
+            if 'app_key' in profile['att-stt']:
+                config['app_key'] = profile['att-stt']['app_key']
+            if 'app_secret' in profile['att-stt']:
+                config['app_secret'] = profile['att-stt']['app_secret']
         return config
 
     @property
     def token(self):
+        import requests
         if not self._token:
             headers = {'content-type': 'application/x-www-form-urlencoded',
                        'accept': 'application/json'}
@@ -482,7 +922,8 @@ class AttSTT(AbstractSTTEngine):
         return self._token
 
     def transcribe(self, fp):
-        data = fp.read()
+        import requests
+        data = self.get_audio_segment(fp).to_wav()
         r = self._get_response(data)
         if r.status_code == requests.codes['unauthorized']:
             # Request token invalid, retry once with a new token
@@ -516,13 +957,13 @@ class AttSTT(AbstractSTTEngine):
                                       exc_info=True)
                 return []
             else:
-                transcribed = [x[0].upper() for x in sorted(results,
-                                                            key=lambda x: x[1],
-                                                            reverse=True)]
+                transcribed = Transcription.from_pairs(
+                    (text.upper(), confidence) for text, confidence in results)
                 self._logger.info('Transcribed: %r', transcribed)
                 return transcribed
 
     def _get_response(self, data):
+        import requests
         headers = {'authorization': 'Bearer %s' % self.token,
                    'accept': 'application/json',
                    'content-type': 'audio/wav'}
@@ -556,18 +997,15 @@ class WitAiSTT(AbstractSTTEngine):
         self.token = access_token
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # Try to get wit.ai Auth token from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'witai-stt' in profile:
-                    if 'access_token' in profile['witai-stt']:
-                        config['access_token'] = \
-                            profile['witai-stt']['access_token']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'witai-stt' in profile:
+            if 'access_token' in profile['witai-stt']:
+                config['access_token'] = \
+                    profile['witai-stt']['access_token']
         return config
 
     @property
@@ -586,7 +1024,8 @@ class WitAiSTT(AbstractSTTEngine):
         return self._headers
 
     def transcribe(self, fp):
-        data = fp.read()
+        import requests
+        data = self.get_audio_segment(fp).to_wav()
         r = requests.post('https://api.wit.ai/speech?v=20150101',
                           data=data,
                           headers=self.headers)
@@ -610,9 +1049,7 @@ class WitAiSTT(AbstractSTTEngine):
                                   exc_info=True)
             return []
         else:
-            transcribed = []
-            if text:
-                transcribed.append(text.upper())
+            transcribed = Transcription([text.upper()] if text else [])
             self._logger.info('Transcribed: %r', transcribed)
             return transcribed
 
@@ -642,7 +1079,9 @@ def get_engine_by_slug(slug=None):
             print(("WARNING: Multiple STT engines found for slug '%s'. " +
                    "This is most certainly a bug.") % slug)
         engine = selected_engines[0]
-        if not engine.is_available():
+        with timing.phase("%s.is_available()" % engine.__name__):
+            available = availability.is_available(engine)
+        if not available:
             raise ValueError(("STT engine '%s' is not available (due to " +
                               "missing dependencies, missing " +
                               "dependencies, etc.)") % slug)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8-*-
+"""
+Records how long the different phases of Jasper's startup take, so that boot
+time regressions can be tracked down. Phases can be nested, which results in
+a timing tree:
+
+    timing.enable()
+    with timing.phase('config'):
+        ...
+    print(timing.report())
+
+As long as timing is not enabled, and once the report has been created,
+phase() does nothing.
+"""
+import json
+import time
+import threading
+
+
+class Phase(object):
+    """
+    A node of the timing tree.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.children = []
+
+    @property
+    def duration(self):
+        """
+        Returns:
+            The duration of this phase in seconds (up to now if it hasn't
+            ended yet)
+        """
+        return (self.end if self.end is not None else time.time()) - \
+            self.start
+
+    def to_dict(self):
+        return {'name': self.name,
+                'duration': self.duration,
+                'children': [child.to_dict() for child in self.children]}
+
+    def format(self, indent=0):
+        """
+        Returns:
+            A list of lines containing the durations of this phase and its
+            children
+        """
+        lines = ["%9.1f ms  %s%s" % (self.duration * 1000, '  ' * indent,
+                                     self.name)]
+        for child in self.children:
+            lines.extend(child.format(indent + 1))
+        return lines
+
+
+class _PhaseContext(object):
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._phase = self._profiler.start_phase(self._name)
+        return self._phase
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._profiler.end_phase(self._phase)
+
+
+class _NullContext(object):
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class Profiler(object):
+    """
+    Collects the phases in a tree. Each thread has its own stack of running
+    phases, phases started in a thread without running phases are added to
+    the root. Phases started after finish() aren't recorded.
+    """
+
+    def __init__(self, name='startup'):
+        self.root = Phase(name)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _get_stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def start_phase(self, name):
+        stack = self._get_stack()
+        phase = Phase(name)
+        with self._lock:
+            (stack[-1] if stack else self.root).children.append(phase)
+        stack.append(phase)
+        return phase
+
+    def end_phase(self, phase):
+        phase.end = time.time()
+        stack = self._get_stack()
+        if phase in stack:
+            del stack[stack.index(phase):]
+
+    def phase(self, name):
+        if self.root.end is not None:
+            return _NULL_CONTEXT
+        return _PhaseContext(self, name)
+
+    def finish(self):
+        if self.root.end is None:
+            self.root.end = time.time()
+
+    def report(self):
+        self.finish()
+        return '\n'.join(self.root.format())
+
+    def export(self, fname):
+        self.finish()
+        with open(fname, 'w') as f:
+            json.dump(self.root.to_dict(), f, indent=2)
+
+
+_NULL_CONTEXT = _NullContext()
+_profiler = None
+
+
+def enable():
+    """
+    Starts recording phases. The startup phase begins now.
+    """
+    global _profiler
+    _profiler = Profiler()
+
+
+def is_enabled():
+    return _profiler is not None
+
+
+def phase(name):
+    """
+    Arguments:
+        name -- the name of the phase
+
+    Returns:
+        A context manager that records the duration of the phase if timing is
+        enabled
+    """
+    if _profiler is None:
+        return _NULL_CONTEXT
+    return _profiler.phase(name)
+
+
+def report():
+    """
+    Ends the startup phase, after which no more phases are recorded.
+
+    Returns:
+        The timing tree as string
+    """
+    return _profiler.report()
+
+
+def export(fname):
+    """
+    Ends the startup phase and writes the timing tree to a JSON file.
+
+    Arguments:
+        fname -- the path of the JSON file
+    """
+    _profiler.export(fname)
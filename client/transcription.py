@@ -0,0 +1,70 @@
+# -*- coding: utf-8-*-
+"""
+The results that the STT engines return for an utterance: a list of
+hypotheses, best match first, together with the engine's confidence in each
+of them.
+"""
+
+
+class Transcription(list):
+    """
+    A list of transcribed texts with a score for each of them in
+    Transcription.scores. Scores are between 0 and 1 (higher is better), or
+    None if the engine doesn't provide a score for a hypothesis.
+
+    Since Transcription is a list, code that doesn't care about the scores
+    can use it like the plain lists that the engines used to return.
+    """
+
+    def __init__(self, texts=(), scores=None):
+        """
+        Arguments:
+            texts -- (optional) the transcribed texts, best match first
+            scores -- (optional) a list with a score (or None) for each text
+        """
+        list.__init__(self, texts)
+        if scores is None:
+            scores = [None] * len(self)
+        if len(scores) != len(self):
+            raise ValueError("Expected %d scores, got %d" %
+                             (len(self), len(scores)))
+        self.scores = list(scores)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+        Creates a Transcription from (text, score) tuples, sorted by score.
+        Hypotheses without score keep their position.
+        """
+        pairs = list(pairs)
+        if all(score is not None for text, score in pairs):
+            pairs.sort(key=lambda pair: pair[1], reverse=True)
+        return cls([text for text, score in pairs],
+                   [score for text, score in pairs])
+
+    def get_scores(self):
+        """
+        Returns:
+            The scores of the texts, or None if the engine didn't provide a
+            score for all of them (which makes them incomparable)
+        """
+        if not self or any(score is None for score in self.scores):
+            return None
+        return list(self.scores)
+
+    def __repr__(self):
+        return 'Transcription(%s, scores=%r)' % (list.__repr__(self),
+                                                 self.scores)
+
+
+def get_scores(texts):
+    """
+    Arguments:
+        texts -- a Transcription or a plain list of texts
+
+    Returns:
+        The scores of the texts, or None if they are unknown
+    """
+    if isinstance(texts, Transcription):
+        return texts.get_scores()
+    return None
@@ -17,29 +17,14 @@ import logging
 import wave
 import urllib
 import urlparse
-import requests
 from abc import ABCMeta, abstractmethod
 
 import argparse
-import yaml
-
-try:
-    import mad
-except ImportError:
-    pass
-
-try:
-    import gtts
-except ImportError:
-    pass
-
-try:
-    import pyvona
-except ImportError:
-    pass
 
 import diagnose
-import jasperpath
+import availability
+import timing
+import config as jasperconfig
 
 
 class AbstractTTSEngine(object):
@@ -49,12 +34,20 @@ class AbstractTTSEngine(object):
     __metaclass__ = ABCMeta
 
     @classmethod
-    def get_config(cls):
+    def get_config(cls, profile=None):
+        """
+        Arguments:
+            profile -- (optional) the profile to read the settings from
+                       (Default: the cached profile.yml)
+
+        Returns:
+            A dict with the keyword arguments for the engine's constructor
+        """
         return {}
 
     @classmethod
-    def get_instance(cls):
-        config = cls.get_config()
+    def get_instance(cls, profile=None):
+        config = cls.get_config(profile)
         instance = cls(**config)
         return instance
 
@@ -94,6 +87,7 @@ class AbstractMp3TTSEngine(AbstractTTSEngine):
                 diagnose.check_python_import('mad'))
 
     def play_mp3(self, filename):
+        import mad
         mf = mad.MadFile(filename)
         with tempfile.NamedTemporaryFile(suffix='.wav') as f:
             wav = wave.open(f, mode='wb')
@@ -145,24 +139,21 @@ class EspeakTTS(AbstractTTSEngine):
         self.words_per_minute = words_per_minute
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'espeak-tts' in profile:
-                    if 'voice' in profile['espeak-tts']:
-                        config['voice'] = profile['espeak-tts']['voice']
-                    if 'pitch_adjustment' in profile['espeak-tts']:
-                        config['pitch_adjustment'] = \
-                            profile['espeak-tts']['pitch_adjustment']
-                    if 'words_per_minute' in profile['espeak-tts']:
-                        config['words_per_minute'] = \
-                            profile['espeak-tts']['words_per_minute']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'espeak-tts' in profile:
+            if 'voice' in profile['espeak-tts']:
+                config['voice'] = profile['espeak-tts']['voice']
+            if 'pitch_adjustment' in profile['espeak-tts']:
+                config['pitch_adjustment'] = \
+                    profile['espeak-tts']['pitch_adjustment']
+            if 'words_per_minute' in profile['espeak-tts']:
+                config['words_per_minute'] = \
+                    profile['espeak-tts']['words_per_minute']
         return config
 
     @classmethod
@@ -267,18 +258,15 @@ class FliteTTS(AbstractTTSEngine):
         return voices
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'flite-tts' in profile:
-                    if 'voice' in profile['flite-tts']:
-                        config['voice'] = profile['flite-tts']['voice']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'flite-tts' in profile:
+            if 'voice' in profile['flite-tts']:
+                config['voice'] = profile['flite-tts']['voice']
         return config
 
     @classmethod
@@ -364,17 +352,14 @@ class PicoTTS(AbstractTTSEngine):
                 diagnose.check_executable('pico2wave'))
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'pico-tts' in profile and 'language' in profile['pico-tts']:
-                    config['language'] = profile['pico-tts']['language']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'pico-tts' in profile and 'language' in profile['pico-tts']:
+            config['language'] = profile['pico-tts']['language']
 
         return config
 
@@ -436,18 +421,15 @@ class GoogleTTS(AbstractMp3TTSEngine):
                 diagnose.check_network_connection())
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if ('google-tts' in profile and
-                   'language' in profile['google-tts']):
-                    config['language'] = profile['google-tts']['language']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if ('google-tts' in profile and
+           'language' in profile['google-tts']):
+            config['language'] = profile['google-tts']['language']
 
         return config
 
@@ -465,6 +447,7 @@ class GoogleTTS(AbstractMp3TTSEngine):
         if self.language not in self.languages:
             raise ValueError("Language '%s' not supported by '%s'",
                              self.language, self.SLUG)
+        import gtts
         tts = gtts.gTTS(text=phrase, lang=self.language)
         with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
             tmpfile = f.name
@@ -493,10 +476,12 @@ class MaryTTS(AbstractTTSEngine):
                                                port=self.port)
         self.language = language
         self.voice = voice
+        import requests
         self.session = requests.Session()
 
     @property
     def languages(self):
+        import requests
         try:
             r = self.session.get(self._makeurl('/locales'))
             r.raise_for_status()
@@ -513,24 +498,21 @@ class MaryTTS(AbstractTTSEngine):
         return [line.split()[0] for line in r.text.splitlines()]
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'mary-tts' in profile:
-                    if 'server' in profile['mary-tts']:
-                        config['server'] = profile['mary-tts']['server']
-                    if 'port' in profile['mary-tts']:
-                        config['port'] = profile['mary-tts']['port']
-                    if 'language' in profile['mary-tts']:
-                        config['language'] = profile['mary-tts']['language']
-                    if 'voice' in profile['mary-tts']:
-                        config['voice'] = profile['mary-tts']['voice']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'mary-tts' in profile:
+            if 'server' in profile['mary-tts']:
+                config['server'] = profile['mary-tts']['server']
+            if 'port' in profile['mary-tts']:
+                config['port'] = profile['mary-tts']['port']
+            if 'language' in profile['mary-tts']:
+                config['language'] = profile['mary-tts']['language']
+            if 'voice' in profile['mary-tts']:
+                config['voice'] = profile['mary-tts']['voice']
 
         return config
 
@@ -580,6 +562,7 @@ class IvonaTTS(AbstractMp3TTSEngine):
     def __init__(self, access_key='', secret_key='', region=None,
                  voice=None, speech_rate=None, sentence_break=None):
         super(self.__class__, self).__init__()
+        import pyvona
         self._pyvonavoice = pyvona.Voice(access_key, secret_key)
         self._pyvonavoice.codec = "mp3"
         if region:
@@ -592,32 +575,29 @@ class IvonaTTS(AbstractMp3TTSEngine):
             self._pyvonavoice.sentence_break = sentence_break
 
     @classmethod
-    def get_config(cls):
-        # FIXME: Replace this as soon as we have a config module
+    def get_config(cls, profile=None):
         config = {}
         # HMM dir
         # Try to get hmm_dir from config
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'ivona-tts' in profile:
-                    if 'access_key' in profile['ivona-tts']:
-                        config['access_key'] = \
-                            profile['ivona-tts']['access_key']
-                    if 'secret_key' in profile['ivona-tts']:
-                        config['secret_key'] = \
-                            profile['ivona-tts']['secret_key']
-                    if 'region' in profile['ivona-tts']:
-                        config['region'] = profile['ivona-tts']['region']
-                    if 'voice' in profile['ivona-tts']:
-                        config['voice'] = profile['ivona-tts']['voice']
-                    if 'speech_rate' in profile['ivona-tts']:
-                        config['speech_rate'] = \
-                            profile['ivona-tts']['speech_rate']
-                    if 'sentence_break' in profile['ivona-tts']:
-                        config['sentence_break'] = \
-                            profile['ivona-tts']['sentence_break']
+        if profile is None:
+            profile = jasperconfig.get_profile()
+        if 'ivona-tts' in profile:
+            if 'access_key' in profile['ivona-tts']:
+                config['access_key'] = \
+                    profile['ivona-tts']['access_key']
+            if 'secret_key' in profile['ivona-tts']:
+                config['secret_key'] = \
+                    profile['ivona-tts']['secret_key']
+            if 'region' in profile['ivona-tts']:
+                config['region'] = profile['ivona-tts']['region']
+            if 'voice' in profile['ivona-tts']:
+                config['voice'] = profile['ivona-tts']['voice']
+            if 'speech_rate' in profile['ivona-tts']:
+                config['speech_rate'] = \
+                    profile['ivona-tts']['speech_rate']
+            if 'sentence_break' in profile['ivona-tts']:
+                config['sentence_break'] = \
+                    profile['ivona-tts']['sentence_break']
         return config
 
     @classmethod
@@ -660,7 +640,9 @@ def get_engine_by_slug(slug=None):
             print("WARNING: Multiple TTS engines found for slug '%s'. " +
                   "This is most certainly a bug." % slug)
         engine = selected_engines[0]
-        if not engine.is_available():
+        with timing.phase("%s.is_available()" % engine.__name__):
+            available = availability.is_available(engine)
+        if not available:
             raise ValueError(("TTS engine '%s' is not available (due to " +
                               "missing dependencies, etc.)") % slug)
         return engine
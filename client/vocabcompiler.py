@@ -5,8 +5,11 @@ vocabulary for the respective stt_engine if needed.
 """
 
 import os
+import copy
+import time
 import tempfile
 import logging
+import threading
 import hashlib
 import subprocess
 import tarfile
@@ -14,10 +17,10 @@ import re
 import contextlib
 import shutil
 from abc import ABCMeta, abstractmethod, abstractproperty
-import yaml
 
 import brain
 import jasperpath
+import config as jasperconfig
 
 from g2p import PhonetisaurusG2P
 try:
@@ -28,6 +31,17 @@ except ImportError:
                                       "correctly.", exc_info=True)
 
 
+# One lock per vocabulary path, so that concurrent compilations of the same
+# vocabulary (e.g. by compile_in_background()) don't interfere
+_compile_locks = {}
+_compile_locks_lock = threading.Lock()
+
+
+def _get_compile_lock(path):
+    with _compile_locks_lock:
+        return _compile_locks.setdefault(path, threading.Lock())
+
+
 class AbstractVocabulary(object):
     """
     Abstract base class for Vocabulary classes.
@@ -37,6 +51,13 @@ class AbstractVocabulary(object):
     """
     __metaclass__ = ABCMeta
 
+    # Default number of compiled revisions to keep
+    CACHE_SIZE = 10
+
+    # Build directories older than this many seconds are left over from
+    # compilations that have been killed
+    STALE_BUILD_TIME = 24 * 60 * 60
+
     @classmethod
     def phrases_to_revision(cls, phrases):
         """
@@ -119,6 +140,20 @@ class AbstractVocabulary(object):
         """
         return (self.compiled_revision == self.phrases_to_revision(phrases))
 
+    @property
+    def store_path(self):
+        """
+        Returns:
+            The path of the directory that contains the compiled revisions of
+            all vocabularies of this type, one directory per revision
+        """
+        return os.path.join(os.path.dirname(self.path), 'revisions')
+
+    def _is_complete(self, revision_path):
+        stored = copy.copy(self)
+        stored.path = revision_path
+        return stored.is_compiled
+
     def compile(self, phrases, force=False):
         """
         Compiles this vocabulary. If the force argument is True, compilation
@@ -128,6 +163,15 @@ class AbstractVocabulary(object):
         This method is not meant to be overridden by subclasses - use the
         _compile_vocabulary()-method instead.
 
+        Compiled revisions are kept in a store, keyed by their revision, and
+        the vocabulary path is a symlink to one of them. If the revision for
+        the phrases has been compiled before, the symlink is just switched
+        to it. Otherwise, the vocabulary is compiled into a temporary
+        directory in the store, which is renamed when compilation succeeded.
+        So the previous revision stays usable until then and a failed
+        compilation never leaves a half-written vocabulary behind.
+        Compilations of the same vocabulary path don't run concurrently.
+
         Arguments:
             phrases -- a list of phrases that this vocabulary will contain
             force -- (optional) forces compilation (Default: False)
@@ -136,43 +180,167 @@ class AbstractVocabulary(object):
             The revision of the compiled vocabulary
         """
         revision = self.phrases_to_revision(phrases)
+        with _get_compile_lock(self.path):
+            return self._compile(phrases, revision, force)
+
+    def _compile(self, phrases, revision, force):
         if not force and self.compiled_revision == revision:
             self._logger.debug('Compilation not neccessary, compiled ' +
                                'version matches phrases.')
             return revision
 
-        if not os.path.exists(self.path):
+        if not os.path.exists(self.store_path):
             self._logger.debug("Vocabulary dir '%s' does not exist, " +
-                               "creating...", self.path)
+                               "creating...", self.store_path)
             try:
-                os.makedirs(self.path)
+                os.makedirs(self.store_path)
             except OSError:
-                self._logger.error("Couldn't create vocabulary dir '%s'",
-                                   self.path, exc_info=True)
-                raise
+                if not os.path.isdir(self.store_path):
+                    self._logger.error("Couldn't create vocabulary dir '%s'",
+                                       self.store_path, exc_info=True)
+                    raise
+
+        target = os.path.join(self.store_path, revision)
+        if not force and self._is_complete(target):
+            self._logger.info("Using stored revision '%s'", revision)
+            self._activate(target)
+            return revision
+
+        builddir = tempfile.mkdtemp(prefix='.build-', dir=self.store_path)
         try:
-            with open(self.revision_file, 'w') as f:
-                f.write(revision)
-        except (OSError, IOError):
-            self._logger.error("Couldn't write revision file in '%s'",
-                               self.revision_file, exc_info=True)
-            raise
-        else:
+            build = copy.copy(self)
+            build.path = builddir
             self._logger.info('Starting compilation...')
+            build._compile_vocabulary(phrases)
+            # The revision file is written last, so that a vocabulary with a
+            # revision file is always complete
             try:
-                self._compile_vocabulary(phrases)
-            except Exception as e:
-                self._logger.error("Fatal compilation Error occured, " +
-                                   "cleaning up...", exc_info=True)
-                try:
-                    os.remove(self.revision_file)
-                except OSError:
-                    pass
-                raise e
+                with open(build.revision_file, 'w') as f:
+                    f.write(revision)
+            except (OSError, IOError):
+                self._logger.error("Couldn't write revision file in '%s'",
+                                   build.revision_file, exc_info=True)
+                raise
+            if not force and self._is_complete(target):
+                # Another vocabulary has stored the same revision in the
+                # meantime, which may already be in use
+                self._logger.debug("Revision '%s' has been stored " +
+                                   "meanwhile, using it", revision)
+                shutil.rmtree(builddir)
+            elif os.path.exists(target):
+                # Other vocabularies may point to the stored revision, so
+                # it is replaced without being missing for longer than
+                # necessary
+                olddir = tempfile.mktemp(prefix='.old-', dir=self.store_path)
+                os.rename(target, olddir)
+                os.rename(builddir, target)
+                shutil.rmtree(olddir, ignore_errors=True)
             else:
-                self._logger.info('Compilation done.')
+                os.rename(builddir, target)
+            self._activate(target)
+        except Exception:
+            self._logger.error("Fatal compilation Error occured, " +
+                               "cleaning up...", exc_info=True)
+            raise
+        finally:
+            # the build directory is gone after it has been stored, unless
+            # compilation failed or was interrupted
+            shutil.rmtree(builddir, ignore_errors=True)
+        self._logger.info('Compilation done.')
+        self._evict()
         return revision
 
+    def _activate(self, target):
+        """
+        Atomically points the vocabulary path to a stored revision.
+        """
+        basedir = os.path.dirname(self.path)
+        previous = None
+        if os.path.islink(self.path):
+            previous = os.path.join(basedir, os.readlink(self.path))
+        elif os.path.isdir(self.path):
+            # vocabularies used to be compiled in place
+            shutil.rmtree(self.path)
+
+        link = tempfile.mktemp(prefix='.%s-link-' % self.name, dir=basedir)
+        os.symlink(os.path.relpath(target, basedir), link)
+        os.rename(link, self.path)
+        # the modification time tells which revisions were used last
+        os.utime(target, None)
+
+        if (previous is not None and
+                os.path.dirname(previous) != self.store_path):
+            # revisions used to be stored next to the vocabulary
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def _evict(self):
+        """
+        Removes the least recently used revisions from the store, so that it
+        contains at most vocabulary: cache_size (from the profile) revisions.
+        Revisions that a vocabulary points to are never removed. Build
+        directories left over from killed compilations are removed, too.
+        """
+        profile = jasperconfig.get_profile()
+        cache_size = (profile.get('vocabulary') or {}).get('cache_size',
+                                                           self.CACHE_SIZE)
+        basedir = os.path.dirname(self.path)
+        in_use = set(os.path.realpath(os.path.join(basedir, name))
+                     for name in os.listdir(basedir)
+                     if os.path.islink(os.path.join(basedir, name)))
+        revisions = [os.path.join(self.store_path, name)
+                     for name in os.listdir(self.store_path)
+                     if not name.startswith('.')]
+        unused = sorted((os.path.getmtime(path), path) for path in revisions
+                        if os.path.realpath(path) not in in_use)
+        for mtime, path in unused[:max(0, len(revisions) - cache_size)]:
+            self._logger.debug("Removing unused revision '%s'", path)
+            shutil.rmtree(path, ignore_errors=True)
+
+        # Other vocabularies of this type may be compiling at the moment, so
+        # only old build directories are removed
+        deadline = time.time() - self.STALE_BUILD_TIME
+        for name in os.listdir(self.store_path):
+            if not name.startswith(('.build-', '.old-')):
+                continue
+            path = os.path.join(self.store_path, name)
+            try:
+                if os.path.getmtime(path) >= deadline:
+                    continue
+            except OSError:
+                # it has been removed in the meantime
+                continue
+            self._logger.debug("Removing stale build directory '%s'", path)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def compile_in_background(self, phrases, callback=None):
+        """
+        Compiles this vocabulary in a background thread. The previous
+        revision can be used until the compilation has finished.
+
+        Arguments:
+            phrases -- a list of phrases that this vocabulary will contain
+            callback -- (optional) called with this vocabulary (in the
+                        background thread) after compilation succeeded
+
+        Returns:
+            The started thread
+        """
+        def run():
+            try:
+                self.compile(phrases)
+            except Exception:
+                self._logger.error("Background compilation of vocabulary " +
+                                   "'%s' failed", self.name, exc_info=True)
+                return
+            if callback is not None:
+                callback(self)
+
+        thread = threading.Thread(target=run,
+                                  name='vocabulary-%s' % self.name)
+        thread.daemon = True
+        thread.start()
+        return thread
+
     @abstractmethod
     def _compile_vocabulary(self, phrases):
         """
@@ -421,16 +589,13 @@ class JuliusVocabulary(AbstractVocabulary):
 
         lexicon_file = jasperpath.data('julius-stt', 'VoxForge.tgz')
         lexicon_archive_member = 'VoxForge/VoxForgeDict'
-        profile_path = jasperpath.config('profile.yml')
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r') as f:
-                profile = yaml.safe_load(f)
-                if 'julius' in profile:
-                    if 'lexicon' in profile['julius']:
-                        lexicon_file = profile['julius']['lexicon']
-                    if 'lexicon_archive_member' in profile['julius']:
-                        lexicon_archive_member = \
-                            profile['julius']['lexicon_archive_member']
+        profile = jasperconfig.get_profile()
+        if 'julius' in profile:
+            if 'lexicon' in profile['julius']:
+                lexicon_file = profile['julius']['lexicon']
+            if 'lexicon_archive_member' in profile['julius']:
+                lexicon_archive_member = \
+                    profile['julius']['lexicon_archive_member']
 
         lexicon = JuliusVocabulary.VoxForgeLexicon(lexicon_file,
                                                    lexicon_archive_member)
@@ -455,18 +620,16 @@ class JuliusVocabulary(AbstractVocabulary):
                 for word, phoneme in words:
                     f.write("%s\t\t\t%s\n" % (word, phoneme))
 
-        # mkdfa.pl
-        olddir = os.getcwd()
-        os.chdir(tmpdir)
+        # mkdfa.pl (run in tmpdir instead of changing the working directory,
+        # which would affect other threads)
         cmd = ['mkdfa.pl', str(prefix)]
         with tempfile.SpooledTemporaryFile() as out_f:
-            subprocess.call(cmd, stdout=out_f, stderr=out_f)
+            subprocess.call(cmd, stdout=out_f, stderr=out_f, cwd=tmpdir)
             out_f.seek(0)
             for line in out_f.read().splitlines():
                 line = line.strip()
                 if line:
                     self._logger.debug(line)
-        os.chdir(olddir)
 
         tmp_dfa_file = os.path.join(tmpdir, os.extsep.join([prefix, 'dfa']))
         tmp_dict_file = os.path.join(tmpdir, os.extsep.join([prefix, 'dict']))
@@ -509,7 +672,7 @@ def get_keyword_phrases():
 
 def get_all_phrases():
     """
-    Gets phrases from all modules.
+    Gets phrases from all modules, except for modules that failed to import.
 
     Returns:
         A list of phrases in all modules plus additional phrases passed to this
@@ -519,7 +682,8 @@ def get_all_phrases():
 
     modules = brain.Brain.get_modules()
     for module in modules:
-        phrases.extend(get_phrases_from_module(module))
+        if not brain.Brain.is_failed(module):
+            phrases.extend(get_phrases_from_module(module))
 
     return sorted(list(set(phrases)))
 
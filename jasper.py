@@ -6,17 +6,9 @@ import sys
 import shutil
 import logging
 
-import yaml
 import argparse
 
-from client import tts
-from client import stt
-from client import jasperpath
-from client import diagnose
-from client.conversation import Conversation
-
-# Add jasperpath.LIB_PATH to sys.path
-sys.path.append(jasperpath.LIB_PATH)
+from client import timing
 
 parser = argparse.ArgumentParser(description='Jasper Voice Control Center')
 parser.add_argument('--local', action='store_true',
@@ -26,12 +18,34 @@ parser.add_argument('--no-network-check', action='store_true',
 parser.add_argument('--diagnose', action='store_true',
                     help='Run diagnose and exit')
 parser.add_argument('--debug', action='store_true', help='Show debug messages')
+parser.add_argument('--profile-startup', nargs='?', const=True,
+                    metavar='JSON_FILE',
+                    help='Print how long each phase of the startup takes ' +
+                         '(and optionally write the timings to JSON_FILE)')
 args = parser.parse_args()
 
-if args.local:
-    from client.local_mic import Mic
-else:
-    from client.mic import Mic
+if args.profile_startup:
+    timing.enable()
+
+with timing.phase('imports'):
+    with timing.phase('client.tts'):
+        from client import tts
+    with timing.phase('client.stt'):
+        from client import stt
+    from client import jasperpath
+    from client import config as jasperconfig
+    from client import diagnose
+    with timing.phase('client.conversation'):
+        from client.conversation import Conversation
+
+    with timing.phase('client.mic'):
+        if args.local:
+            from client.local_mic import Mic
+        else:
+            from client.mic import Mic
+
+# Add jasperpath.LIB_PATH to sys.path
+sys.path.append(jasperpath.LIB_PATH)
 
 
 class Jasper(object):
@@ -76,9 +90,9 @@ class Jasper(object):
         # Read config
         self._logger.debug("Trying to read config file: '%s'", new_configfile)
         try:
-            with open(new_configfile, "r") as f:
-                self.config = yaml.safe_load(f)
-        except OSError:
+            with timing.phase('config'):
+                self.config = jasperconfig.load_profile(new_configfile)
+        except IOError:
             self._logger.error("Can't open config file: '%s'", new_configfile)
             raise
 
@@ -105,9 +119,16 @@ class Jasper(object):
         tts_engine_class = tts.get_engine_by_slug(tts_engine_slug)
 
         # Initialize Mic
-        self.mic = Mic(tts_engine_class.get_instance(),
-                       stt_passive_engine_class.get_passive_instance(),
-                       stt_engine_class.get_active_instance())
+        with timing.phase('tts engine'):
+            tts_engine = tts_engine_class.get_instance(profile=self.config)
+        with timing.phase('passive stt engine'):
+            passive_stt_engine = stt_passive_engine_class \
+                .get_passive_instance(profile=self.config)
+        with timing.phase('active stt engine'):
+            active_stt_engine = stt_engine_class.get_active_instance(
+                profile=self.config)
+        with timing.phase('mic'):
+            self.mic = Mic(tts_engine, passive_stt_engine, active_stt_engine)
 
     def run(self):
         if 'first_name' in self.config:
@@ -117,7 +138,14 @@ class Jasper(object):
             salutation = "How can I be of service?"
         self.mic.say(salutation)
 
-        conversation = Conversation("JASPER", self.mic, self.config)
+        with timing.phase('conversation'):
+            conversation = Conversation("JASPER", self.mic, self.config)
+
+        if timing.is_enabled():
+            print("Startup timing:\n%s" % timing.report())
+            if args.profile_startup is not True:
+                timing.export(args.profile_startup)
+
         conversation.handleForever()
 
 if __name__ == "__main__":
@@ -134,16 +162,20 @@ if __name__ == "__main__":
     if args.debug:
         logger.setLevel(logging.DEBUG)
 
-    if not args.no_network_check and not diagnose.check_network_connection():
-        logger.warning("Network not connected. This may prevent Jasper from " +
-                       "running properly.")
+    if not args.no_network_check:
+        with timing.phase('network check'):
+            connected = diagnose.check_network_connection()
+        if not connected:
+            logger.warning("Network not connected. This may prevent Jasper " +
+                           "from running properly.")
 
     if args.diagnose:
         failed_checks = diagnose.run()
         sys.exit(0 if not failed_checks else 1)
 
     try:
-        app = Jasper()
+        with timing.phase('jasper'):
+            app = Jasper()
     except Exception:
         logger.error("Error occured!", exc_info=True)
         sys.exit(1)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import unittest
+import StringIO
+from client import audiosegment, jasperpath
+
+
+class TestAudioSegment(unittest.TestCase):
+
+    def setUp(self):
+        self.jasper_clip = jasperpath.data('audio', 'jasper.wav')
+
+    def testFromChunks(self):
+        audio = audiosegment.AudioSegment.from_chunks(['\x00\x01'] * 8000,
+                                                      rate=16000, width=2)
+        self.assertEqual(len(audio.data), 16000)
+        self.assertEqual(audio.duration, 0.5)
+        self.assertEqual(audio.view[2:4].tobytes(), '\x00\x01')
+
+    def testWavRoundtrip(self):
+        with open(self.jasper_clip, 'rb') as f:
+            audio = audiosegment.AudioSegment.from_wav(f)
+        self.assertEqual(audio.rate, 16000)
+        self.assertEqual(audio.width, 2)
+        self.assertEqual(audio.channels, 1)
+
+        with open(self.jasper_clip, 'rb') as f:
+            f.seek(44)
+            self.assertEqual(audio.data, f.read())
+
+        copy = audiosegment.AudioSegment.from_wav(
+            StringIO.StringIO(audio.to_wav()))
+        self.assertEqual(copy.data, audio.data)
+        self.assertEqual(copy.rate, audio.rate)
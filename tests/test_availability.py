@@ -0,0 +1,87 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+from client import availability, diagnose
+
+
+class DummyEngine(object):
+    probes = 0
+
+    @classmethod
+    def is_available(cls):
+        cls.probes += 1
+        return (diagnose.check_executable('sh') and
+                diagnose.check_python_import('os'))
+
+
+class DummyNetworkEngine(DummyEngine):
+
+    @classmethod
+    def is_available(cls):
+        cls.probes += 1
+        return diagnose.check_network_connection()
+
+
+class TestAvailabilityCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tempdir, 'availability.json')
+        DummyEngine.probes = 0
+        DummyNetworkEngine.probes = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def testRecordChecks(self):
+        with diagnose.record_checks() as checks:
+            DummyEngine.is_available()
+        self.assertEqual(checks, set([('executable', 'sh'),
+                                      ('python_import', 'os')]))
+
+    def testCaching(self):
+        cache = availability.AvailabilityCache(self.fname)
+        self.assertTrue(cache.is_available(DummyEngine))
+        self.assertTrue(cache.is_available(DummyEngine))
+        self.assertEqual(DummyEngine.probes, 1)
+
+        # The cache file is used by the next start, too
+        cache = availability.AvailabilityCache(self.fname)
+        self.assertTrue(cache.is_available(DummyEngine))
+        self.assertEqual(DummyEngine.probes, 1)
+
+    def testExecutableChanged(self):
+        cache = availability.AvailabilityCache(self.fname)
+        cache.is_available(DummyEngine)
+        with mock.patch.object(diagnose, 'find_executable',
+                               return_value=None):
+            self.assertFalse(cache.is_available(DummyEngine))
+        self.assertEqual(DummyEngine.probes, 2)
+
+    def testNetworkTTL(self):
+        cache = availability.AvailabilityCache(self.fname, network_ttl=60)
+        with mock.patch('socket.create_connection'):
+            with mock.patch('socket.gethostbyname',
+                            return_value='127.0.0.1'):
+                with mock.patch('time.time', return_value=1000):
+                    self.assertTrue(cache.is_available(DummyNetworkEngine))
+                with mock.patch('time.time', return_value=1030):
+                    self.assertTrue(cache.is_available(DummyNetworkEngine))
+                self.assertEqual(DummyNetworkEngine.probes, 1)
+                with mock.patch('time.time', return_value=1100):
+                    self.assertTrue(cache.is_available(DummyNetworkEngine))
+                self.assertEqual(DummyNetworkEngine.probes, 2)
+
+    def testEmptyProfileSection(self):
+        with mock.patch.object(availability, '_cache', None), \
+                mock.patch.object(availability.jasperconfig, 'get_profile',
+                                  return_value={'availability': None}), \
+                mock.patch.object(availability,
+                                  'AvailabilityCache') as cache_class:
+            availability.is_available(DummyEngine)
+        cache_class.assert_called_with(network_ttl=None)
+        self.assertTrue(cache_class.return_value.is_available.called)
@@ -1,8 +1,15 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8-*-
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
 import unittest
+import threading
 import mock
-from client import brain, test_mic
+from client import brain, plugins, test_mic, transcription
 
 
 DEFAULT_PROFILE = {
@@ -47,3 +54,189 @@ class TestBrain(unittest.TestCase):
         with mock.patch.object(hn, 'handle') as mocked_handle:
             my_brain.query(["hacker news"])
             self.assertTrue(mocked_handle.called)
+
+    def testIndex(self):
+        """Does the index only return modules related to the input?"""
+        my_brain = TestBrain._emptyBrain()
+        modules = dict((m.__name__, m) for m in my_brain.modules)
+        self.assertEqual(
+            my_brain.index.match("What's the meaning of life?"),
+            (set([modules['Life']]), set([modules['Unclear']])))
+        self.assertEqual(my_brain.index.match("Will it rain?")[0],
+                         set([modules['Weather']]))
+        self.assertEqual(my_brain.index.match("hacker news"),
+                         (set([modules['HN'], modules['News']]),
+                          set([modules['Unclear']])))
+        self.assertEqual(my_brain.index.match("zzz gibberish zzz"),
+                         (set(), set([modules['Unclear']])))
+
+    def testIndexWithoutPatterns(self):
+        """Are modules without PATTERNS found by their WORDS?"""
+        plain = mock.Mock(__name__='plain', WORDS=['FOO BAR'], PATTERNS=[])
+        invalid = mock.Mock(__name__='invalid', WORDS=['BAZ'],
+                            PATTERNS=['(unbalanced'])
+        index = brain.ModuleIndex([plain, invalid])
+        self.assertEqual(index.match('bar baz'),
+                         (set(), set([plain, invalid])))
+        self.assertEqual(index.match('qux'), (set(), set()))
+
+    def testManyPatterns(self):
+        """Are the PATTERNS of many modules matched?"""
+        modules = [mock.Mock(__name__='m%d' % i, WORDS=[],
+                             PATTERNS=[r'\b(word)(%d)\b' % i])
+                   for i in range(100)]
+        index = brain.ModuleIndex(modules)
+        self.assertEqual(index.match('word7 and word98'),
+                         (set([modules[7], modules[98]]), set()))
+
+    def testOverlappingPatterns(self):
+        """Are all modules whose PATTERNS match found?"""
+        joke = mock.Mock(__name__='joke', WORDS=['JOKE'],
+                         PATTERNS=[r'\bjoke\b'])
+        cats = mock.Mock(__name__='cats', WORDS=['JOKE', 'CATS'],
+                         PATTERNS=[r'\bjoke about cats\b'])
+        index = brain.ModuleIndex([joke, cats])
+        self.assertEqual(index.match('tell me a joke about cats'),
+                         (set([joke, cats]), set()))
+        self.assertEqual(index.match('tell me a joke'), (set([joke]), set()))
+
+    def testPatternIndex(self):
+        """Does the index find the same modules as searching all PATTERNS?"""
+        patterns = [r'\bjoke\b', r'birthday', r'\b(hack(er)?|HN)\b',
+                    r'\d+ minutes', r'^stop$', r'\bnotification|Facebook\b',
+                    r'(?:ab)+c']
+        modules = [mock.Mock(__name__='m%d' % i, WORDS=[], PATTERNS=[p])
+                   for i, p in enumerate(patterns)]
+        index = brain.ModuleIndex(modules)
+        for text in ['Joke!', 'a jokebook', 'BIRTHDAYS', 'hackers', 'HN',
+                     'in 5 minutes', 'stop', 'stop it', 'notifications',
+                     'Facebook', 'ababc', u'hacker n\xe9ws']:
+            expected = set(module for module in modules
+                           if re.search(module.PATTERNS[0], text,
+                                        re.IGNORECASE))
+            self.assertEqual(index.match(text)[0], expected, text)
+
+    def testIndexedQuery(self):
+        """Does Brain only ask the candidate modules?"""
+        my_brain = TestBrain._emptyBrain()
+        modules = dict((m.__name__, m) for m in my_brain.modules)
+        with mock.patch.object(modules['Unclear'], 'isValid') as valid, \
+                mock.patch.object(modules['Time'], 'handle') as time_handle:
+            my_brain.query(["what time is it"])
+            self.assertTrue(time_handle.called)
+            self.assertFalse(valid.called)
+
+    def testRankByScore(self):
+        """Does Brain prefer the hypothesis with the better score?"""
+        my_brain = TestBrain._emptyBrain()
+        modules = dict((m.__name__, m) for m in my_brain.modules)
+        texts = transcription.Transcription(
+            ["what's the weather", "what's the time"], [0.3, 0.8])
+        with mock.patch.object(modules['Time'], 'handle') as time_handle:
+            my_brain.query(texts)
+            self.assertEqual(time_handle.call_count, 1)
+            self.assertEqual(time_handle.call_args[0][0], "what's the time")
+
+        # Without scores, the module priority decides
+        ranked = my_brain.rank(["tell me a joke", "hacker news"])
+        self.assertEqual(ranked[0], (modules['HN'], "hacker news", True))
+        # The fallback module comes last, even with a better score
+        texts = transcription.Transcription(["zzz", "what time is it"],
+                                            [0.9, 0.1])
+        self.assertEqual(my_brain.rank(texts)[0][0], modules['Time'])
+
+    def testHandlerTimeout(self):
+        """Does Brain cancel handlers that take too long?"""
+        my_brain = TestBrain._emptyBrain()
+        time_module = filter(lambda m: m.__name__ == 'Time',
+                             my_brain.modules)[0]
+        my_brain._timeouts['Time'] = 0.05
+        release = threading.Event()
+
+        def hang(text, mic, profile):
+            release.wait(5)
+            mic.say("It's too late.")
+
+        with mock.patch.object(time_module, 'handle', hang):
+            my_brain.query(["what time is it"])
+        self.assertEqual(len(my_brain.mic.outputs), 1)
+        self.assertIn("took too long", my_brain.mic.outputs[0])
+        self.assertEqual(my_brain.metrics.get('Time')['timeout'], 1)
+
+        # the cancelled handler can't use the mic anymore
+        release.set()
+        time.sleep(0.05)
+        self.assertEqual(len(my_brain.mic.outputs), 1)
+
+    def testHandlerMetrics(self):
+        """Does Brain record how long handlers take?"""
+        my_brain = TestBrain._emptyBrain()
+        time_module = filter(lambda m: m.__name__ == 'Time',
+                             my_brain.modules)[0]
+        with mock.patch.object(time_module, 'handle') as mocked_handle:
+            my_brain.query(["what time is it"])
+            my_brain.query(["what time is it"])
+            mocked_handle.side_effect = KeyError('foo')
+            my_brain.query(["what time is it"])
+        stats = my_brain.metrics.get('Time')
+        self.assertEqual((stats['count'], stats['completed'],
+                          stats['failed']), (3, 2, 1))
+        self.assertIn('Time', my_brain.metrics.report())
+
+        # The metrics are logged periodically
+        my_brain._metrics_interval = 0
+        with mock.patch.object(time_module, 'handle'), \
+                mock.patch.object(my_brain._logger, 'info') as mocked_log:
+            my_brain.query(["what time is it"])
+        self.assertEqual(mocked_log.call_count, 1)
+        self.assertIn('Time', mocked_log.call_args[0][1])
+
+    def testEmptyProfileSection(self):
+        """Does Brain accept empty handler settings in the profile?"""
+        profile = dict(DEFAULT_PROFILE, handlers={'timeouts': None})
+        my_brain = brain.Brain(test_mic.Mic([]), profile)
+        self.assertEqual(my_brain._timeouts, {})
+        profile = dict(DEFAULT_PROFILE, handlers=None)
+        my_brain = brain.Brain(test_mic.Mic([]), profile)
+        self.assertEqual(my_brain._default_timeout,
+                         brain.Brain.HANDLER_TIMEOUT)
+
+    def testReloadModules(self):
+        """Does Brain route queries to reloaded modules?"""
+        my_brain = TestBrain._emptyBrain()
+        modules = my_brain.modules
+        echo = mock.Mock(__name__='Echo', WORDS=['ECHO'], PATTERNS=[],
+                         PRIORITY=10, TIMEOUT=1)
+        with mock.patch.object(brain.Brain, 'get_modules',
+                               return_value=[echo] + modules):
+            my_brain.reload_modules()
+        self.assertEqual(my_brain.modules[0], echo)
+        my_brain.query(["echo"])
+        self.assertEqual(echo.handle.call_count, 1)
+
+    def testFailedImport(self):
+        """Does Brain skip plugins that can't be imported?"""
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        self.addCleanup(sys.modules.pop, 'brokenecho', None)
+        with open(os.path.join(tempdir, 'brokenecho.py'), 'w') as f:
+            f.write("WORDS = ['ECHO']\nPATTERNS = [r'\\becho\\b']\n" +
+                    "PRIORITY = 10\nraise Exception\n")
+        registry = plugins.PluginRegistry(
+            [tempdir],
+            plugins.PluginManifest(os.path.join(tempdir, 'plugins.json')))
+        broken = registry.modules[0]
+
+        my_brain = TestBrain._emptyBrain()
+        modules = my_brain.modules
+        with mock.patch.object(brain.Brain, 'get_modules',
+                               return_value=[broken] + modules):
+            my_brain.reload_modules()
+        self.assertEqual(my_brain.rank(["echo"])[0],
+                         (broken, "echo", True))
+        with mock.patch.object(modules[-1], 'handle') as unclear_handle:
+            my_brain.query(["echo"])
+            self.assertEqual(unclear_handle.call_count, 1)
+        self.assertEqual(my_brain.mic.outputs, [])
+        self.assertNotIn(broken, [module for module, text, matched
+                                  in my_brain.rank(["echo"])])
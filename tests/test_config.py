@@ -0,0 +1,48 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+from client import config
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.profile_path = os.path.join(self.tempdir, 'profile.yml')
+        config.clear_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        config.clear_cache()
+
+    def write_profile(self, content, mtime):
+        with open(self.profile_path, 'w') as f:
+            f.write(content)
+        os.utime(self.profile_path, (mtime, mtime))
+
+    def testCaching(self):
+        self.write_profile('first_name: Foo\n', 1000)
+        profile = config.load_profile(self.profile_path)
+        self.assertEqual(profile, {'first_name': 'Foo'})
+        with mock.patch('yaml.safe_load') as safe_load:
+            self.assertIs(config.load_profile(self.profile_path), profile)
+            self.assertFalse(safe_load.called)
+
+    def testInvalidation(self):
+        self.write_profile('first_name: Foo\n', 1000)
+        self.assertEqual(config.load_profile(self.profile_path),
+                         {'first_name': 'Foo'})
+        self.write_profile('first_name: Bar\n', 2000)
+        self.assertEqual(config.load_profile(self.profile_path),
+                         {'first_name': 'Bar'})
+
+    def testMissingProfile(self):
+        with self.assertRaises(IOError):
+            config.load_profile(self.profile_path)
+        self.assertEqual(config.get_profile(self.profile_path), {})
+        self.write_profile('', 1000)
+        self.assertEqual(config.get_profile(self.profile_path), {})
@@ -0,0 +1,42 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import unittest
+import mock
+from client import conversation, local_mic
+
+
+class TestConversation(unittest.TestCase):
+
+    def get_conversation(self, mic, profile=None):
+        if profile is None:
+            profile = {'plugins': {'reload': False}}
+        with mock.patch.object(conversation, 'Notifier'), \
+                mock.patch.object(conversation, 'Brain'):
+            conv = conversation.Conversation('JASPER', mic, profile)
+        # pretend that the phrases have changed
+        conv._phrases = []
+        return conv
+
+    def testReloadWithLocalMic(self):
+        conv = self.get_conversation(local_mic.Mic(None, None, None))
+        conv._reloadModules()
+        self.assertEqual(conv.brain.reload_modules.call_count, 1)
+
+    def testReloadCompilesVocabulary(self):
+        stt_engine = mock.Mock()
+        mic = mock.Mock(active_stt_engine=stt_engine)
+        conv = self.get_conversation(mic)
+        with mock.patch('client.vocabcompiler.get_all_phrases',
+                        return_value=['FOO']):
+            conv._reloadModules()
+        self.assertIs(mic.active_stt_engine, stt_engine)
+        self.assertFalse(stt_engine.get_active_instance.called)
+        vocabulary = stt_engine.get_vocabulary.return_value
+        vocabulary.compile_in_background.assert_called_with(
+            ['FOO'], callback=stt_engine.load_vocabulary)
+
+    def testEmptyProfileSection(self):
+        with mock.patch.object(conversation.plugins,
+                               'PluginWatcher') as watcher:
+            conv = self.get_conversation(mock.Mock(), {'plugins': None})
+        self.assertIs(conv._watcher, watcher.return_value)
@@ -1,5 +1,7 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8-*-
+import os
+import shutil
 import unittest
 import tempfile
 import mock
@@ -53,15 +55,24 @@ class TestPatchedG2P(unittest.TestCase):
                     "UGLY\t18.9617\t<s> AH G L AY </s>\n", "")
 
     def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.cache_file = os.path.join(self.tempdir, 'g2p-cache.json')
+        self.fst_model = os.path.join(self.tempdir, 'model.fst')
+        open(self.fst_model, 'w').close()
+        self.g2pconv = self.get_g2p()
+
+    def get_g2p(self, **kwargs):
         with mock.patch('client.g2p.diagnose.check_executable',
                         return_value=True):
-            with tempfile.NamedTemporaryFile() as f:
-                conf = g2p.PhonetisaurusG2P.get_config().items()
-                with mock.patch.object(g2p.PhonetisaurusG2P, 'get_config',
-                                       classmethod(lambda cls: dict(conf +
-                                                   [('fst_model', f.name)]))):
-                    self.g2pconv = g2p.PhonetisaurusG2P(
-                        **g2p.PhonetisaurusG2P.get_config())
+            conf = g2p.PhonetisaurusG2P.get_config().items()
+            with mock.patch.object(g2p.PhonetisaurusG2P, 'get_config',
+                                   classmethod(lambda cls: dict(conf +
+                                               [('fst_model',
+                                                 self.fst_model)]))):
+                return g2p.PhonetisaurusG2P(
+                    cache_file=self.cache_file,
+                    **dict(g2p.PhonetisaurusG2P.get_config(), **kwargs))
 
     def testTranslateWord(self):
             with mock.patch('subprocess.Popen',
@@ -75,3 +86,65 @@ class TestPatchedG2P(unittest.TestCase):
                 results = self.g2pconv.translate(WORDS).keys()
                 for word in WORDS:
                     self.assertIn(word, results)
+
+    def testCache(self):
+        with mock.patch('subprocess.Popen',
+                        return_value=TestPatchedG2P.DummyProc()) as popen:
+            self.g2pconv.translate(['GOOD', 'BAD', 'NONE'])
+            self.assertEqual(popen.call_count, 1)
+            results = self.get_g2p().translate(['BAD', 'GOOD', 'NONE'])
+            self.assertEqual(popen.call_count, 1)
+            self.get_g2p().translate(['UGLY', 'GOOD'])
+            self.assertEqual(popen.call_count, 2)
+        self.assertEqual(results['GOOD'], ['G UH D', 'G UW D', 'G UH D IY'])
+        self.assertIsInstance(results['BAD'][0], str)
+        self.assertNotIn('NONE', results)
+
+    def testShards(self):
+        g2pconv = self.get_g2p(workers=2)
+        g2pconv.MIN_SHARD_SIZE = 1
+        with mock.patch('subprocess.Popen',
+                        return_value=TestPatchedG2P.DummyProc()) as popen:
+            results = g2pconv.translate(WORDS)
+            self.assertEqual(popen.call_count, 2)
+        self.assertEqual(sorted(results.keys()), sorted(WORDS))
+        self.assertEqual(self.g2pconv._get_shards(WORDS), [WORDS])
+
+
+class TestPronunciationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.cache_file = os.path.join(self.tempdir, 'g2p-cache.json')
+        self.fst_model = os.path.join(self.tempdir, 'model.fst')
+        open(self.fst_model, 'w').close()
+
+    def testNonAsciiWords(self):
+        cache = g2p.PronunciationCache(self.cache_file, self.fst_model)
+        results = {u'CAFÉ': ['K AE F EY'], 'NAÏVE': ['N AY IY V']}
+        cache.update([u'CAFÉ', 'NAÏVE'], results)
+        found, missing = cache.get(['CAFÉ', u'NAÏVE', u'CRÈME'])
+        self.assertEqual(found, {'CAFÉ': ['K AE F EY'],
+                                 u'NAÏVE': ['N AY IY V']})
+        self.assertEqual(missing, [u'CRÈME'])
+
+    def testSharedFile(self):
+        first = g2p.PronunciationCache(self.cache_file, self.fst_model)
+        second = g2p.PronunciationCache(self.cache_file, self.fst_model,
+                                        nbest=3)
+        first.get(['GOOD'])
+        second.get(['BAD'])
+        first.update(['GOOD'], {'GOOD': ['G UH D']})
+        second.update(['BAD'], {'BAD': ['B AE D']})
+        first.save()
+        second.save()
+
+        # Neither instance overwrites the pronunciations of the other one
+        with mock.patch.dict(g2p._cache_files, clear=True):
+            found, missing = g2p.PronunciationCache(
+                self.cache_file, self.fst_model).get(['GOOD', 'BAD'])
+            self.assertEqual(found, {'GOOD': ['G UH D']})
+            found, missing = g2p.PronunciationCache(
+                self.cache_file, self.fst_model, nbest=3).get(['BAD'])
+            self.assertEqual(found, {'BAD': ['B AE D']})
@@ -0,0 +1,31 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import threading
+import unittest
+from client import handlers, test_mic
+
+
+class TestHandlers(unittest.TestCase):
+
+    def testWorkerPool(self):
+        pool = handlers.WorkerPool(size=2)
+        release = threading.Event()
+        jobs = [pool.submit(release.wait, 5) for i in range(3)]
+        self.assertFalse(jobs[2].wait(0.05))
+        self.assertIsNone(jobs[2].duration)
+        release.set()
+        self.assertTrue(all(job.wait(5) for job in jobs))
+        self.assertLessEqual(len(pool._threads), 2)
+
+        job = pool.submit(int, 'foo')
+        job.wait(5)
+        self.assertEqual(job.exc_info[0], ValueError)
+
+    def testHandlerMic(self):
+        mic = handlers.HandlerMic(test_mic.Mic(['YES']))
+        self.assertEqual(mic.activeListen(), 'YES')
+        self.assertLess(mic.idle_time, 1)
+        self.assertEqual(mic.idx, 1)
+        mic.cancel()
+        with self.assertRaises(handlers.HandlerCancelled):
+            mic.say('foo')
@@ -0,0 +1,234 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import sys
+import unittest
+import imp
+import StringIO
+import math
+import random
+import struct
+import audioop
+import mock
+from client import mic
+
+
+def numpy_installed():
+    try:
+        imp.find_module('numpy')
+    except ImportError:
+        return False
+    else:
+        return True
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = mic.RingBuffer(4)
+
+    def testGet(self):
+        for i in range(6):
+            self.buffer.append(str(i))
+        self.assertEqual(self.buffer.position, 6)
+        self.assertEqual(self.buffer.oldest, 2)
+        self.assertEqual(self.buffer.get(2), '2')
+        self.assertEqual(self.buffer.get(5), '5')
+        with self.assertRaises(IndexError):
+            self.buffer.get(1)
+
+    def testClosed(self):
+        self.buffer.close()
+        with self.assertRaises(IOError):
+            self.buffer.get(0)
+
+    def testReaderSkipsOverwrittenChunks(self):
+        reader = mic.CaptureReader(self.buffer)
+        for i in range(6):
+            self.buffer.append(str(i))
+        self.assertEqual(reader.read(), '2')
+        self.assertEqual(reader.read(), '3')
+        self.assertEqual(reader.position, 4)
+
+
+class TestScoring(unittest.TestCase):
+
+    def setUp(self):
+        samples = [(i * 37) % 2000 - 1000 for i in range(4 * 256 + 100)]
+        self.data = struct.pack('<%dh' % len(samples), *samples)
+
+    def testScores(self):
+        expected = [audioop.rms(self.data[i:i + 512], 2) / 3
+                    for i in range(0, 4 * 512, 512)]
+        self.assertEqual(mic.get_scores(self.data, 256), expected)
+        with mock.patch.object(mic, 'get_numpy', return_value=None):
+            self.assertEqual(mic.get_scores(self.data, 256), expected)
+
+
+class TestVAD(unittest.TestCase):
+
+    def setUp(self):
+        self.silence = '\x00\x00' * 1024
+        self.tone = struct.pack('<1024h', *[
+            int(3000 * math.sin(2 * math.pi * 440 * i / 16000.0))
+            for i in range(1024)])
+        rand = random.Random(42)
+        self.noise = struct.pack('<1024h', *[rand.randint(-3000, 3000)
+                                             for i in range(1024)])
+
+    def testEnergyVAD(self):
+        vad = mic.EnergyVAD()
+        self.assertTrue(vad.is_speech(self.tone, 100))
+        self.assertFalse(vad.is_speech(self.silence, 100))
+        # Quiet, but crossing zero very often (like a fricative)
+        self.assertTrue(vad.is_speech(self.noise, 600))
+        self.assertFalse(mic.EnergyVAD(zcr_threshold=0.9).is_speech(
+            self.noise, 600))
+
+    @unittest.skipUnless(numpy_installed(), "NumPy not present")
+    def testSpectralVAD(self):
+        vad = mic.SpectralVAD()
+        self.assertTrue(vad.is_speech(self.tone, 100))
+        self.assertFalse(vad.is_speech(self.silence, 100))
+        # Loud, but spread over the whole spectrum
+        self.assertFalse(vad.is_speech(self.noise, 100))
+
+    def testGetVADBySlug(self):
+        self.assertIs(mic.get_vad_by_slug('energy-vad'), mic.EnergyVAD)
+        with self.assertRaises(ValueError):
+            mic.get_vad_by_slug('nonexistant-vad')
+
+
+class TestNoiseFloorTracker(unittest.TestCase):
+
+    def testLevel(self):
+        buffer = mic.RingBuffer(32)
+        tracker = mic.NoiseFloorTracker(buffer, 256, 16000, window_time=0.32,
+                                        percentile=25, warmup_time=0.32)
+        quiet = struct.pack('<256h', *([300, -300] * 128))
+        loud = struct.pack('<256h', *([6000, -6000] * 128))
+        # Speech-like disturbances shouldn't affect the noise floor
+        for i in range(20):
+            buffer.append(loud if i % 3 == 0 else quiet)
+        self.assertEqual(tracker.level, 100)
+        buffer.close()
+
+
+class FakeCapture(object):
+    """
+    Replays prerecorded chunks instead of capturing from an input device.
+    """
+
+    def __init__(self, chunks, noise_floor=100):
+        self.buffer = mic.RingBuffer(len(chunks))
+        for chunk in chunks:
+            self.buffer.append(chunk)
+        self.buffer.close()
+        self.noise_floor = mock.Mock(level=noise_floor)
+
+    def open(self):
+        return mic.CaptureReader(self.buffer, 0)
+
+    def close(self):
+        pass
+
+
+class TestMic(unittest.TestCase):
+
+    def setUp(self):
+        self.silence = '\x00\x00' * mic.Mic.CHUNK
+        self.speech = struct.pack('<%dh' % mic.Mic.CHUNK,
+                                  *([3000, -3000] * (mic.Mic.CHUNK / 2)))
+        self.stt_engine = mock.Mock()
+        self.stt_engine.partial.return_value = []
+        self.stt_engine.finish.return_value = ['HELLO']
+
+    def get_mic(self, chunks):
+        return mic.Mic(mock.Mock(), self.stt_engine, self.stt_engine,
+                       capture=FakeCapture(chunks), vad=mic.EnergyVAD())
+
+    def testActiveListen(self):
+        """Does Mic only transcribe the speech and some padding?"""
+        chunks = [self.silence] * 2 + [self.speech] * 5 + \
+                 [self.silence] * 30
+        microphone = self.get_mic(chunks)
+        self.assertEqual(microphone.activeListenToAllOptions(), ['HELLO'])
+        self.assertEqual(self.stt_engine.start_utterance.call_count, 1)
+        fed = [args[0] for args, kwargs in
+               self.stt_engine.feed.call_args_list]
+        padding = int(microphone.padding_time * mic.Mic.RATE /
+                      mic.Mic.CHUNK)
+        self.assertEqual(fed, [self.silence] * 2 + [self.speech] * 5 +
+                         [self.silence] * padding)
+        self.assertEqual(microphone.speaker.play.call_count, 2)
+
+    def testActiveListenWithoutSpeech(self):
+        """Does Mic give up if the user doesn't say anything?"""
+        microphone = self.get_mic([self.silence] * 60)
+        self.assertEqual(microphone.activeListenToAllOptions(), [])
+        self.assertFalse(self.stt_engine.feed.called)
+
+    def testPassiveListen(self):
+        """Does Mic pass the keyword with its pre-roll to the engine?"""
+        self.stt_engine.partial.return_value = ['JASPER']
+        microphone = self.get_mic([self.silence] * 5 + [self.speech] * 3 +
+                                  [self.silence] * 10)
+        self.assertEqual(microphone.passiveListen('JASPER'),
+                         (100 * 1.8, 'JASPER'))
+        fed = [args[0] for args, kwargs in
+               self.stt_engine.feed.call_args_list]
+        self.assertEqual(fed, [self.silence] * 5 + [self.speech] * 2)
+        self.assertEqual(self.stt_engine.finish.call_count, 1)
+
+    def testPassiveListenAcrossCycles(self):
+        """Does Mic keep the audio captured while the keyword is decoded?"""
+        buffer = mic.RingBuffer(100)
+
+        def open_reader():
+            reader = mic.CaptureReader(buffer)
+            if not buffer.position:
+                # the user says something else first
+                for chunk in ([self.silence] * 5 + [self.speech] * 3 +
+                              [self.silence] * 10):
+                    buffer.append(chunk)
+            return reader
+
+        capture = mock.Mock(buffer=buffer, noise_floor=mock.Mock(level=100))
+        capture.open.side_effect = open_reader
+        keyword = struct.pack('<%dh' % mic.Mic.CHUNK,
+                              *([5000, -5000] * (mic.Mic.CHUNK / 2)))
+        transcriptions = [['HELLO'], ['JASPER']]
+
+        def finish():
+            if len(transcriptions) == 2:
+                # the user says the keyword while the first attempt is
+                # still being decoded
+                for chunk in ([self.silence] * 2 + [keyword] * 3 +
+                              [self.silence] * 10):
+                    buffer.append(chunk)
+                buffer.close()
+            return transcriptions.pop(0)
+
+        self.stt_engine.finish.side_effect = finish
+        microphone = mic.Mic(mock.Mock(), self.stt_engine, self.stt_engine,
+                             capture=capture, vad=mic.EnergyVAD())
+        self.assertEqual(microphone.passiveListen('JASPER'),
+                         (False, ['HELLO']))
+        self.assertEqual(microphone.passiveListen('JASPER'),
+                         (100 * 1.8, 'JASPER'))
+        fed = [args[0] for args, kwargs in
+               self.stt_engine.feed.call_args_list]
+        self.assertEqual(fed.count(keyword), 3)
+
+    def testFailedCapture(self):
+        """Does Mic report errors while opening the input stream?"""
+        with mock.patch.dict('sys.modules', {'pyaudio': mock.Mock()}), \
+                mock.patch.object(mic, 'AudioCapture',
+                                  side_effect=IOError('No input device')), \
+                mock.patch('sys.stderr',
+                           new_callable=StringIO.StringIO) as stderr:
+            with self.assertRaises(IOError):
+                mic.Mic(mock.Mock(), mock.Mock(), mock.Mock(),
+                        vad=mock.Mock())
+            # release the half-initialized Mic
+            sys.exc_clear()
+        self.assertEqual(stderr.getvalue(), '')
@@ -0,0 +1,135 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import os
+import json
+import sys
+import shutil
+import tempfile
+import unittest
+import mock
+from client import plugins
+
+
+class TestPluginRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.plugindir = os.path.join(self.tempdir, 'modules')
+        os.mkdir(self.plugindir)
+        self.write_module('counter', "import sys\n" +
+                          "sys.counter_loads = getattr(sys, " +
+                          "'counter_loads', 0) + 1\n" +
+                          "WORDS = ['COUNT', 'TIME']\nPRIORITY = 1\n" +
+                          "def isValid(text):\n    return 'COUNT' in text\n")
+        self.write_module('clock', "import sys\n" +
+                          "WORDS = ['TIME', 'CLOCK']\n" +
+                          "PRIORITY = -(sys.maxint + 1)\n")
+        self.write_module('broken', "WORDS = ['BROKEN']\nraise Exception\n")
+        self.write_module('nowords', "PRIORITY = 3\n")
+        self.manifest_file = os.path.join(self.tempdir, 'plugins.json')
+        sys.counter_loads = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        for name in ('counter', 'clock', 'broken', 'nowords', 'added'):
+            sys.modules.pop(name, None)
+        del sys.counter_loads
+
+    def write_module(self, name, code):
+        with open(os.path.join(self.plugindir, name + '.py'), 'w') as f:
+            f.write(code)
+
+    def get_registry(self):
+        return plugins.PluginRegistry(
+            [self.plugindir], plugins.PluginManifest(self.manifest_file))
+
+    def testModules(self):
+        registry = self.get_registry()
+        self.assertEqual([m.__name__ for m in registry.modules],
+                         ['counter', 'broken', 'clock'])
+        self.assertEqual(registry.phrases,
+                         ['BROKEN', 'CLOCK', 'COUNT', 'TIME'])
+        # Only modules with computed constants have been imported
+        self.assertEqual(sys.counter_loads, 0)
+        self.assertTrue(registry.modules[2].is_loaded)
+
+        counter, broken = registry.modules[:2]
+        self.assertTrue(counter.isValid('COUNT'))
+        self.assertFalse(counter.isValid('TIME'))
+        self.assertFalse(broken.isValid('BROKEN'))
+        registry.modules
+        self.assertEqual(sys.counter_loads, 1)
+
+    def testFailedImport(self):
+        registry = self.get_registry()
+        broken = registry.modules[1]
+        self.assertIn('BROKEN', registry.phrases)
+        self.assertFalse(broken.failed)
+        self.assertIsNone(broken.load())
+        self.assertTrue(broken.failed)
+        self.assertNotIn('BROKEN', registry.phrases)
+        with self.assertRaises(ImportError):
+            broken.handle('BROKEN', None, {})
+
+    def testManifest(self):
+        self.get_registry().modules
+        sys.modules.pop('clock')
+        # Next start: nothing is imported or parsed
+        with mock.patch.object(plugins, 'get_module_constants') as parse:
+            registry = self.get_registry()
+            self.assertEqual([m.__name__ for m in registry.modules],
+                             ['counter', 'broken', 'clock'])
+            self.assertFalse(parse.called)
+        self.assertNotIn('clock', sys.modules)
+        self.assertIsInstance(registry.modules[0].WORDS[0], str)
+        self.assertEqual(registry.modules[2].PRIORITY, -(sys.maxint + 1))
+
+        # Modified files are parsed again
+        self.write_module('broken', "WORDS = ['FIXED']\n")
+        os.utime(os.path.join(self.plugindir, 'broken.py'), (1, 1))
+        self.assertEqual(self.get_registry().modules[1].WORDS, ['FIXED'])
+
+    def testReload(self):
+        registry = self.get_registry()
+        counter, broken, clock = registry.modules
+        self.assertFalse(registry.has_changed())
+
+        self.write_module('broken', "WORDS = ['FIXED']\nPRIORITY = 2\n")
+        os.utime(os.path.join(self.plugindir, 'broken.py'), (1, 1))
+        self.write_module('added', "WORDS = ['ADDED']\n")
+        self.assertTrue(registry.has_changed())
+
+        callback = mock.Mock()
+        watcher = plugins.PluginWatcher(registry, callback)
+        self.assertTrue(watcher.check())
+        self.assertTrue(callback.called)
+        self.assertFalse(watcher.check())
+
+        modules = registry.modules
+        self.assertEqual([m.__name__ for m in modules],
+                         ['broken', 'counter', 'added', 'clock'])
+        # Unchanged plugins are not imported again
+        self.assertIs(modules[1], counter)
+        self.assertIs(modules[3], clock)
+        self.assertEqual(modules[0].WORDS, ['FIXED'])
+        self.assertIn('ADDED', registry.phrases)
+
+    def testOutdatedManifest(self):
+        with open(self.manifest_file, 'w') as f:
+            json.dump({self.plugindir: {}}, f)
+        registry = self.get_registry()
+        self.assertEqual([m.__name__ for m in registry.modules],
+                         ['counter', 'broken', 'clock'])
+        with open(self.manifest_file, 'r') as f:
+            self.assertEqual(json.load(f)['version'],
+                             plugins.MANIFEST_VERSION)
+
+    def testModuleConstants(self):
+        fname = os.path.join(self.plugindir, 'counter.py')
+        self.assertEqual(plugins.get_module_constants(fname),
+                         {'WORDS': ['COUNT', 'TIME'], 'PRIORITY': 1})
+        self.write_module('dynamic', "WORDS = []\nWORDS.append('X')\n" +
+                          "if True:\n    WORDS = ['Y']\n")
+        with self.assertRaises(ValueError):
+            plugins.get_module_constants(
+                os.path.join(self.plugindir, 'dynamic.py'))
@@ -2,7 +2,14 @@
 # -*- coding: utf-8-*-
 import unittest
 import imp
-from client import stt, jasperpath
+import logging
+import shutil
+import socket
+import StringIO
+import tempfile
+import threading
+import mock
+from client import stt, jasperpath, vocabcompiler
 
 
 def cmuclmtk_installed():
@@ -49,3 +56,213 @@ class TestSTT(unittest.TestCase):
         with open(self.time_clip, mode="rb") as f:
             transcription = self.active_stt_engine.transcribe(f)
         self.assertIn("TIME", transcription)
+
+    def testStreamingTranscribe(self):
+        """
+        Does feeding the audio chunk by chunk give the same result?
+        """
+        with open(self.time_clip, mode="rb") as f:
+            f.seek(44)
+            data = f.read()
+        self.active_stt_engine.start_utterance()
+        for i in range(0, len(data), 2048):
+            self.active_stt_engine.feed(data[i:i + 2048])
+        self.assertIn("TIME", self.active_stt_engine.finish())
+
+    def testPartialJasper(self):
+        """
+        Is Jasper's name recognized before the utterance is finished?
+        """
+        with open(self.jasper_clip, mode="rb") as f:
+            f.seek(44)
+            data = f.read()
+        self.passive_stt_engine.start_utterance()
+        self.passive_stt_engine.feed(data)
+        self.assertTrue(any("JASPER" in phrase for phrase in
+                            self.passive_stt_engine.partial()))
+        self.passive_stt_engine.finish()
+
+    def testKeywordSpotting(self):
+        """
+        Does the keyword spotting engine find Jasper's name, and only that?
+        """
+        kws_engine = stt.PocketSphinxKWSSTT.get_passive_instance()
+        with open(self.jasper_clip, mode="rb") as f:
+            transcription = kws_engine.transcribe(f)
+        self.assertTrue(any("JASPER" in phrase for phrase in transcription))
+        with open(self.time_clip, mode="rb") as f:
+            transcription = kws_engine.transcribe(f)
+        self.assertFalse(any("JASPER" in phrase for phrase in transcription))
+
+
+class TestStreaming(unittest.TestCase):
+
+    class DummySTT(stt.AbstractSTTEngine):
+        SLUG = 'dummy'
+
+        @classmethod
+        def is_available(cls):
+            return True
+
+        def transcribe(self, fp):
+            audio = self.get_audio_segment(fp)
+            return [audio.data, audio.rate]
+
+    def testFeedAndFinish(self):
+        engine = self.DummySTT()
+        engine.start_utterance(rate=8000)
+        for chunk in ('ab', 'cd', 'ef'):
+            engine.feed(chunk)
+        self.assertEqual(engine.partial(), [])
+        self.assertEqual(engine.finish(), ['abcdef', 8000])
+        engine.start_utterance()
+        engine.feed('gh')
+        self.assertEqual(engine.finish(), ['gh', 16000])
+
+
+class TestGetEngine(unittest.TestCase):
+
+    def testKeywordSpottingEngine(self):
+        self.assertIn(stt.PocketSphinxKWSSTT, stt.get_engines())
+        self.assertEqual(stt.PocketSphinxKWSSTT.SLUG, 'sphinx-kws')
+
+
+class TestGetConfig(unittest.TestCase):
+
+    def testProfile(self):
+        profile = {'pocketsphinx': {'hmm_dir': '/foo',
+                                    'keyphrases': {'HEY JASPER': '1e-20'}}}
+        with mock.patch.object(stt.jasperconfig, 'get_profile') as get:
+            config = stt.PocketSphinxKWSSTT.get_config(profile)
+            self.assertFalse(get.called)
+        self.assertEqual(config, {'hmm_dir': '/foo',
+                                  'keyphrases': {'HEY JASPER': 1e-20}})
+
+
+class TestJuliusSTT(unittest.TestCase):
+
+    def testParseResult(self):
+        message = '\n'.join([
+            '<RECOGOUT>',
+            '  <SHYPO RANK="2" SCORE="-5.0">',
+            '    <WHYPO WORD="<s>" CLASSID="0" PHONE="sil" CM="1.000"/>',
+            '    <WHYPO WORD="TIME" CLASSID="1" PHONE="t ay m" CM="0.400"/>',
+            '    <WHYPO WORD="</s>" CLASSID="2" PHONE="sil" CM="1.000"/>',
+            '  </SHYPO>',
+            '  <SHYPO RANK="1" SCORE="-1.0">',
+            '    <WHYPO WORD="<s>" CLASSID="0" PHONE="sil" CM="1.000"/>',
+            '    <WHYPO WORD="WHAT" CLASSID="1" PHONE="w ah t" CM="0.800"/>',
+            '    <WHYPO WORD="TIME" CLASSID="1" PHONE="t ay m" CM="0.600"/>',
+            '    <WHYPO WORD="</s>" CLASSID="2" PHONE="sil" CM="1.000"/>',
+            '  </SHYPO>',
+            '</RECOGOUT>'])
+        results = stt.JuliusSTT._parse_result(message)
+        self.assertEqual([(rank, text) for rank, text, cm in results],
+                         [(1, 'WHAT TIME'), (2, 'TIME')])
+        self.assertAlmostEqual(results[0][2], 0.7)
+        self.assertAlmostEqual(results[1][2], 0.4)
+
+    def testLogOutput(self):
+        logger = mock.Mock()
+        output = StringIO.StringIO('ERROR: foo\nWARNING: bar\n' +
+                                   'STAT: baz\nERROR: adin_qux\nquux\n')
+        stt.JuliusSTT._log_output(output, logger)
+        logger.error.assert_called_with('foo')
+        self.assertEqual(logger.error.call_count, 1)
+        logger.warning.assert_called_with('bar')
+        logger.debug.assert_called_with('baz')
+        self.assertTrue(output.closed)
+
+    def testTimeout(self):
+        """Does JuliusSTT give up if Julius doesn't respond?"""
+        engine = object.__new__(stt.JuliusSTT)
+        engine._logger = mock.Mock()
+        process = engine._process = mock.Mock()
+        process.poll.return_value = None
+        server = socket.socket()
+        self.addCleanup(server.close)
+        server.bind(('127.0.0.1', 0))
+        server.listen(2)
+        # Julius accepts the connections, but never responds
+        engine._module = socket.create_connection(server.getsockname(), 0.05)
+        engine._adin = socket.create_connection(server.getsockname(), 0.05)
+        for i in range(2):
+            self.addCleanup(server.accept()[0].close)
+        engine._module_file = engine._module.makefile('r')
+
+        engine.feed('\x00\x00' * 16)
+        self.assertEqual(engine.finish(), [''])
+        self.assertEqual(engine._logger.error.call_count, 1)
+        self.assertEqual(process.terminate.call_count, 1)
+
+        # Julius is restarted for the next utterance
+        with mock.patch.object(engine, '_start_server') as start:
+            engine.start_utterance()
+        self.assertEqual(start.call_count, 1)
+        engine.feed('\x00\x00' * 16)
+
+
+class TestVocabularySwitch(unittest.TestCase):
+
+    class DummyVocabularySTT(TestStreaming.DummySTT):
+        VOCABULARY_TYPE = 'DummyVocabulary'
+
+        def __init__(self, vocabulary):
+            self._logger = logging.getLogger(__name__)
+            self.revision = vocabulary.compiled_revision
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        patcher = mock.patch.object(stt.jasperpath, 'config',
+                                    return_value=self.tempdir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testCompileInBackground(self):
+        engine_class = self.DummyVocabularySTT
+        engine = engine_class.get_instance('default', ['FOO'])
+        foo = engine.revision
+        self.assertEqual(foo, vocabcompiler.DummyVocabulary
+                         .phrases_to_revision(['FOO']))
+
+        # The previous revision is used until the new one has been compiled
+        with mock.patch.object(vocabcompiler.DummyVocabulary,
+                               'compile_in_background') as compile:
+            engine = engine_class.get_instance('default', ['BAR'])
+        self.assertEqual(engine.revision, foo)
+        phrases, = compile.call_args[0]
+        callback = compile.call_args[1]['callback']
+        self.assertEqual(phrases, ['BAR'])
+
+        vocabulary = vocabcompiler.DummyVocabulary('default',
+                                                   path=self.tempdir)
+        vocabulary.compile(['BAR'])
+        callback(vocabulary)
+        self.assertEqual(engine.revision, foo)
+        engine.start_utterance()
+        self.assertNotEqual(engine.revision, foo)
+        self.assertTrue(vocabulary.matches_phrases(['BAR']))
+
+    def testEmptyProfileSection(self):
+        engine_class = self.DummyVocabularySTT
+        engine_class.get_instance('default', ['FOO'])
+        with mock.patch.object(vocabcompiler.DummyVocabulary,
+                               'compile_in_background') as compile:
+            engine_class.get_instance('default', ['BAR'],
+                                      profile={'vocabulary': None})
+        self.assertEqual(compile.call_count, 1)
+
+    def testLoadWhileSwitching(self):
+        engine = self.DummyVocabularySTT(mock.Mock(compiled_revision=0))
+        thread = threading.Thread(target=engine.load_vocabulary,
+                                  args=(mock.Mock(compiled_revision=1),))
+        # The prepared engine is only handed over while no switch is going on
+        with stt._vocabulary_lock:
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            self.assertNotIn('_pending_engine', engine.__dict__)
+        thread.join()
+        engine.start_utterance()
+        self.assertEqual(engine.revision, 1)
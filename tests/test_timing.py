@@ -0,0 +1,43 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import unittest
+from client import timing
+
+
+class TestTiming(unittest.TestCase):
+
+    def testTree(self):
+        profiler = timing.Profiler()
+        with profiler.phase('imports'):
+            with profiler.phase('client.stt'):
+                pass
+        with profiler.phase('config'):
+            pass
+        profiler.finish()
+
+        tree = profiler.root.to_dict()
+        self.assertEqual(tree['name'], 'startup')
+        self.assertEqual([child['name'] for child in tree['children']],
+                         ['imports', 'config'])
+        self.assertEqual(tree['children'][0]['children'][0]['name'],
+                         'client.stt')
+        self.assertGreaterEqual(tree['duration'],
+                                tree['children'][0]['duration'])
+        self.assertEqual(len(profiler.report().splitlines()), 4)
+
+    def testDisabled(self):
+        self.assertFalse(timing.is_enabled())
+        with timing.phase('nothing') as phase:
+            self.assertIsNone(phase)
+
+    def testFinished(self):
+        timing.enable()
+        self.addCleanup(setattr, timing, '_profiler', None)
+        with timing.phase('config') as phase:
+            self.assertIsNotNone(phase)
+        report = timing.report()
+        # The main loop runs after the report, which shouldn't be recorded
+        with timing.phase('conversation') as phase:
+            self.assertIsNone(phase)
+        self.assertEqual(timing.report(), report)
+        self.assertEqual(len(report.splitlines()), 2)
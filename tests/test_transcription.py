@@ -0,0 +1,23 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8-*-
+import unittest
+from client import transcription
+
+
+class TestTranscription(unittest.TestCase):
+
+    def testFromPairs(self):
+        result = transcription.Transcription.from_pairs(
+            [('WHAT TIME IS IT', 0.4), ('WHAT TIME IS IT NOW', 0.9)])
+        self.assertEqual(result, ['WHAT TIME IS IT NOW', 'WHAT TIME IS IT'])
+        self.assertEqual(result.scores, [0.9, 0.4])
+        self.assertEqual(transcription.get_scores(result), [0.9, 0.4])
+
+    def testMissingScores(self):
+        result = transcription.Transcription.from_pairs(
+            [('FOO', None), ('BAR', 0.9)])
+        self.assertEqual(result, ['FOO', 'BAR'])
+        self.assertIsNone(result.get_scores())
+        self.assertIsNone(transcription.get_scores(['FOO', 'BAR']))
+        with self.assertRaises(ValueError):
+            transcription.Transcription(['FOO'], [0.5, 0.5])
@@ -1,6 +1,7 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8-*-
 import unittest
+import mock
 from client import tts
 
 
@@ -9,3 +10,11 @@ class TestTTS(unittest.TestCase):
         tts_engine = tts.get_engine_by_slug('dummy-tts')
         tts_instance = tts_engine()
         tts_instance.say('This is a test.')
+
+    def testProfile(self):
+        profile = {'espeak-tts': {'voice': 'en', 'words_per_minute': 120}}
+        with mock.patch.object(tts.jasperconfig, 'get_profile') as get:
+            engine = tts.EspeakTTS.get_instance(profile=profile)
+            self.assertFalse(get.called)
+        self.assertEqual((engine.voice, engine.words_per_minute),
+                         ('en', 120))
@@ -1,12 +1,14 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8-*-
+import os
+import time
 import unittest
 import tempfile
 import contextlib
 import logging
 import shutil
 import mock
-from client import vocabcompiler
+from client import vocabcompiler, plugins
 
 
 class TestVocabCompiler(unittest.TestCase):
@@ -22,6 +24,14 @@ class TestVocabCompiler(unittest.TestCase):
             extracted_phrases = vocabcompiler.get_all_phrases()
         self.assertEqual(expected_phrases, extracted_phrases)
 
+        failed_module = mock.Mock(spec=plugins.PluginProxy, WORDS=['FAILED'],
+                                  failed=True)
+        with mock.patch('client.brain.Brain.get_modules',
+                        classmethod(lambda cls: [mock_module,
+                                                 failed_module])):
+            extracted_phrases = vocabcompiler.get_all_phrases()
+        self.assertEqual(expected_phrases, extracted_phrases)
+
     def testKeywordPhraseExtraction(self):
         expected_phrases = ['MOCK']
 
@@ -90,6 +100,136 @@ class TestVocabulary(unittest.TestCase):
             self.vocab.compile(phrases, force=True)
 
 
+class TestAtomicCompile(unittest.TestCase):
+
+    def testAtomicCompile(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        vocab = vocabcompiler.DummyVocabulary(path=tempdir)
+        vocab.compile(['FOO'])
+        self.assertTrue(os.path.islink(vocab.path))
+        self.assertTrue(vocab.matches_phrases(['FOO']))
+
+        # A failed compilation leaves the previous revision in place
+        logging.disable(logging.ERROR)
+        with mock.patch.object(vocab, '_compile_vocabulary',
+                               side_effect=ValueError('test')):
+            with self.assertRaises(ValueError):
+                vocab.compile(['BAR'])
+        logging.disable(logging.NOTSET)
+        self.assertTrue(vocab.matches_phrases(['FOO']))
+
+        callback = mock.Mock()
+        vocab.compile_in_background(['BAR'], callback).join()
+        callback.assert_called_with(vocab)
+        self.assertTrue(vocab.matches_phrases(['BAR']))
+        self.assertEqual(len(os.listdir(vocab.store_path)), 2)
+
+    def testRevisionStore(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        vocab = vocabcompiler.DummyVocabulary(path=tempdir)
+        music = vocabcompiler.DummyVocabulary('music', path=tempdir)
+        vocab.compile(['FOO'])
+        music.compile(['MUSIC'])
+        vocab.compile(['BAR'])
+
+        # Stored revisions are used without compiling them again
+        with mock.patch.object(vocab, '_compile_vocabulary') as compile:
+            vocab.compile(['FOO'])
+            self.assertFalse(compile.called)
+        self.assertTrue(vocab.matches_phrases(['FOO']))
+
+        # The least recently used revision that isn't used is evicted
+        with mock.patch.object(vocabcompiler.DummyVocabulary,
+                               'CACHE_SIZE', 3):
+            vocab.compile(['BAZ'])
+        revisions = os.listdir(vocab.store_path)
+        self.assertEqual(len(revisions), 3)
+        self.assertNotIn(vocab.phrases_to_revision(['BAR']), revisions)
+        self.assertIn(vocab.phrases_to_revision(['FOO']), revisions)
+        self.assertTrue(music.matches_phrases(['MUSIC']))
+
+    def testEmptyProfileSection(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        vocab = vocabcompiler.DummyVocabulary(path=tempdir)
+        with mock.patch.object(vocabcompiler.jasperconfig, 'get_profile',
+                               return_value={'vocabulary': None}):
+            vocab.compile(['FOO'])
+        self.assertTrue(vocab.matches_phrases(['FOO']))
+
+    def testStaleBuilds(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        vocab = vocabcompiler.DummyVocabulary(path=tempdir)
+        vocab.compile(['FOO'])
+
+        # An interrupted compilation removes its build directory
+        with mock.patch.object(vocab, '_compile_vocabulary',
+                               side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                vocab.compile(['BAR'])
+        self.assertEqual(len(os.listdir(vocab.store_path)), 1)
+
+        # Killed compilations leave it behind, until it has become stale
+        stale = tempfile.mkdtemp(prefix='.build-', dir=vocab.store_path)
+        mtime = time.time() - vocab.STALE_BUILD_TIME - 1
+        os.utime(stale, (mtime, mtime))
+        running = tempfile.mkdtemp(prefix='.build-', dir=vocab.store_path)
+        vocab.compile(['BAR'])
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(running))
+
+    def testConcurrentCompile(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        running = []
+        overlaps = []
+
+        def compile_vocabulary(phrases):
+            overlaps.append(len(running))
+            running.append(phrases)
+            time.sleep(0.01)
+            running.remove(phrases)
+
+        threads = []
+        for phrases in (['FOO'], ['BAR'], ['BAZ']):
+            vocab = vocabcompiler.DummyVocabulary(path=tempdir)
+            vocab._compile_vocabulary = compile_vocabulary
+            threads.append(vocab.compile_in_background(phrases))
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [0, 0, 0])
+        self.assertTrue(vocab.is_compiled)
+        self.assertEqual(len(os.listdir(vocab.store_path)), 3)
+
+    def testStoredMeanwhile(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        vocab = vocabcompiler.DummyVocabulary(path=tempdir)
+        music = vocabcompiler.DummyVocabulary('music', path=tempdir)
+        target = os.path.join(vocab.store_path,
+                              vocab.phrases_to_revision(['FOO']))
+
+        # The revision that is already stored (and used by music) is kept
+        with mock.patch.object(vocab, '_compile_vocabulary',
+                               side_effect=lambda phrases:
+                               music.compile(phrases)):
+            vocab.compile(['FOO'])
+        self.assertEqual(os.path.realpath(vocab.path),
+                         os.path.realpath(target))
+        self.assertEqual(os.path.realpath(music.path),
+                         os.path.realpath(target))
+        self.assertEqual(os.listdir(vocab.store_path),
+                         [os.path.basename(target)])
+
+        vocab.compile(['FOO'], force=True)
+        self.assertTrue(music.matches_phrases(['FOO']))
+        self.assertEqual(os.listdir(vocab.store_path),
+                         [os.path.basename(target)])
+
+
 class TestPocketsphinxVocabulary(TestVocabulary):
 
     VOCABULARY = vocabcompiler.PocketsphinxVocabulary